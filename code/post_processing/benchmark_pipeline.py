@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the post processing on synthetic data, see synthetic_data.py.
+
+For each number of ALL files (10, 100 and 1000 by default) a synthetic data
+set is written, then extract_summary_and_raw_to_csv(),
+plot_and_produce_report_w_extra_checks() and each ALL file loader are timed.
+Every case runs in a fresh process, so the peak resident memory (peak RSS)
+belongs to that case alone. Results are appended to a json history file,
+one entry per run, so runs before and after a change can be compared.
+Runs entirely offline, the parse cache and the run manifest are turned off.
+
+The startup cases time the import of each entry point in a fresh interpreter
+and list which of matplotlib, scipy and reportlab it pulled in, the csv
+extraction should need none of them.
+
+Example,
+    python benchmark_pipeline.py --num-files 10 100 --history ./benchmark_history.json
+    python benchmark_pipeline.py --startup-only
+"""
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import datetime as dt
+import concurrent.futures
+import matplotlib
+matplotlib.use('Agg')  # no display needed for the report figures
+import numpy as np
+import pandas as pd
+
+from synthetic_data import write_synthetic_dataset
+from pipeline_profiler import get_peak_rss_mb  # None on Windows, peak RSS is then left out
+
+LIST_OF_LOADERS = ['tokenize_ASVall_file','loadASVall_coeff','loadASVall_flags',\
+    'loadASVall_stats','loadASVall_data','loadASVall_dry','parse_and_correct_ASVall_file']
+LIST_OF_ENTRY_POINTS = ['parse_all_into_csv9_dry_Tcorr','watch_ALL_folder','postprocessingLICOR',\
+    'create_a_pdf_dry']
+LIST_OF_HEAVY_MODULES = ['matplotlib','scipy','reportlab']
+
+def run_case(case_name,sn,path_to_data,validation_text_filename):
+    # Runs in its own process, returns wall time (s) and peak RSS (MB) of the case
+    import parse_all_into_csv9_dry_Tcorr as csv9
+    import postprocessingLICOR as licor
+
+    list_of_ALL_files = sorted(glob.glob(os.path.join(path_to_data,'ALL','*.txt')))
+    reports_path = os.path.join(path_to_data,'reports')
+    if ( os.path.exists(reports_path) ):
+        shutil.rmtree(reports_path)
+
+    t_start = time.perf_counter()
+    if ( case_name == 'extract_summary_and_raw_to_csv' ):
+        csv9.extract_summary_and_raw_to_csv(sn,path_to_data,validation_text_filename,\
+            use_cache=False,incremental=False)
+    elif ( case_name == 'plot_and_produce_report_w_extra_checks' ):
+        licor.plot_and_produce_report_w_extra_checks(sn,path_to_data,\
+            validation_text_filename,use_cache=False)
+    elif ( case_name in LIST_OF_LOADERS ):
+        loader = getattr(csv9,case_name)
+        for filename in list_of_ALL_files:
+            loader(filename)
+    else:
+        raise Exception(f'Unknown benchmark case {case_name}')
+    wall_time = time.perf_counter() - t_start
+
+    return {'wall_time_s':wall_time,'peak_rss_mb':get_peak_rss_mb()}
+
+def run_startup_case(module_name,repeats=5):
+    # Import time of module_name in a fresh interpreter, the fastest of repeats runs,
+    # with the wall time of the whole process and the heavy modules it imported
+    code = 'import sys, time\n' + \
+        't_start = time.perf_counter()\n' + \
+        f'import {module_name}\n' + \
+        'print(time.perf_counter() - t_start)\n' + \
+        f'print(",".join([m for m in {LIST_OF_HEAVY_MODULES} if m in sys.modules]))\n'
+    list_of_import_times = []
+    list_of_process_times = []
+    for i in range(repeats):
+        t_start = time.perf_counter()
+        out = subprocess.run([sys.executable,'-c',code],capture_output=True,text=True,\
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        list_of_process_times.append(time.perf_counter() - t_start)
+        if ( out.returncode != 0 ):
+            raise Exception(f'Importing {module_name} failed\n{out.stderr}')
+        lines = out.stdout.split('\n')
+        list_of_import_times.append(float(lines[-3]))
+    heavy_modules = [m for m in lines[-2].split(',') if len(m) > 0]
+    return {'case':'import ' + module_name,'import_time_s':min(list_of_import_times),\
+        'process_time_s':min(list_of_process_times),'heavy_modules':heavy_modules}
+
+def run_startup_benchmarks(repeats=5):
+    list_of_results = []
+    for module_name in LIST_OF_ENTRY_POINTS:
+        result = run_startup_case(module_name,repeats=repeats)
+        list_of_results.append(result)
+        print(f"{result['case']:<42} {result['import_time_s']:>9.2f} s import " + \
+            f"{result['process_time_s']:>6.2f} s process, heavy modules: " + \
+            (', '.join(result['heavy_modules']) if len(result['heavy_modules']) > 0 else 'none'))
+    return list_of_results
+
+def get_git_commit():
+    try:
+        out = subprocess.run(['git','rev-parse','--short','HEAD'],capture_output=True,\
+            text=True,cwd=os.path.dirname(os.path.abspath(__file__)),timeout=10)
+    except Exception:
+        return None
+    if ( out.returncode != 0 ):
+        return None
+    return out.stdout.strip()
+
+def append_to_history(history_filename,entry):
+    if ( os.path.exists(history_filename) ):
+        with open(history_filename,'r') as f:
+            history = json.load(f)
+    else:
+        history = []
+    history.append(entry)
+    with open(history_filename,'w') as f:
+        json.dump(history,f,indent=4)
+
+def run_benchmarks(list_of_num_files=(10,100,1000),list_of_cases=None,\
+    history_filename='benchmark_history.json',work_path=None,samples_per_state=20,\
+    sn='ASVTEST12',startup=True):
+    if ( list_of_cases is None ):
+        list_of_cases = ['extract_summary_and_raw_to_csv',\
+            'plot_and_produce_report_w_extra_checks'] + LIST_OF_LOADERS
+    history_filename = os.path.abspath(history_filename)
+
+    remove_work_path = work_path is None
+    if ( work_path is None ):
+        work_path = tempfile.mkdtemp(prefix='asvco2_benchmark_')
+    work_path = os.path.abspath(work_path)
+    # the report functions write some of their files relative to the working folder
+    original_cwd = os.getcwd()
+    os.chdir(work_path)
+
+    entry = {'datetime':dt.datetime.now(dt.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),\
+        'git_commit':get_git_commit(),'python':platform.python_version(),\
+        'pandas':pd.__version__,'numpy':np.__version__,'platform':platform.platform(),\
+        'samples_per_state':samples_per_state,'results':[],'startup':[]}
+    if ( startup ):
+        entry['startup'] = run_startup_benchmarks()
+    try:
+        for num_files in list_of_num_files:
+            path_to_data = os.path.join(work_path,f'{sn}_{num_files}_files')
+            if ( os.path.exists(path_to_data) ):
+                shutil.rmtree(path_to_data)
+            validation_text_filename = write_synthetic_dataset(path_to_data,sn=sn,\
+                num_cycles=num_files,samples_per_state=samples_per_state)
+            for case_name in list_of_cases:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                    result = executor.submit(run_case,case_name,sn,path_to_data,\
+                        validation_text_filename).result()
+                result['case'] = case_name
+                result['num_files'] = num_files
+                entry['results'].append(result)
+                print(f"{case_name:<42} {num_files:>5} files {result['wall_time_s']:>9.2f} s " + \
+                    (f"{result['peak_rss_mb']:>8.1f} MB" if result['peak_rss_mb'] is not None else ''))
+    finally:
+        os.chdir(original_cwd)
+        if ( remove_work_path ):
+            shutil.rmtree(work_path,ignore_errors=True)
+
+    append_to_history(history_filename,entry)
+    return entry
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the post processing on synthetic data')
+    parser.add_argument('--num-files',type=int,nargs='+',default=[10,100,1000],\
+        help='numbers of ALL files to benchmark')
+    parser.add_argument('--cases',nargs='+',default=None,\
+        help='functions to benchmark, default is all of them')
+    parser.add_argument('--history',default='benchmark_history.json',\
+        help='json file the results are appended to')
+    parser.add_argument('--work-path',default=None,\
+        help='folder for the synthetic data, a temporary folder by default')
+    parser.add_argument('--samples-per-state',type=int,default=20,\
+        help='2 Hz samples in each state of the synthetic ALL files')
+    parser.add_argument('--startup-only',action='store_true',\
+        help='only time the imports of the entry points')
+    parser.add_argument('--no-startup',action='store_true',\
+        help='leave out the import times of the entry points')
+    args = parser.parse_args()
+
+    run_benchmarks(list_of_num_files=[] if args.startup_only else args.num_files,\
+        list_of_cases=args.cases,history_filename=args.history,work_path=args.work_path,\
+        samples_per_state=args.samples_per_state,startup=not args.no_startup)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registry of the LI-COR calibration tables used by the report, the oven test
+slopes (slope_cal_1 and slope_cal_2) and the span2 coefficient at 20 deg of the
+2nd cal, with its cell temperature (span2_20deg_cal2_temp).
+
+The versions of the tables are listed in config/calibration_tables.json, one
+entry per version with the date (YYYYMMDD) from which it is valid and the csv
+filename of each table in the config folder. The version for a validation run
+is the latest one valid on the date of its validation file, or the oldest
+version for runs before all of them. Each version is read once per process
+and kept in CALIBRATION_REGISTRY, keyed by (LI-COR serial, coefficient, cal
+number) for the slopes and by LI-COR serial for span2, and read again only if
+one of its files changed. LI-COR serials are normalized to lowercase letters,
+cga-XXXX, as in the tables.
+
+Example,
+    S1_lab, span2_temp, slope = get_span2_calibration('CGA-5081', '20220325')
+"""
+import os
+import re
+import pandas as pd
+from config_cache import CONFIG_PATH, get_config_file
+
+LIST_OF_SLOPE_TABLES = [('slope_cal_1',1),('slope_cal_2',2)]
+
+# tables by (config path, valid_from), filled as they are needed
+CALIBRATION_REGISTRY = {}
+
+def normalize_licor_serial(licorsernum):
+    # convert licorsernum with CGA-XXXX to lowercase cga-XXXX, where XXXX represents digits
+    m = re.match(r'\s*(\w+)-(\d+)',licorsernum)
+    if ( m and len(m.groups()) == 2 ):
+        letters = m.groups()[0]
+        numbers = m.groups()[1]
+        # need to swap from uppercase to lower case for csv file lookup
+        if ( letters.isupper() ):
+            letters = letters.lower()
+        return letters + '-' + numbers
+    else:
+        raise Exception(f'Unexpected serialnumber found {licorsernum}')
+
+def get_date_of_validation_file(validation_text_filename):
+    # YYYYMMDD of a validation file named <SN>_VAL_YYYYMMDD-HHMMSS.txt, or None
+    m = re.search(r'(\d{8})-(\d{6})\.txt',validation_text_filename)
+    if ( m ):
+        return m.groups()[0]
+    return None
+
+def load_calibration_table_list(config_path=CONFIG_PATH):
+    # Entries of calibration_tables.json sorted by valid_from, see config_cache.py
+    list_of_versions = get_config_file(os.path.join(config_path,'calibration_tables.json'))
+    return sorted(list_of_versions,key=lambda version: version['valid_from'])
+
+def get_calibration_version(date=None, config_path=CONFIG_PATH):
+    # Entry of calibration_tables.json valid on date (YYYYMMDD), the latest one if date is None
+    list_of_versions = load_calibration_table_list(config_path)
+    if ( date is None ):
+        return list_of_versions[-1]
+    valid_versions = [version for version in list_of_versions if version['valid_from'] <= date]
+    if ( len(valid_versions) == 0 ):
+        print(f"No calibration tables valid on {date}, using the oldest ones from {list_of_versions[0]['valid_from']}")
+        return list_of_versions[0]
+    return valid_versions[-1]
+
+def add_to_table(table, key, entry):
+    # a key listed more than once is kept as a list, which get_calibration_entry() refuses
+    if ( key in table ):
+        if not ( isinstance(table[key],list) ):
+            table[key] = [table[key]]
+        table[key].append(entry)
+    else:
+        table[key] = entry
+
+def load_calibration_version(version, config_path=CONFIG_PATH):
+    # Reads the tables of one entry of calibration_tables.json into dictionaries
+    tables = {'valid_from':version['valid_from'],'slope':{},'span2_20deg_cal2_temp':{},\
+        'signatures':{}}
+    for table_name, calnum in LIST_OF_SLOPE_TABLES:
+        filename = os.path.join(config_path,version[table_name])
+        df = pd.read_csv(filename,index_col=0)
+        for coefficient, serial, slope, R2 in zip(df.index,df['Serialnum'],df['slope'],df['R2']):
+            add_to_table(tables['slope'],(normalize_licor_serial(serial),coefficient,calnum),\
+                {'slope':float(slope),'R2':float(R2)})
+    filename = os.path.join(config_path,version['span2_20deg_cal2_temp'])
+    df = pd.read_csv(filename)
+    for serial, celltemp, co2kspan2 in zip(df['serialnum'],df['celltemp'],df['co2kspan2']):
+        add_to_table(tables['span2_20deg_cal2_temp'],normalize_licor_serial(serial),\
+            {'celltemp':float(celltemp),'co2kspan2':float(co2kspan2)})
+    tables['signatures'] = get_version_signatures(version,config_path)
+    return tables
+
+def get_version_signatures(version, config_path=CONFIG_PATH):
+    signatures = {}
+    for table_name in [name for name, calnum in LIST_OF_SLOPE_TABLES] + ['span2_20deg_cal2_temp']:
+        file_stat = os.stat(os.path.join(config_path,version[table_name]))
+        signatures[table_name] = [file_stat.st_size,file_stat.st_mtime_ns]
+    return signatures
+
+def get_calibration_tables(date=None, config_path=CONFIG_PATH):
+    # Tables valid on date, read only the first time or when one of their files changed
+    version = get_calibration_version(date,config_path)
+    key = (config_path,version['valid_from'])
+    if ( key not in CALIBRATION_REGISTRY or \
+        CALIBRATION_REGISTRY[key]['signatures'] != get_version_signatures(version,config_path) ):
+        CALIBRATION_REGISTRY[key] = load_calibration_version(version,config_path)
+    return CALIBRATION_REGISTRY[key]
+
+def get_calibration_entry(table, key, table_name):
+    if ( key not in table ):
+        raise Exception(f'{key} not found in the {table_name} calibration table')
+    if ( isinstance(table[key],list) ):
+        raise Exception(f'{key} is listed {len(table[key])} times in the {table_name} calibration table')
+    return table[key]
+
+def get_span2_calibration(licorsernum, date=None, calnum=2, config_path=CONFIG_PATH):
+    # Returns S1_lab (co2kspan2 at 20 deg of the 2nd cal), span2_temp (its cell temperature)
+    # and the co2kspan2 slope from the oven test of cal calnum, for the LI-COR licorsernum
+    tables = get_calibration_tables(date,config_path)
+    licorsernum = normalize_licor_serial(licorsernum)
+    span2 = get_calibration_entry(tables['span2_20deg_cal2_temp'],licorsernum,\
+        'span2_20deg_cal2_temp ' + tables['valid_from'])
+    oven_test = get_calibration_entry(tables['slope'],(licorsernum,'co2kspan2',calnum),\
+        'slope_cal_' + str(calnum) + ' ' + tables['valid_from'])
+    return span2['co2kspan2'], span2['celltemp'], oven_test['slope']
+
+def load_calibration_registry(config_path=CONFIG_PATH):
+    # Reads every version listed in calibration_tables.json, e.g. before starting worker
+    # processes, which then share them
+    for version in load_calibration_table_list(config_path):
+        get_calibration_tables(version['valid_from'],config_path)
+    return CALIBRATION_REGISTRY
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Typed, compressed Parquet and Feather output of the raw, stats and summary
+dataframes, next to the csv files used for ERDDAP.
+
+The csv path keeps every value as text. Here the text columns are cast to
+float, integer, UTC timestamp or categorical (for the mode columns) before
+writing. Parquet and Feather need pyarrow, which is optional, pip install pyarrow.
+
+Large outputs, e.g. the raw rows of a month long run, can be written one
+dataframe at a time with open_output_stream(), append_df_to_output_stream()
+and close_output_stream(), so the whole output is never in memory at once.
+The columns of the output are those of all the dataframes, in the order they
+first appear, as with pd.concat(). Columns missing from a dataframe are left
+blank. When a dataframe brings new columns, what was written so far is
+rewritten with the new columns added, blank. The Parquet and Feather column
+types are those of the first dataframe with the column, the following
+dataframes are cast to them. When a column of a dataframe cannot be cast, e.g.
+the firmware version '1.8' followed by '1.9.2', the column is widened, integer
+to float and anything else to text, and what was written so far is rewritten
+with the wider type. Parquet gets a row group per dataframe.
+
+Example,
+    stream = open_output_stream('./reports/csv/raw_ASVTEST12_20220325',['csv','parquet'])
+    for df in list_of_df:
+        append_df_to_output_stream(stream,df)
+    list_of_filenames = close_output_stream(stream)
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+def cast_df_for_columnar_output(df):
+    # Returns a copy of df where object (text) columns are given explicit dtypes.
+    # Empty or blank strings are treated as missing values.
+    #   State, mode, INSTRUMENT_STATE -> category
+    #   ISO-8601 timestamps, YYYY-MM-DDThh:mm:ss(.s)Z -> datetime64[ns, UTC]
+    #   integers -> Int64 (nullable), other numbers -> float64
+    #   anything else stays as text
+    categorical_columns = ['State','mode','Mode','INSTRUMENT_STATE']
+    ts_re = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d*)?Z$'
+    int_re = r'^[+-]?\d+$'
+    num_re = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$|^[+-]?(nan|NaN|inf)$'
+
+    df = df.copy()
+    for col in df.columns:
+        if ( col in categorical_columns ):
+            df[col] = df[col].astype(str).str.strip().astype('category')
+            continue
+        if ( df[col].dtype != object ):
+            continue
+
+        as_str = df[col].map(lambda x: x.strip() if isinstance(x,str) else x)
+        is_missing = as_str.isna() | (as_str == '')
+        present = as_str[~is_missing]
+        if ( len(present) == 0 ):
+            continue  # nothing to go by, leave as text
+
+        # numbers which are already floats or ints, e.g. typed DATA columns, count as numbers
+        is_number = present.map(lambda x: not isinstance(x,str))
+        present_str = present.astype(str)
+        if ( (is_number | present_str.str.match(num_re)).all() ):
+            is_int = present.map(lambda x: isinstance(x,(int,np.integer))) | \
+                (~is_number & present_str.str.match(int_re))
+            if ( is_int.all() ):
+                df[col] = pd.to_numeric(as_str.where(~is_missing),errors='coerce').astype('Int64')
+            else:
+                df[col] = pd.to_numeric(as_str.where(~is_missing),errors='coerce').astype('float64')
+        elif ( (~is_number & present_str.str.match(ts_re)).all() ):
+            df[col] = pd.to_datetime(as_str.where(~is_missing),utc=True)
+
+    return df
+
+def write_df_to_file(df, filename_without_extension, output_format='csv'):
+    # output_format is 'csv', 'parquet' or 'feather', the extension is added here.
+    # Returns the full filename.
+    if ( output_format == 'csv' ):
+        filename = filename_without_extension + '.csv'
+        df.to_csv(filename, index=False)
+        return filename
+
+    if ( output_format not in ['parquet','feather'] ):
+        raise Exception(f'Unknown output format {output_format}, expected csv, parquet or feather')
+    try:
+        import pyarrow
+    except ImportError:
+        raise Exception(f'Writing {output_format} files requires pyarrow, pip install pyarrow')
+
+    df_typed = cast_df_for_columnar_output(df).reset_index(drop=True)
+    if ( output_format == 'parquet' ):
+        filename = filename_without_extension + '.parquet'
+        df_typed.to_parquet(filename, index=False, compression='zstd')
+    else:
+        filename = filename_without_extension + '.feather'
+        df_typed.to_feather(filename, compression='zstd')
+
+    return filename
+
+def open_output_stream(filename_without_extension, output_formats=('csv',)):
+    # Returns the stream, a dictionary, for append_df_to_output_stream(). Everything is
+    # written to .tmp files which close_output_stream() moves in place, so an interrupted
+    # run leaves the files of the last run as they were.
+    for output_format in output_formats:
+        if ( output_format not in ['csv','parquet','feather'] ):
+            raise Exception(f'Unknown output format {output_format}, expected csv, parquet or feather')
+        if ( output_format in ['parquet','feather'] ):
+            try:
+                import pyarrow
+            except ImportError:
+                raise Exception(f'Writing {output_format} files requires pyarrow, pip install pyarrow')
+    filenames = {output_format:filename_without_extension + '.' + output_format \
+        for output_format in output_formats}
+    return {'filenames':filenames,'columns':None,'schema':None,'arrow_writers':{},'categories':{},\
+        'rows':0}
+
+def get_arrow_fields(table):
+    import pyarrow as pa
+    # all blank columns are kept as text
+    return [pa.field(field.name,pa.string()) if field.type == pa.null() else field \
+        for field in table.schema]
+
+def get_arrow_table(stream, df):
+    import pyarrow as pa
+    df_typed = cast_df_for_columnar_output(df).reset_index(drop=True)
+    # Feather files can only add to the dictionary of a categorical column, so each
+    # dataframe gets the categories of the ones before it followed by its new ones
+    for col in df_typed.columns:
+        if ( df_typed[col].dtype.name == 'category' ):
+            categories = stream['categories'].setdefault(col,[])
+            categories += [cat for cat in df_typed[col].cat.categories if cat not in categories]
+            df_typed[col] = df_typed[col].cat.set_categories(categories)
+    table = pa.Table.from_pandas(df_typed, preserve_index=False)
+    if ( stream['schema'] is None ):
+        stream['schema'] = pa.schema(get_arrow_fields(table),metadata=table.schema.metadata)
+    if not ( table.schema.equals(stream['schema'],check_metadata=False) ):
+        try:
+            table = table.cast(stream['schema'])
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            widen_columns_of_output_stream(stream, table)
+            try:
+                table = table.cast(stream['schema'])
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise Exception(f'Rows {stream["rows"]} and on do not have the column types of ' + \
+                    f'the first rows of {list(stream["filenames"].values())}, {e}')
+    return table
+
+def widen_columns_of_output_stream(stream, table):
+    # The columns of table which cannot be cast to the type of the stream get a type
+    # both fit in, float64 if both are numbers, else string. What was written so far
+    # is rewritten with the new types.
+    import pyarrow as pa
+    schema = stream['schema']
+    pandas_metadata = json.loads(schema.metadata[b'pandas']) \
+        if schema.metadata is not None and b'pandas' in schema.metadata else None
+    widened = {}
+    for field in table.schema:
+        if ( field.name not in schema.names or field.type == schema.field(field.name).type ):
+            continue
+        try:
+            table.column(field.name).cast(schema.field(field.name).type)
+            continue
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+        stream_type = schema.field(field.name).type
+        is_number = [pa.types.is_integer(t) or pa.types.is_floating(t) for t in [field.type,stream_type]]
+        if ( all(is_number) ):
+            widened[field.name] = (pa.float64(),'float64','float64')
+        else:
+            widened[field.name] = (pa.string(),'unicode','object')
+        schema = schema.set(schema.get_field_index(field.name),\
+            pa.field(field.name,widened[field.name][0]))
+    if ( len(widened) == 0 ):
+        return
+    # pandas reads the columns back with the dtypes of the metadata, e.g. Int64
+    if ( pandas_metadata is not None ):
+        for column in pandas_metadata['columns']:
+            if ( column['name'] in widened ):
+                column['pandas_type'] = widened[column['name']][1]
+                column['numpy_type'] = widened[column['name']][2]
+                column['metadata'] = None
+        schema = schema.with_metadata({**schema.metadata,b'pandas':json.dumps(pandas_metadata).encode('utf-8')})
+    print(f'Widened columns {list(widened.keys())} of {list(stream["filenames"].values())} ' + \
+        f'to {[str(field_type[0]) for field_type in widened.values()]} at row {stream["rows"]}')
+    stream['schema'] = schema
+    rewrite_arrow_files(stream, [])
+
+def add_columns_to_output_stream(stream, df, new_columns):
+    # Rewrites the .tmp files written so far with new_columns added at the end, blank.
+    # The csv file is read back a chunk at a time, not all at once.
+    stream['columns'] = stream['columns'] + new_columns
+    for output_format, filename in stream['filenames'].items():
+        if ( output_format == 'csv' ):
+            # nothing to rewrite before the first rows, the header is written with them
+            if ( stream['rows'] == 0 ):
+                continue
+            first_chunk = True
+            for df_written in pd.read_csv(filename + '.tmp',dtype=str,keep_default_na=False,\
+                chunksize=100000):
+                df_written.reindex(columns=stream['columns']).to_csv(filename + '.tmp2',\
+                    mode='w' if first_chunk else 'a',header=first_chunk,index=False)
+                first_chunk = False
+            os.replace(filename + '.tmp2', filename + '.tmp')
+
+    if ( stream['schema'] is None ):
+        return
+    import pyarrow as pa
+    new_table = pa.Table.from_pandas(cast_df_for_columnar_output(df[new_columns]).reset_index(drop=True),\
+        preserve_index=False)
+    schema = stream['schema']
+    for field in get_arrow_fields(new_table):
+        schema = schema.append(field)
+    stream['schema'] = schema
+    rewrite_arrow_files(stream, new_columns)
+
+def rewrite_arrow_files(stream, new_columns):
+    # Rewrites the Parquet and Feather .tmp files written so far with the schema of the
+    # stream, new_columns are added blank. The files are read back a row group or
+    # record batch at a time.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = stream['schema']
+    for output_format, writer in list(stream['arrow_writers'].items()):
+        # the writer is closed, its file read back into a new writer with the new schema,
+        # which is kept open for the following dataframes
+        writer.close()
+        filename = stream['filenames'][output_format]
+        os.replace(filename + '.tmp', filename + '.tmp.old')
+        with pa.OSFile(filename + '.tmp.old','rb') as f:
+            if ( output_format == 'parquet' ):
+                written = pq.ParquetFile(f)
+                list_of_tables = [written.read_row_group(idx) for idx in range(written.num_row_groups)]
+                new_writer = pq.ParquetWriter(filename + '.tmp', schema, compression='zstd')
+            else:
+                written = pa.ipc.open_file(f)
+                list_of_tables = [pa.Table.from_batches([written.get_batch(idx)]) \
+                    for idx in range(written.num_record_batches)]
+                new_writer = pa.ipc.new_file(filename + '.tmp', schema,\
+                    options=pa.ipc.IpcWriteOptions(compression='zstd',emit_dictionary_deltas=True))
+            for table in list_of_tables:
+                for col in new_columns:
+                    table = table.append_column(schema.field(col),\
+                        pa.nulls(table.num_rows,type=schema.field(col).type))
+                new_writer.write_table(table.cast(schema))
+        os.remove(filename + '.tmp.old')
+        stream['arrow_writers'][output_format] = new_writer
+
+def append_df_to_output_stream(stream, df):
+    # Columns which are not in the dataframes so far are added to the output,
+    # missing ones are left blank, see add_columns_to_output_stream()
+    if ( stream['columns'] is None ):
+        stream['columns'] = df.columns.to_list()
+    else:
+        new_columns = [col for col in df.columns if col not in stream['columns']]
+        if ( len(new_columns) > 0 ):
+            add_columns_to_output_stream(stream, df, new_columns)
+        df = df.reindex(columns=stream['columns'])
+
+    for output_format, filename in stream['filenames'].items():
+        if ( output_format == 'csv' ):
+            if ( stream['rows'] == 0 ):
+                df.to_csv(filename + '.tmp', index=False)
+            else:
+                df.to_csv(filename + '.tmp', mode='a', header=False, index=False)
+            continue
+
+        table = get_arrow_table(stream, df)
+        if ( output_format not in stream['arrow_writers'] ):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if ( output_format == 'parquet' ):
+                stream['arrow_writers'][output_format] = pq.ParquetWriter(filename + '.tmp',\
+                    stream['schema'], compression='zstd')
+            else:
+                stream['arrow_writers'][output_format] = pa.ipc.new_file(filename + '.tmp',\
+                    stream['schema'], options=pa.ipc.IpcWriteOptions(compression='zstd',\
+                    emit_dictionary_deltas=True))
+        stream['arrow_writers'][output_format].write_table(table)
+
+    stream['rows'] += len(df)
+
+def close_output_stream(stream):
+    # Moves the files in place and returns their filenames, nothing is written if
+    # no dataframe was appended
+    for writer in stream['arrow_writers'].values():
+        writer.close()
+    list_of_filenames = []
+    for output_format, filename in stream['filenames'].items():
+        if ( os.path.exists(filename + '.tmp') ):
+            os.replace(filename + '.tmp', filename)
+            list_of_filenames.append(filename)
+    return list_of_filenames
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of the config files, the json files in config/ and
+code/referencegases.txt.
+
+Each file is read and validated the first time it is needed and kept in
+CONFIG_CACHE with its size and mtime. It is read again only when one of them
+changed, so a long running process (the watch mode, the fleet batch runner)
+picks up an edited file. The values are returned immutable, lists as tuples
+and dictionaries as read-only mappings, since they are shared by every caller.
+
+The paths are built with os.path.join from PROJECT_ROOT, so they work on
+Windows and Linux alike.
+
+Example,
+    gaslist = get_reference_gases()  # (1961.39, 349.79, 0.0, ...)
+    for d in get_gas_standard_tag_ranges():
+        print(d['min'], d['max'], d['tag'])
+"""
+import os
+import json
+import types
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONFIG_PATH = os.path.join(PROJECT_ROOT,'code','post_processing','config')
+REFERENCEGASES_TXT_FILENAME = os.path.join(PROJECT_ROOT,'code','referencegases.txt')
+
+# filename -> {'signature':[size, mtime], 'value':...}
+CONFIG_CACHE = {}
+
+def freeze(value):
+    # read-only copy of what json.load() returns
+    if ( isinstance(value,dict) ):
+        return types.MappingProxyType({k:freeze(v) for k, v in value.items()})
+    if ( isinstance(value,list) ):
+        return tuple([freeze(v) for v in value])
+    return value
+
+def read_referencegases_txt(filename):
+    # the values are on the second line, comma separated, below a line of names
+    with open(filename,'r',encoding='utf-8') as f:
+        lines = [line for line in f.read().splitlines() if len(line.strip()) > 0]
+    if ( len(lines) < 2 ):
+        raise Exception(f'No reference gases found in {filename}')
+    try:
+        return tuple([float(x) for x in lines[1].split(',')])
+    except ValueError:
+        raise Exception(f'Reference gases in {filename} are not all numbers, {lines[1]}')
+
+def validate_ranges(ranges, filename, lower_key, upper_key):
+    # list of {lower_key:number, upper_key:number, 'tag':text} with lower <= upper
+    if not ( isinstance(ranges,list) ):
+        raise Exception(f'{filename} should hold a list of ranges')
+    for d in ranges:
+        if not ( isinstance(d,dict) and set(d.keys()) >= set([lower_key,upper_key,'tag']) ):
+            raise Exception(f'Range {d} in {filename} needs {lower_key}, {upper_key} and tag')
+        if not ( isinstance(d[lower_key],(int,float)) and isinstance(d[upper_key],(int,float)) ):
+            raise Exception(f'Range {d} in {filename} has a {lower_key} or {upper_key} that is not a number')
+        if ( d[lower_key] > d[upper_key] ):
+            raise Exception(f'Range {d} in {filename} has {lower_key} > {upper_key}')
+    return ranges
+
+def validate_missing_by_sn(missing_by_sn, filename):
+    # {serial number: {name: value}}
+    if not ( isinstance(missing_by_sn,dict) and \
+        all([isinstance(v,dict) for v in missing_by_sn.values()]) ):
+        raise Exception(f'{filename} should hold a dictionary of values by serial number')
+    return missing_by_sn
+
+def validate_calibration_tables(list_of_versions, filename):
+    # list of {'valid_from':'YYYYMMDD', <table name>:<csv filename in config/>}, see calibration_registry.py
+    if not ( isinstance(list_of_versions,list) and len(list_of_versions) > 0 ):
+        raise Exception(f'No calibration tables listed in {filename}')
+    for version in list_of_versions:
+        if not ( isinstance(version,dict) and isinstance(version.get('valid_from'),str) and \
+            len(version['valid_from']) == 8 and version['valid_from'].isdigit() ):
+            raise Exception(f'Entry {version} in {filename} needs a valid_from date YYYYMMDD')
+        for table_name in ['slope_cal_1','slope_cal_2','span2_20deg_cal2_temp']:
+            if ( table_name not in version ):
+                raise Exception(f'Entry {version} in {filename} has no {table_name} table')
+    return list_of_versions
+
+# validation of the json files in config/, by filename
+JSON_VALIDATORS = {
+    'calibration_tables.json':validate_calibration_tables,
+    'gas_standard_tag_ranges.json':\
+        lambda value, filename: validate_ranges(value,filename,'min','max'),
+    'summary_gas_standard_tag_ranges.json':\
+        lambda value, filename: validate_ranges(value,filename,'lower','upper'),
+    'missing_from_10XX_v1_8.json':validate_missing_by_sn,
+    'missing_from_Saildrone_v1_8.json':validate_missing_by_sn,
+}
+
+def get_config_file(filename):
+    # Contents of a config file, read again only if its size or mtime changed.
+    # referencegases.txt is a tuple of floats, json files are what json.load()
+    # returns, checked with JSON_VALIDATORS and frozen.
+    filename = os.path.abspath(filename)
+    file_stat = os.stat(filename)
+    signature = [file_stat.st_size,file_stat.st_mtime_ns]
+    if ( filename in CONFIG_CACHE and CONFIG_CACHE[filename]['signature'] == signature ):
+        return CONFIG_CACHE[filename]['value']
+
+    if ( filename.endswith('.json') ):
+        with open(filename,'r',encoding='utf-8') as f:
+            value = json.load(f)
+        validator = JSON_VALIDATORS.get(os.path.basename(filename))
+        if ( validator is not None ):
+            value = validator(value,filename)
+        value = freeze(value)
+    else:
+        value = read_referencegases_txt(filename)
+    CONFIG_CACHE[filename] = {'signature':signature,'value':value}
+    return value
+
+def get_reference_gases():
+    # reference gases in ppm, in the order of referencegases.txt
+    return get_config_file(REFERENCEGASES_TXT_FILENAME)
+
+def get_gas_standard_tag_ranges():
+    # ({'min':...,'max':...,'tag':...}, ...) of the gas_standard_tag column
+    return get_config_file(os.path.join(CONFIG_PATH,'gas_standard_tag_ranges.json'))
+
+def get_summary_gas_standard_tag_ranges():
+    # ({'lower':...,'upper':...,'tag':...}, ...) of the summary rows and tables
+    return get_config_file(os.path.join(CONFIG_PATH,'summary_gas_standard_tag_ranges.json'))
+
+def get_missing_from_v1_8(kind):
+    # values missing from the v1.8 firmware reports by serial number, kind is '10XX' or 'Saildrone'
+    return get_config_file(os.path.join(CONFIG_PATH,'missing_from_' + kind + '_v1_8.json'))
+
+def load_config():
+    # Reads every json file in config/ and referencegases.txt, returns them by filename
+    config = {os.path.basename(REFERENCEGASES_TXT_FILENAME):get_reference_gases()}
+    for filename in sorted(os.listdir(CONFIG_PATH)):
+        if ( filename.endswith('.json') ):
+            config[filename] = get_config_file(os.path.join(CONFIG_PATH,filename))
+    return config
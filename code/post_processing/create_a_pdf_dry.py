@@ -1,7 +1,6 @@
 """
 @author: nespeca
 """
-from matplotlib.pyplot import title
 from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, PageBreak
@@ -12,6 +11,7 @@ from reportlab.lib import colors
 from reportlab.rl_config import defaultPageSize
 import pandas as pd
 from pass_fail_processing import calculate_pf_df, calculate_pf_df_v2
+from pipeline_profiler import profile_function, profile_stage
 import re
 import os
 
@@ -1714,6 +1714,7 @@ def get_report_text_from_val_file(validation_text_filename):
     return output_text
 
 
+@profile_function()
 def generate_bigger_validation_report_reordered_Feb_2022(output_folder,sn,date_range,\
     figure_filenames_and_sizes,tuple_of_df_4_tables,validation_text_filename,final_text=''):
     document = []
@@ -2214,7 +2215,8 @@ def generate_bigger_validation_report_reordered_Feb_2022(output_folder,sn,date_r
         rightMargin=1*inch, leftMargin=1*inch,\
         topMargin=1*inch, bottomMargin=1*inch)
 
-    doc.build(document, onFirstPage=myFirstPage, onLaterPages=myLaterPages)
+    with profile_stage('generate_bigger_validation_report_reordered_Feb_2022: doc.build'):
+        doc.build(document, onFirstPage=myFirstPage, onLaterPages=myLaterPages)
 
 # if __name__ == "__main__":
     #print(inch)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch runner to make the csv files and pdf reports of many ASVCO2 units at once.
+
+Walks a data root for validation files, <data root>/<SN>/<SN>_VAL_YYYYMMDD-HHMMSS.txt,
+next to an ALL folder, and runs extract_summary_and_raw_to_csv() and
+plot_and_produce_report_w_extra_checks() for each of them. Jobs run in separate
+processes, at most max_workers at a time, and never two jobs on the same folder
+at the same time since they write into the same reports folder. A job that takes
+longer than timeout seconds is stopped, failed and timed out jobs are retried up
+to retries more times. The output of each job goes into
+<SN folder>/reports/batch_log_<validation file>, and a manifest with the status
+of every job is written to the data root at the end.
+
+Example, all units under ./data/ with 4 processes,
+    python fleet_batch_runner.py ./data/ --max-workers 4 --timeout 3600
+"""
+import os
+import sys
+import re
+import json
+import time
+import argparse
+import traceback
+import datetime as dt
+import multiprocessing
+
+LIST_OF_STEPS = ['extract','report']
+
+def find_validation_jobs(data_root, list_of_sn=None):
+    # Returns a list of jobs, one per validation file which has an ALL folder next to it
+    jobs = []
+    for dirpath, dirnames, filenames in os.walk(data_root):
+        dirnames[:] = sorted([d for d in dirnames if d not in ['ALL','reports']])
+        if not os.path.isdir(os.path.join(dirpath,'ALL')):
+            continue
+        for filename in sorted(filenames):
+            m = re.match(r'(\w+?)_VAL_\d{8}-\d{6}\.txt$',filename)
+            if ( not m ):
+                continue
+            sn = m.groups()[0]
+            if ( list_of_sn is not None and sn not in list_of_sn ):
+                continue
+            jobs.append({'sn':sn,'path_to_data':os.path.abspath(dirpath),\
+                'validation_text_filename':os.path.abspath(os.path.join(dirpath,filename)),\
+                'status':'queued','attempts':0,'elapsed_s':None,'error':'',\
+                'log_filename':None})
+    return jobs
+
+def run_job(job, steps, use_cache, conn):
+    # Runs in its own process, sends {'status':'done'} or {'status':'failed','error':...}
+    try:
+        reports_path = os.path.join(job['path_to_data'],'reports')
+        if not os.path.exists(reports_path):
+            os.mkdir(reports_path)
+        log_filename = os.path.join(reports_path,'batch_log_' + \
+            os.path.basename(job['validation_text_filename']))
+        log_file = open(log_filename,'a')
+        sys.stdout = log_file
+        sys.stderr = log_file
+        print(f"#### {dt.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')} {job['sn']} " + \
+            f"{job['validation_text_filename']} ####")
+        # debug json files of the validation file are written to the working folder
+        os.chdir(job['path_to_data'])
+
+        import matplotlib
+        matplotlib.use('Agg')  # no display in batch runs
+        path_to_data = job['path_to_data'] + os.sep
+        if ( 'extract' in steps ):
+            from parse_all_into_csv9_dry_Tcorr import extract_summary_and_raw_to_csv
+            extract_summary_and_raw_to_csv(job['sn'],path_to_data,\
+                job['validation_text_filename'],use_cache=use_cache,incremental=use_cache)
+        if ( 'report' in steps ):
+            from postprocessingLICOR import plot_and_produce_report_w_extra_checks
+            # the figures are drawn in this process, the jobs already use max_workers CPUs
+            # and terminate() would leave the processes of a figure pool running
+            plot_and_produce_report_w_extra_checks(job['sn'],path_to_data,\
+                job['validation_text_filename'],use_cache=use_cache,figure_workers=1)
+        log_file.flush()
+        conn.send({'status':'done','log_filename':log_filename})
+    except Exception:
+        error_text = traceback.format_exc()
+        print(error_text)
+        conn.send({'status':'failed','error':error_text})
+    finally:
+        conn.close()
+
+def write_manifest(data_root, jobs, started):
+    manifest_filename = os.path.join(data_root,'batch_manifest_' + \
+        started.strftime('%Y%m%d-%H%M%S') + '.json')
+    counts = {}
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'],0) + 1
+    manifest = {'started':started.strftime('%Y-%m-%dT%H:%M:%S'),\
+        'finished':dt.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),\
+        'counts':counts,'jobs':jobs}
+    with open(manifest_filename,'w') as f:
+        json.dump(manifest,f,indent=4)
+    return manifest_filename
+
+def run_batch(data_root, max_workers=2, timeout=3600, retries=1, steps=LIST_OF_STEPS,\
+    use_cache=True, list_of_sn=None, poll_interval=0.5):
+    # Returns the list of jobs with their final status, done, failed or timeout,
+    # and the manifest filename
+    for step in steps:
+        if ( step not in LIST_OF_STEPS ):
+            raise Exception(f'Unknown step {step}, expected any of {LIST_OF_STEPS}')
+    started = dt.datetime.now()
+    jobs = find_validation_jobs(data_root,list_of_sn)
+    print(f'Found {len(jobs)} validation files under {data_root}')
+    if ( 'report' in steps and len(jobs) > 0 ):
+        # read the calibration tables once here, job processes started with fork share them
+        from calibration_registry import load_calibration_registry
+        load_calibration_registry()
+
+    queue = list(range(len(jobs)))  # indices into jobs, in discovery order
+    running = {}  # index into jobs -> (process, connection, start time)
+    while ( len(queue) > 0 or len(running) > 0 ):
+        #### start jobs, at most one per folder ####
+        busy_folders = [jobs[idx]['path_to_data'] for idx in running]
+        for idx in list(queue):
+            if ( len(running) >= max_workers ):
+                break
+            if ( jobs[idx]['path_to_data'] in busy_folders ):
+                continue
+            queue.remove(idx)
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=run_job,\
+                args=(jobs[idx],steps,use_cache,child_conn))
+            process.start()
+            child_conn.close()
+            jobs[idx]['attempts'] += 1
+            jobs[idx]['status'] = 'running'
+            running[idx] = (process,parent_conn,time.perf_counter())
+            busy_folders.append(jobs[idx]['path_to_data'])
+            print(f"Started {jobs[idx]['sn']} {os.path.basename(jobs[idx]['validation_text_filename'])}, " + \
+                f"attempt {jobs[idx]['attempts']}")
+
+        time.sleep(poll_interval)
+
+        #### collect finished and timed out jobs ####
+        for idx in list(running):
+            process, parent_conn, t_start = running[idx]
+            elapsed = time.perf_counter() - t_start
+            result = None
+            if ( parent_conn.poll() ):
+                try:
+                    result = parent_conn.recv()
+                except EOFError:  # process ended without sending anything
+                    result = {'status':'failed','error':'Job process ended without a result'}
+            elif ( not process.is_alive() ):
+                if ( parent_conn.poll() ):  # result sent just before the process ended
+                    continue
+                result = {'status':'failed','error':f'Job process exited with code {process.exitcode}'}
+            elif ( elapsed > timeout ):
+                process.terminate()
+                result = {'status':'timeout','error':f'Stopped after {timeout} s'}
+            if ( result is None ):
+                continue
+
+            process.join()
+            parent_conn.close()
+            del running[idx]
+            job = jobs[idx]
+            job['elapsed_s'] = elapsed
+            job['status'] = result['status']
+            job['error'] = result.get('error','')
+            job['log_filename'] = result.get('log_filename',os.path.join(job['path_to_data'],\
+                'reports','batch_log_' + os.path.basename(job['validation_text_filename'])))
+            print(f"{job['status']} {job['sn']} {os.path.basename(job['validation_text_filename'])} " + \
+                f"after {elapsed:.1f} s")
+            if ( job['status'] != 'done' and job['attempts'] <= retries ):
+                job['status'] = 'queued'
+                queue.append(idx)
+
+    manifest_filename = write_manifest(data_root,jobs,started)
+    print(f'Manifest written to {manifest_filename}')
+    return jobs, manifest_filename
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Make the csv files and pdf reports of ' + \
+        'every validation file under a data root')
+    parser.add_argument('data_root',help='folder with one subfolder per unit')
+    parser.add_argument('--max-workers',type=int,default=2,help='jobs run at the same time')
+    parser.add_argument('--timeout',type=float,default=3600,help='seconds before a job is stopped')
+    parser.add_argument('--retries',type=int,default=1,help='retries of failed or timed out jobs')
+    parser.add_argument('--steps',nargs='+',default=LIST_OF_STEPS,choices=LIST_OF_STEPS,\
+        help='extract makes the csv files, report makes the pdf report')
+    parser.add_argument('--sn',nargs='+',default=None,help='only these serial numbers')
+    parser.add_argument('--no-cache',action='store_true',help='parse every ALL file again, ' + \
+        'see parse_cache.py and run_manifest.py')
+    args = parser.parse_args()
+
+    jobs, manifest_filename = run_batch(args.data_root,max_workers=args.max_workers,\
+        timeout=args.timeout,retries=args.retries,steps=args.steps,\
+        use_cache=not args.no_cache,list_of_sn=args.sn)
+    if ( any([job['status'] != 'done' for job in jobs]) ):
+        sys.exit(1)
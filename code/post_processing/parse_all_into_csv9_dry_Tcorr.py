@@ -7,18 +7,59 @@ import json
 import numpy as np
 import sys
 import os
-from special_functions import dry_correction, calculate_xco2_from_data_pt_by_pt
+import concurrent.futures
+import collections
+from config_cache import get_reference_gases, get_gas_standard_tag_ranges, \
+    get_summary_gas_standard_tag_ranges
+from special_functions import dry_correction, calculate_xco2_from_data_pt_by_pt, \
+    calculate_xco2_wet_dry_and_dry_Tcorr, match_gas_standards, match_gas_standard_ranges
+from parse_cache import load_from_cache, save_to_cache, evict_cache
+from run_manifest import get_previous_run, save_run
+from columnar_output import write_df_to_file, open_output_stream, append_df_to_output_stream, \
+    close_output_stream
+from pipeline_profiler import profile_stage, profile_function, start_stage, stop_stage, \
+    write_profile
+
+#### line tags of ALL files, a line belongs to every tag found anywhere in it ####
+ASVALL_LINE_TAGS = ['COEFF','STATS','DATA','DRY','FLAGS','LOG']
+
+def tokenize_ASVall_file(filename):
+    # Read an ALL file once and sort its lines by tag, so that the loadASVall_*()
+    # functions below do not have to re-open and re-scan the file. A line is put
+    # under every tag of ASVALL_LINE_TAGS it contains, the same substring match the
+    # loaders used when each of them read the file, e.g. 'COEFF' in line. Lines are
+    # kept as (line number in the file starting at 1, line without the newline).
+    # System report lines, key=value, are only collected before the first LOG: line.
+    parsed_file = {'filename':filename,'sys_rep':{}}
+    for tag in ASVALL_LINE_TAGS:
+        parsed_file[tag] = []
+    sys_rep_done = False
+    with open(filename, 'rt') as myfile:
+        for linenum, line in enumerate(myfile,start=1):
+            line = line.rstrip('\n')
+            if ( not sys_rep_done ):
+                if '=' in line:  # equals sign found and system report likely
+                    lhs_and_rhs = re.split(r'=',line.strip())
+                    parsed_file['sys_rep'][lhs_and_rhs[0].strip()]=lhs_and_rhs[1]
+                if 'LOG:' in line:
+                    sys_rep_done = True
+            for tag in ASVALL_LINE_TAGS:
+                if ( tag in line ):
+                    parsed_file[tag].append((linenum,line))
+
+    return parsed_file
+
+def get_parsed_ASVall_file(filename_or_parsed_file):
+    # loadASVall_*() functions accept either a filename or the output of
+    # tokenize_ASVall_file(), only tokenize when given a filename
+    if ( isinstance(filename_or_parsed_file,dict) ):
+        return filename_or_parsed_file
+    else:
+        return tokenize_ASVall_file(filename_or_parsed_file)
 
 def loadASVall_coeff(filename):
-    coeff = []
-    # apoff = []
-    linenum = 0
-    pattern_coeff = re.compile("COEFF")  
-    with open(filename, 'rt') as myfile:
-        for line in myfile:
-            linenum += 1
-            if pattern_coeff.search(line) != None:  # If a match is found
-                coeff.append((linenum, line.rstrip('\n')))
+    parsed_file = get_parsed_ASVall_file(filename)
+    coeff = list(parsed_file['COEFF'])
     
     # No coeff found, insert NaN and Jan 1st in the year 1 A.D?
     if ( len(coeff) == 0 ):  
@@ -46,15 +87,8 @@ def loadASVall_coeff(filename):
     return df
 
 def loadASVall_coeff_with_dates(filename):
-    coeff = []
-    # apoff = []
-    linenum = 0
-    pattern_coeff = re.compile("COEFF")  
-    with open(filename, 'rt') as myfile:
-        for line in myfile:
-            linenum += 1
-            if pattern_coeff.search(line) != None:  # If a match is found
-                coeff.append((linenum, line.rstrip('\n')))
+    parsed_file = get_parsed_ASVall_file(filename)
+    coeff = list(parsed_file['COEFF'])
     
     # No coeff found, insert NaN and Jan 1st in the year 1 A.D?
     if ( len(coeff) == 0 ):  
@@ -82,15 +116,8 @@ def loadASVall_coeff_with_dates(filename):
     return df
 
 def loadASVall_coeff_sync(filename):
-    coeff = []
-    # apoff = []
-    linenum = 0
-    pattern_coeff = re.compile("COEFF")  
-    with open(filename, 'rt') as myfile:
-        for line in myfile:
-            linenum += 1
-            if pattern_coeff.search(line) != None:  # If a match is found
-                coeff.append((linenum, line.rstrip('\n')))
+    parsed_file = get_parsed_ASVall_file(filename)
+    coeff = list(parsed_file['COEFF'])
     
     # No coeff found, insert NaN and Jan 1st in the year 1 A.D?
     if ( len(coeff) == 0 ):  
@@ -125,7 +152,7 @@ def loadASVall_coeff_sync(filename):
     #### Move coefficient values into corresponding timestamps found in STATS ####
     #### Note that no special knowledge of when the coefficients were updated ####
     #### applies here, as the coefficients will go through all instrument states. #### 
-    df_stats = loadASVall_stats(filename)
+    df_stats = loadASVall_stats(parsed_file)
     #print(df_stats.columns.values)
     list_of_instrument_states = ['ZPON','ZPOFF','ZPPCAL','SPON','SPOFF',\
         'SPPCAL','EPON','EPOFF','APON','APOFF']
@@ -151,40 +178,75 @@ def loadASVall_coeff_sync(filename):
 
     return df_coeff_sync
 
+#### Column names and data types of the DATA and STATS records in ALL files ####
+# Applied once by loadASVall_data() and loadASVall_stats(), so that later steps
+# work on float64/Int64 columns instead of re-casting strings. Timestamp columns
+# ('timestamp') keep the ISO-8601 text from the file, e.g. ' 2022-03-25T22:05:30.0Z'
+# in DATA, because it is the key used to line up DATA, STATS, DRY and the validation
+# file and it is written as-is to the csv files. The raw counts are nullable Int64,
+# so that a count which is missing or not a number does not stop the run.
+ASVALL_DATA_SCHEMA = {'State':'category','TS':'timestamp','SN':'object',\
+    'CO2(ppm)':'float64','Li_Temp(C)':'float64','Li_Pres(kPa)':'float64',\
+    'Li_RawSample':'Int64','Li_RawReference':'Int64','RH(%)':'float64',\
+    'RH_T(C)':'float64','O2(%)':'float64'}
+
+ASVALL_STATS_SCHEMA = {'State':'category','SN':'object','Timestamp':'timestamp',\
+    'Li_Temp_ave(C)':'float64','Li_Temp_sd':'float64',\
+    'Li_Pres_ave(kPa)':'float64','Li_Pres_sd':'float64',\
+    'CO2_ave(PPM)':'float64','CO2_SD':'float64',\
+    'O2_ave(%)':'float64','O2_S':'float64','RH_ave(%)':'float64',\
+    'RH_sd':'float64','RH_T_ave(C)':'float64','Rh_T_sd':'float64',\
+    'Li_RawSample_ave':'Int64','Li_RawSample_sd':'Int64',\
+    'Li_RawDetector_ave':'Int64','Li_RawReference_sd':'Int64'}
+
+def apply_ASVall_schema(df,schema):
+    # Cast the columns of df found in schema, columns not in schema are left alone.
+    # Numbers are converted with errors='coerce', so text like 'nan' or the empty end of
+    # a truncated line, e.g. the last line of a file still being written, is a missing
+    # value. Int64 columns holding a number with decimals are kept as float64.
+    df = df.copy()
+    for col_name, dtype in schema.items():
+        if ( col_name not in df.columns or dtype == 'timestamp' ):
+            continue
+        if ( dtype in ['float64','Int64'] ):
+            values = pd.to_numeric(df[col_name],errors='coerce')
+            if ( dtype == 'Int64' and (values.dropna() % 1 == 0).all() ):
+                values = values.astype('Int64')
+            df[col_name] = values.astype('float64') if dtype == 'float64' else values
+        else:
+            df[col_name] = df[col_name].astype(dtype)
+    return df
+
 def loadASVall_stats(filename):
     stats = []
-    pattern_stats = re.compile("STATS")  
-    with open(filename, 'rt') as myfile:
-        linenum = 0
-        lines = myfile.readlines()
-        first_header_entered=False
-        for idx, line in enumerate(lines):  # start from reverse
-            if pattern_stats.search(line) != None:  # If a match is found
-                line=line.rstrip('\n')  ### add in another strip or replace here, found whitespace
-                right_of_STATS=re.split(r'STATS:',line)[1]
-                letter_score = sum([c.isalpha() for c in right_of_STATS]) \
-                    /len(right_of_STATS)
-                header_detected = letter_score > 0.5
-                if ( (not header_detected) and \
-                    (first_header_entered) ):
-                    stats.append((idx,right_of_STATS))
-                elif ( (not first_header_entered) and \
-                    header_detected and \
-                    re.search(r'(\w+,)+',right_of_STATS) ): #'State' in right_of_STATS ):
-                    first_part_of_header = right_of_STATS.replace(' ','')
-                    # This is most likely unnecessary, initially thought that
-                    # header will extend onto two lines, but this is just notepad wrapping
-                    # letter_score_2nd_line = sum([c.isalpha() for c in lines[idx+1]]) \
-                    #     /len(lines[idx+1])
-                    # if ( letter_score_2nd_line > 0.5 and \
-                    #     re.search(r'(\w+,)+',line[idx+1]) ):
-                    #     second_part_of_header = lines[idx+1].replace(' ','').rstrip('\n')
-                    # else:
-                    #     second_part_of_header = ''
-                    # stats_header = first_part_of_header + second_part_of_header
-                    stats_header = first_part_of_header
-                    stats.append((idx,stats_header))
-                    first_header_entered=True
+    parsed_file = get_parsed_ASVall_file(filename)
+    first_header_entered=False
+    for linenum, line in parsed_file['STATS']:
+        idx = linenum - 1
+        right_of_STATS=re.split(r'STATS:',line)[1]
+        letter_score = sum([c.isalpha() for c in right_of_STATS]) \
+            /len(right_of_STATS)
+        header_detected = letter_score > 0.5
+        if ( (not header_detected) and \
+            (first_header_entered) ):
+            stats.append((idx,right_of_STATS))
+        elif ( (not first_header_entered) and \
+            header_detected and \
+            re.search(r'(\w+,)+',right_of_STATS) ): #'State' in right_of_STATS ):
+            first_part_of_header = right_of_STATS.replace(' ','')
+            # This is most likely unnecessary, initially thought that
+            # header will extend onto two lines, but this is just notepad wrapping
+            # letter_score_2nd_line = sum([c.isalpha() for c in lines[idx+1]]) \
+            #     /len(lines[idx+1])
+            # if ( letter_score_2nd_line > 0.5 and \
+            #     re.search(r'(\w+,)+',line[idx+1]) ):
+            #     second_part_of_header = lines[idx+1].replace(' ','').rstrip('\n')
+            # else:
+            #     second_part_of_header = ''
+            # stats_header = first_part_of_header + second_part_of_header
+            stats_header = first_part_of_header
+            stats.append((idx,stats_header))
+            first_header_entered=True
 
     # No dry data found, insert NaN and Jan 1st in the year 1 A.D?
     if ( len(stats) == 0 ):
@@ -217,7 +279,7 @@ def loadASVall_stats(filename):
     df = df.drop(labels=0,axis=0)  
 
     #### Add in the number of samples per State like 'APON','APOFF',etc. ####
-    data_df = loadASVall_data(filename)
+    data_df = loadASVall_data(parsed_file)
     slice = data_df[['State','CO2(ppm)']]
     counts_per_state = slice.groupby('State').count()#.agg(['mean','std','count'])
     df_num_samples = pd.DataFrame({'State':counts_per_state.index,\
@@ -237,33 +299,17 @@ def loadASVall_stats(filename):
 
     # change data types from string to float or int
     #print(f'df stats column names = {df.columns.values}')
-    dtype_dict = {'Li_Temp_ave(C)':'float64','Li_Temp_sd':'float64',\
-        'Li_Pres_ave(kPa)':'float64','Li_Pres_sd':'float64',\
-        'CO2_ave(PPM)':'float64','CO2_SD':'float64',\
-        'O2_ave(%)':'float64','O2_S':'float64','RH_ave(%)':'float64',\
-        'RH_sd':'float64','RH_T_ave(C)':'float64','Rh_T_sd':'float64',\
-        'Li_RawSample_ave':'int64','Li_RawSample_sd':'int64',\
-        'Li_RawDetector_ave':'int64','Li_RawReference_sd':'int64'}
-    df = df.astype(dtype_dict)
+    df = apply_ASVall_schema(df,ASVALL_STATS_SCHEMA)
 
     return df
 
 def loadASVall_dry(filename):
     dry = []
-    pattern_dry = re.compile("DRY")  
-    with open(filename, 'rt') as myfile:
-        lines = myfile.readlines()
-        numlines = len(lines)
-        linenum = numlines
-        for idx in range(numlines-1,-1,-1):  # start from reverse
-            line = lines[idx]
-            linenum -= 1
-            if pattern_dry.search(line) != None:  # If a match is found
-                right_of_DRY = re.split(r'DRY:',line)[1]
-                dry.append((linenum, right_of_DRY.replace(' ','').rstrip('\n')))
-            if len(dry) >= 2:
-                break  # all done, only expecting 2 lines here
-    dry.reverse()
+    parsed_file = get_parsed_ASVall_file(filename)
+    # only expecting 2 lines here, take the last two DRY lines
+    for linenum, line in parsed_file['DRY'][-2:]:
+        right_of_DRY = re.split(r'DRY:',line)[1]
+        dry.append((linenum - 1, right_of_DRY.replace(' ','')))
 
     # No dry data found, insert NaN and Jan 1st in the year 1 A.D?
     if ( len(dry) == 0 ):
@@ -288,7 +334,7 @@ def loadASVall_dry(filename):
     df = df.drop(columns=['index'])  # silly pandas artifact, a new column named index appears
 
     #### move dry xCO2 values into corresponding timestamps found in STATS ####
-    df_stats = loadASVall_stats(filename)
+    df_stats = loadASVall_stats(parsed_file)
     #print(df_stats.columns.values)
     mask_apoff = df_stats['State'].str.contains('APOFF')
     #ts_apoff = df_stats['Timestamp'].loc[mask_apoff]
@@ -316,17 +362,14 @@ def loadASVall_dry(filename):
 
 def loadASVall_flags(filename):
     sub_flags = []
-    pattern_flags = re.compile("FLAGS")  
-    with open(filename, 'rt') as myfile:
-        lines = myfile.readlines()
-        flags_found = False
-        for line in reversed(lines):
-            if pattern_flags.search(line) != None:  # If a match is found
-                flags_found = True
-                each4=re.findall(r'(\d{4})',line.rstrip('\n'))
-                # all4 = '0x' + ''.join(each4)
-                sub_flags=re.split(r' ',line.rstrip('\n'))
-                break
+    parsed_file = get_parsed_ASVall_file(filename)
+    flags_found = False
+    if ( len(parsed_file['FLAGS']) > 0 ):  # use the last FLAGS line in the file
+        linenum, line = parsed_file['FLAGS'][-1]
+        flags_found = True
+        each4=re.findall(r'(\d{4})',line)
+        # all4 = '0x' + ''.join(each4)
+        sub_flags=re.split(r' ',line)
     
     list_of_flag_names = ['ASVCO2_GENERAL_ERROR_FLAGS', 'ASVCO2_ZERO_ERROR_FLAGS',
     'ASVCO2_SPAN_ERROR_FLAGS', 'ASVCO2_SECONDARYSPAN_ERROR_FLAGS',
@@ -375,24 +418,19 @@ def add_ts_to_flags(df_flags,df_stats):
 ##### No longer filters by modename, timestamp "TS" unchanged now #####
 def loadASVall_data(filename):
     data = []
-    linenum = 0
-    pattern_data = re.compile("DATA")
-    with open(filename, 'rt') as myfile:
-        first_header_entered=False
-        for line in myfile:
-            linenum += 1
-            if pattern_data.search(line) != None:  # If a match is found
-                line=line.rstrip('\n')  ### add in another strip or replace here, found whitespace
-                right_of_DATA=re.split(r'DATA:',line)[1]
-                letter_score = sum([c.isalpha() for c in right_of_DATA]) \
-                    /len(right_of_DATA)
-                header_detected = letter_score > 0.5
-                # if ( not first_header_detected and header_detected ):
-                #     first_header_detected = True
-                if ( (not header_detected) or \
-                    (not first_header_entered) ):
-                    data.append((linenum,right_of_DATA))
-                    first_header_entered=True
+    parsed_file = get_parsed_ASVall_file(filename)
+    first_header_entered=False
+    for linenum, line in parsed_file['DATA']:
+        right_of_DATA=re.split(r'DATA:',line)[1]
+        letter_score = sum([c.isalpha() for c in right_of_DATA]) \
+            /len(right_of_DATA)
+        header_detected = letter_score > 0.5
+        # if ( not first_header_detected and header_detected ):
+        #     first_header_detected = True
+        if ( (not header_detected) or \
+            (not first_header_entered) ):
+            data.append((linenum,right_of_DATA))
+            first_header_entered=True
 
                 #data.append((linenum, right_of_DATA))
     df = pd.DataFrame(data, columns=['Linenumber', 'Data'])
@@ -405,6 +443,7 @@ def loadASVall_data(filename):
         4: "Li_Temp(C)", 5: "Li_Pres(kPa)", 6: "Li_RawSample", \
         7: "Li_RawReference", 8: "RH(%)",9: "RH_T(C)", 10: "O2(%)"})
     df = df.drop(index=[0])  # drop redundant first row
+    df = apply_ASVall_schema(df,ASVALL_DATA_SCHEMA)
 
     #df = df.drop(columns=['None'])  # drop no-name "DATA" column
 
@@ -498,19 +537,9 @@ def parse_all_file_into_df(filename):
     mask_EPOFF = data_df['State'].str.contains('EPOFF')
     df_epoff = data_df[mask_EPOFF]
     #print(f'len(df_epoff) = {len(df_epoff)}')
-    mins=[]
-    for index, row in df_epoff.iterrows():
-        for gas in gaslist:
-            #print(row['CO2(ppm)'])
-            minimum=abs(float(row['CO2(ppm)'])-gas)
-            #print(f'minimum = {minimum}')
-            if minimum<50:
-                #df_epoff['gas_standard'][i]=gas
-                mins.append(gas)
-    
-    closest_gas_standards = pd.Series(data=mins,dtype='float64')
-    most_likely_gas_standard = closest_gas_standards.median()
-    # print(closest_gas_standards.values)
+    closest_gas_standards, distance, most_likely_gas_standard = \
+        match_gas_standards(df_epoff['CO2(ppm)'].astype(float),gaslist,tolerance=50)
+    # print(closest_gas_standards)
     big_df['gas_standard']=[most_likely_gas_standard]*num_rows
 
     # print('big_df is like...')
@@ -521,6 +550,7 @@ def parse_all_file_into_df(filename):
 
     return big_df
 
+@profile_function()
 def all_df_make_temp_and_dry_correction(data_df,coeff_df,sys_rep):
     # State,SN,Timestamp,Li_Temp_ave(C),Li_Temp_sd,Li_Pres_ave(kPa),' + \
     #'Li_Pres_sd,CO2_ave(PPM),CO2_SD,O2_ave(%),O2_S,RH_ave(%),RH_sd,RH_T_ave(C),Rh_T_sd,' + \
@@ -555,12 +585,12 @@ def all_df_make_temp_and_dry_correction(data_df,coeff_df,sys_rep):
     # pd.reset_option('max_columns')
     
     SPOFF_filt = data_df['State'].str.contains("SPOFF")
-    RH_span_ave = data_df[SPOFF_filt].loc[:,'RH(%)'].astype(float).mean()
-    span1_avgT = data_df[SPOFF_filt].loc[:,'Li_Temp(C)'].astype(float).mean()
-    w_mean = data_df[SPOFF_filt].loc[:,'Li_RawSample'].astype(float).mean()
-    w0_mean = data_df[SPOFF_filt].loc[:,'Li_RawReference'].astype(float).mean()
-    p1_mean = data_df[SPOFF_filt].loc[:,'Li_Pres(kPa)'].astype(float).mean()  # not used currently
-    T_mean = data_df[SPOFF_filt].loc[:,'Li_Temp(C)'].astype(float).mean()  # not used currently
+    RH_span_ave = data_df[SPOFF_filt].loc[:,'RH(%)'].mean()
+    span1_avgT = data_df[SPOFF_filt].loc[:,'Li_Temp(C)'].mean()
+    w_mean = data_df[SPOFF_filt].loc[:,'Li_RawSample'].mean()
+    w0_mean = data_df[SPOFF_filt].loc[:,'Li_RawReference'].mean()
+    p1_mean = data_df[SPOFF_filt].loc[:,'Li_Pres(kPa)'].mean()  # not used currently
+    T_mean = span1_avgT  # not used currently
 
     S_0 = coeff_df['coeff'].loc[coeff_df['label']=='CO2kspan'].astype(float).iloc[0]
     S_1 = coeff_df['coeff'].loc[coeff_df['label']=='CO2kspan2'].astype(float).iloc[0]
@@ -597,19 +627,19 @@ def all_df_make_temp_and_dry_correction(data_df,coeff_df,sys_rep):
     # pd.reset_option('max_columns')
     # print(temp_data.index.values)
 
-    for idx, row in temp_data.iterrows():
-        #print('loop ' + str(idx))
-        #print(row.dtypes)
-        #print(row)
-        xCO2_tcorr = calculate_xco2_from_data_pt_by_pt(row,\
-            zerocoeff, S0_tcorr, S1_tcorr, scalar=True)
-        #print(f'xCO2_tcorr = {xCO2_tcorr}')
-        temp_data.loc[idx,'CO2_dry_Tcorr'] = dry_correction(xCO2_tcorr,\
-            float(row['RH_T']),float(row['Pres']),float(row['RHperc']),RH_span_ave)
-
-        temp_data.loc[idx,'CO2_dry'] = dry_correction(float(row['CO2']),\
-            float(row['RH_T']),float(row['Pres']),float(row['RHperc']),RH_span_ave)
-        
+    # all rows share one set of coefficients, recalculate them in one batch
+    xCO2_tcorr, xCO2_dry, xCO2_dry_tcorr = calculate_xco2_wet_dry_and_dry_Tcorr(\
+        temp_data['Li_Raw'].to_numpy(dtype=float,na_value=np.nan),\
+        temp_data['Li_ref'].to_numpy(dtype=float,na_value=np.nan),\
+        temp_data['Pres'].to_numpy(),\
+        temp_data['Temp'].to_numpy(),\
+        zerocoeff, S0_tcorr, S1_tcorr,\
+        temp_data['RH_T'].to_numpy(),\
+        temp_data['RHperc'].to_numpy(),RH_span_ave,\
+        xCO2_measured=temp_data['CO2'].to_numpy())
+    temp_data['CO2_dry_Tcorr'] = xCO2_dry_tcorr
+    temp_data['CO2_dry'] = xCO2_dry
+
     #### Merge in the num samples data from the stats dataframe ####
     data_df = data_df.merge(temp_data[\
         ['TS','CO2_dry_Tcorr','CO2_dry']],left_on='TS',\
@@ -635,7 +665,7 @@ def all_df_make_dry_residual_columns(big_df,most_probable_span_gas):
     filt_zero = (big_df['State'].str.contains("ZPOFF")) \
         | (big_df['State'].str.contains("ZPON")) \
         | (big_df['State'].str.contains("ZPPCAL")) 
-    temp['residual'] = big_df[filt_zero].loc[:,'CO2(ppm)'].astype(float)
+    temp['residual'] = big_df[filt_zero].loc[:,'CO2(ppm)']
 
     # identity of probability theory, see Sheldon Ross, p. 143
     # temp['residual']=big_df[filt_zero].loc[:,'CO2(ppm)']   
@@ -649,7 +679,7 @@ def all_df_make_dry_residual_columns(big_df,most_probable_span_gas):
     filt_span = (big_df['State'].str.contains("SPOFF")) \
         | (big_df['State'].str.contains("SPON")) \
         | (big_df['State'].str.contains("SPPCAL"))
-    temp['residual'] = big_df[filt_span].loc[:,'CO2(ppm)'].astype(float) - most_probable_span_gas
+    temp['residual'] = big_df[filt_span].loc[:,'CO2(ppm)'] - most_probable_span_gas
     
     # identity of probability theory, see Sheldon Ross, p. 143
     # temp['residual']=big_df[filt_span].loc[:,'CO2']   
@@ -660,7 +690,7 @@ def all_df_make_dry_residual_columns(big_df,most_probable_span_gas):
         | (big_df['State'].str.contains("APON")) \
         | (big_df['State'].str.contains("EPOFF")) \
         | (big_df['State'].str.contains("APOFF"))
-    temp['residual'] = big_df[filt_ref].loc[:,'CO2(ppm)'].astype(float) -\
+    temp['residual'] = big_df[filt_ref].loc[:,'CO2(ppm)'] -\
         big_df[filt_ref].loc[:,'gas_standard']
 
     # identity of probability theory, see Sheldon Ross, p. 143
@@ -792,19 +822,9 @@ def parse_all_file_df_w_summary(filename):
     mask_EPOFF = data_df['State'].str.contains('EPOFF')
     df_epoff = data_df[mask_EPOFF]
     #print(f'len(df_epoff) = {len(df_epoff)}')
-    mins=[]
-    for index, row in df_epoff.iterrows():
-        for gas in gaslist:
-            #print(row['CO2(ppm)'])
-            minimum=abs(float(row['CO2(ppm)'])-gas)
-            #print(f'minimum = {minimum}')
-            if minimum<50:
-                #df_epoff['gas_standard'][i]=gas
-                mins.append(gas)
-    
-    closest_gas_standards = pd.Series(data=mins,dtype='float64')
-    most_likely_gas_standard = closest_gas_standards.median()
-    # print(closest_gas_standards.values)
+    closest_gas_standards, distance, most_likely_gas_standard = \
+        match_gas_standards(df_epoff['CO2(ppm)'].astype(float),gaslist,tolerance=50)
+    # print(closest_gas_standards)
     big_df['gas_standard']=[most_likely_gas_standard]*num_rows
 
     #### Check for number of samples per state ####
@@ -816,12 +836,7 @@ def parse_all_file_df_w_summary(filename):
     # pd.reset_option('max_columns')
 
     ### New stuff, figure out most probable span gas ###
-    min=max(gaslist)
-    for gas in gaslist:
-        diff=abs(gas-500)
-        if diff < min:
-            most_probable_span_gas = gas
-            min = diff
+    most_probable_span_gas = match_gas_standards([500],gaslist,tolerance=np.inf)[0][0]
 
     #### New stuff, create residual columns ####
     big_df = all_df_make_dry_residual_columns(big_df,most_probable_span_gas)
@@ -920,18 +935,8 @@ def parse_all_file_df_w_summary(filename):
 
 def parse_all_file_df_w_summary_v2(filename):
     #filename = './data/1006/20210430/ALL/20210429_183017.txt'
-    linenum = 0
-    with open(filename, 'rt') as myfile:
-        sys_rep={}
-        for line in myfile:
-            linenum += 1
-            if '=' in line:  # equals sign found and system report likely
-                line = line.rstrip('\n')
-                line = line.strip()
-                lhs_and_rhs = re.split(r'=',line)
-                sys_rep[lhs_and_rhs[0].strip()]=lhs_and_rhs[1]
-            if 'LOG:' in line:
-                break
+    parsed_file = get_parsed_ASVall_file(filename)
+    sys_rep = parsed_file['sys_rep'].copy()
     #print(sys_rep)
     
     if ( 'serial' in sys_rep ):
@@ -942,10 +947,10 @@ def parse_all_file_df_w_summary_v2(filename):
     #sys_rep = all_update_missing_v1_8(sys_rep,ASVCO2_sn)  #new for v2
 
     #coeff_df = loadASVall_coeff(filename)
-    coeff_df = loadASVall_coeff_with_dates(filename)  #new for v2
-    flags_df = loadASVall_flags(filename)
-    data_df = loadASVall_data(filename)
-    dry_df = loadASVall_dry(filename)  # new stuff
+    coeff_df = loadASVall_coeff_with_dates(parsed_file)  #new for v2
+    flags_df = loadASVall_flags(parsed_file)
+    data_df = loadASVall_data(parsed_file)
+    dry_df = loadASVall_dry(parsed_file)  # new stuff
 
     data_df = all_df_make_temp_and_dry_correction(data_df,coeff_df,sys_rep)
 
@@ -989,19 +994,9 @@ def parse_all_file_df_w_summary_v2(filename):
     mask_EPOFF = data_df['State'].str.contains('EPOFF')
     df_epoff = data_df[mask_EPOFF]
     #print(f'len(df_epoff) = {len(df_epoff)}')
-    mins=[]
-    for index, row in df_epoff.iterrows():
-        for gas in gaslist:
-            #print(row['CO2(ppm)'])
-            minimum=abs(float(row['CO2(ppm)'])-gas)
-            #print(f'minimum = {minimum}')
-            if minimum<50:
-                #df_epoff['gas_standard'][i]=gas
-                mins.append(gas)
-    
-    closest_gas_standards = pd.Series(data=mins,dtype='float64')
-    most_likely_gas_standard = closest_gas_standards.median()
-    # print(closest_gas_standards.values)
+    closest_gas_standards, distance, most_likely_gas_standard = \
+        match_gas_standards(df_epoff['CO2(ppm)'].astype(float),gaslist,tolerance=50)
+    # print(closest_gas_standards)
     big_df['gas_standard']=[most_likely_gas_standard]*num_rows
 
     #### Check for number of samples per state ####
@@ -1013,12 +1008,7 @@ def parse_all_file_df_w_summary_v2(filename):
     # pd.reset_option('max_columns')
 
     ### New stuff, figure out most probable span gas ###
-    min=max(gaslist)
-    for gas in gaslist:
-        diff=abs(gas-500)
-        if diff < min:
-            most_probable_span_gas = gas
-            min = diff
+    most_probable_span_gas = match_gas_standards([500],gaslist,tolerance=np.inf)[0][0]
 
     #### New stuff, create residual columns ####
     big_df = all_df_make_dry_residual_columns(big_df,most_probable_span_gas)
@@ -1198,111 +1188,113 @@ def load_Val_File_into_dicts(val_filename):
 
     return d_by_time, other_stuff
 
+#### patterns used by load_Val_File_into_dicts_v3(), compiled once ####
+VAL_NUMBER_RE = re.compile(r'[+-]?\d+\.?\d*[eE][+-]?\d+|[-]?\d+\.\d+|[-]?\d+')  # number, scientific notation
+VAL_TIME_RE = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z')
+VAL_ROW_RE = re.compile(r'(\w+,)+')
+VAL_TIME_EQUALS_RE = re.compile(r'time=(.*)')
+VAL_REF_GAS_RE = re.compile(r'Validation with reference gas:\s*(\d+\.\d+|\d+)')
+
+@profile_function()
 def load_Val_File_into_dicts_v3(val_filename, timestamp_mode='ISO-8601 string'):
     # optional timestamp_mode = 'Unix epoch, days'
+    # Single pass over each section, lines are dispatched on their first token
+    # and each candidate number is searched for once with VAL_NUMBER_RE.
 
-    val_file = open(val_filename,'rt')
-    big_str = val_file.read()
-    stuff = re.split(r'ASVCO2v2\n',big_str)
+    with open(val_filename,'rt') as val_file:
+        big_str = val_file.read()
+    stuff = big_str.split('ASVCO2v2\n')
     #print("...stuff[0]... ",stuff[0])
     d_by_time = {}
     other_stuff = {}
     mode_and_gas_stuff = {}
     flush_stuff = {}
     for idx in range(1,len(stuff)):
-        time_str = re.search(r'time=(.*)',stuff[idx]).groups()[0]#.strip()
-        ref_gas = float(re.search(r'Validation with reference gas:\s*(\d+\.\d+|\d+)',\
-            stuff[idx]).groups()[0])
-        split_by_newline = re.split(r'\n',stuff[idx])
+        time_str = VAL_TIME_EQUALS_RE.search(stuff[idx]).groups()[0]#.strip()
+        ref_gas = float(VAL_REF_GAS_RE.search(stuff[idx]).groups()[0])
+        ref_gas_str = str(ref_gas)  # cast back to string
         first_header_entered=False
         nested_dict = {}
         other_parts = {}
         mode_and_gas_parts = {}
         flush_mean_and_std_parts = {}
-        crazy = r'[+-]?\d+\.?\d*[eE][+-]?\d+|[-]?\d+\.\d+|[-]?\d+'  # number, scientific notation
-        crazier=r'([+-]?\d+\.?\d*[eE][+-]?\d+)|([-]?\d+\.\d+)|([-]?\d+)'  # number, scientific notation with groups
-        time_re = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z'
-        for idx, line in enumerate(split_by_newline):
+        for line in stuff[idx].split('\n'):
             line = line.replace(" ","")
-            if len(line) > 0:
-                letter_score = sum([c.isalpha() for c in line]) \
-                        /len(line)
-            else:
-                letter_score = 0
-            if ( re.match(r'(\w+,)+',line) \
-                and letter_score > 0.5 and first_header_entered == False):
-                header = re.split(r',',line)
-                header.append('gas_standard')
-                for field_name in header:
-                    nested_dict[field_name]=[]
-                first_header_entered = True
-            elif ( first_header_entered == True \
-                and re.match(r'(\w+,)+',line) ):
-                entries_of_data = re.split(r',',line)
-                entries_of_data.append(str(ref_gas))  # cast back to string
-                for idx,field_name in enumerate(header):
-                    if ( re.search(crazy,entries_of_data[idx]) and \
-                         len(re.search(crazy,entries_of_data[idx])[0]) == \
-                         len(entries_of_data[idx]) ):  # most likely a number
-                        entries_of_data[idx]=float(entries_of_data[idx])
-                    if (field_name == 'datetime' and \
-                        timestamp_mode == 'Unix epoch, days'):
-                        some_datetime_object = pd.to_datetime(float(entries_of_data[idx]),unit='D')
-                        ### round up to the nearest second ###
-                        if some_datetime_object.microsecond > 500_000:
-                            some_datetime_object += dt.timedelta(seconds=1)
-                        some_datetime_object = some_datetime_object.replace(microsecond=0)
-                        #entries_of_data[idx]=some_datetime_object.strftime(" %Y-%m-%dT%H:%M:%S.%f")[:-5]+'Z'
-                        entries_of_data[idx]=some_datetime_object.strftime(" %Y-%m-%dT%H:%M:%S")+'Z'
-                    elif (field_name == 'datetime' and \
-                        timestamp_mode == 'ISO-8601 string'):
-                        #if ( re.search(time_re,parts[1].strip()) ):
-                        if ( re.search(time_re,entries_of_data[idx]) ):
-                            entries_of_data[idx] = " " + entries_of_data[idx]  # prepend leading space???
-                        else:
-                            raise Exception (f"""Unrecognized timestamp format for {entries_of_data[idx]} 
-                            found in {val_filename}""")
-                    elif (field_name == 'datetime' and \
-                        not ( timestamp_mode == 'ISO-8601 string' or \
-                            timestamp_mode == 'Unix epoch, days')):
-                        raise Exception (f"""Unrecognized timestamp format of {timestamp_mode} as
-                        second argument of this subroutine""")
-                    nested_dict[field_name].append(entries_of_data[idx])
-            elif ( "=" in line ):
+            if ( len(line) == 0 ):
+                continue
+
+            #### comma separated header or data row, first token is a word followed by a comma ####
+            if ( VAL_ROW_RE.match(line) ):
+                if ( first_header_entered == True ):
+                    entries_of_data = line.split(',')
+                    entries_of_data.append(ref_gas_str)
+                    for jdx,field_name in enumerate(header):
+                        entry = entries_of_data[jdx]
+                        m = VAL_NUMBER_RE.search(entry)
+                        if ( m and len(m[0]) == len(entry) ):  # most likely a number
+                            entry = float(entry)
+                        if ( field_name == 'datetime' ):
+                            if ( timestamp_mode == 'Unix epoch, days' ):
+                                some_datetime_object = pd.to_datetime(float(entry),unit='D')
+                                ### round up to the nearest second ###
+                                if some_datetime_object.microsecond > 500_000:
+                                    some_datetime_object += dt.timedelta(seconds=1)
+                                some_datetime_object = some_datetime_object.replace(microsecond=0)
+                                entry = some_datetime_object.strftime(" %Y-%m-%dT%H:%M:%S")+'Z'
+                            elif ( timestamp_mode == 'ISO-8601 string' ):
+                                if ( VAL_TIME_RE.search(entry) ):
+                                    entry = " " + entry  # prepend leading space???
+                                else:
+                                    raise Exception (f"""Unrecognized timestamp format for {entry} 
+                                    found in {val_filename}""")
+                            else:
+                                raise Exception (f"""Unrecognized timestamp format of {timestamp_mode} as
+                                second argument of this subroutine""")
+                        nested_dict[field_name].append(entry)
+                    continue
+                elif ( sum([c.isalpha() for c in line])/len(line) > 0.5 ):
+                    header = line.split(',')
+                    header.append('gas_standard')
+                    for field_name in header:
+                        nested_dict[field_name]=[]
+                    first_header_entered = True
+                    continue
+                # otherwise fall through, same as a line which is not comma separated
+
+            #### system report, key=value ####
+            if ( "=" in line ):
                 parts = line.split( "=" )
-                #print(line)
-                # if ( re.search(crazy,parts[1].strip()) 
-                if ( re.search(crazy,parts[1].strip()) and \
-                    len(re.search(crazy,parts[1].strip())[0]) == \
-                         len(parts[1].strip()) ):  # most likely a number
-                    other_parts[parts[0].strip()] = float(parts[1].strip())
+                key = parts[0].strip()
+                value = parts[1].strip()
+                m = VAL_NUMBER_RE.search(value)
+                if ( m and len(m[0]) == len(value) ):  # most likely a number
+                    other_parts[key] = float(value)
                 #special case for time = YYYY-MM-DDThh:mm:ssZ
-                elif ( re.search(time_re,parts[1].strip()) and \
-                    'time' in line ):
-                    other_parts['time_of_report_command'] = parts[1].strip()
+                elif ( 'time' in line and VAL_TIME_RE.search(value) ):
+                    other_parts['time_of_report_command'] = value
                 else:
-                    other_parts[parts[0].strip()] = parts[1].strip()
-            elif ( ":" in line and \
-                re.search(time_re,line) is None and \
-                    "Mode" not in line and \
-                    ("CO2k" in line or "CO2L" in line) and \
-                    "Validationwithreferencegas" not in line):
+                    other_parts[key] = value
+                continue
+
+            if ( not ":" in line or "Validationwithreferencegas" in line or \
+                VAL_TIME_RE.search(line) ):
+                continue
+
+            #### coefficients, CO2kzero:, CO2LastZero:, etc. ####
+            if ( "Mode" not in line and ("CO2k" in line or "CO2L" in line) ):
                 parts = line.split(":")
-                if ( re.search(crazy,parts[1].strip()) and \
-                    len(re.search(crazy,parts[1].strip())[0]) == \
-                         len(parts[1].strip()) ):  # most likely a number
-                    other_parts[parts[0].strip()] = float(parts[1].strip())
+                key = parts[0].strip()
+                value = parts[1].strip()
+                m = VAL_NUMBER_RE.search(value)
+                if ( m and len(m[0]) == len(value) ):  # most likely a number
+                    other_parts[key] = float(value)
                 else:
-                    other_parts[parts[0].strip()] = parts[1].strip()
-            elif ( ":" in line and \
-                re.search(time_re,line) is None and \
-                    "Mode" in line and \
-                    "CO2k" not in line and \
-                    "CO2L" not in line and \
-                    "Validationwithreferencegas" not in line and \
-                    "OFF" in line):
-                mode_and_gas_comma_parts = line.split(",")
-                for this_txt in mode_and_gas_comma_parts:
+                    other_parts[key] = value
+
+            #### Mode:XXOFF, Gas:XXX ####
+            elif ( "Mode" in line and "CO2k" not in line and "CO2L" not in line and \
+                "OFF" in line ):
+                for this_txt in line.split(","):
                     left_and_right_of_colon = this_txt.split(":")
                     if ( len(left_and_right_of_colon) == 2 ):
                         left_of_colon = left_and_right_of_colon[0]
@@ -1312,63 +1304,31 @@ def load_Val_File_into_dicts_v3(val_filename, timestamp_mode='ISO-8601 string'):
                                 mode_and_gas_parts[right_of_colon] = {}
                             this_mode = right_of_colon
                         else:
-                            if ( re.search(crazy,right_of_colon.strip()) and \
-                                len(re.search(crazy,right_of_colon.strip())[0]) == \
-                                    len(right_of_colon.strip()) ):  # most likely a number
-                                mode_and_gas_parts[this_mode][left_of_colon] = \
-                                    float(right_of_colon.strip())
-                            elif ( not(left_of_colon in mode_and_gas_parts[this_mode]) and \
-                                re.search(crazier,right_of_colon.strip()) ):
-                                #find the number within the groups() of regex
-                                for item in re.search(crazier,right_of_colon.strip()).groups():
-                                    if ( item ):
-                                        num_as_str = item
-                                        break
-                                mode_and_gas_parts[this_mode][left_of_colon] = \
-                                    float(num_as_str)
+                            value = right_of_colon.strip()
+                            m = VAL_NUMBER_RE.search(value)
+                            if ( m and len(m[0]) == len(value) ):  # most likely a number
+                                mode_and_gas_parts[this_mode][left_of_colon] = float(value)
+                            elif ( not(left_of_colon in mode_and_gas_parts[this_mode]) and m ):
+                                # first number within the text
+                                mode_and_gas_parts[this_mode][left_of_colon] = float(m[0])
                             else:
                                 mode_and_gas_parts[this_mode][left_of_colon] = \
                                     right_of_colon
-            elif ( ":" in line and \
-                re.search(time_re,line) is None and \
-                    "Mode" not in line and \
-                    "CO2k" not in line and \
-                    "CO2L" not in line and \
-                    "Mean" in line and \
-                    "STD" in line and \
-                    "Validationwithreferencegas" not in line and \
-                    "OFF" not in line):
-                flush_mean_and_std_comma_parts = line.split(",")
-                for this_txt in flush_mean_and_std_comma_parts:
+
+            #### Mean:XXX, STD:XXX from flushing ####
+            elif ( "Mode" not in line and "CO2k" not in line and "CO2L" not in line and \
+                "Mean" in line and "STD" in line and "OFF" not in line ):
+                for this_txt in line.split(","):
                     left_and_right_of_colon = this_txt.split(":")
                     if ( len(left_and_right_of_colon) == 2 ):
                         left_of_colon = left_and_right_of_colon[0]
                         right_of_colon = left_and_right_of_colon[1]
-                        if ( "Mean" in left_of_colon ):
-                            if ( not(left_of_colon in flush_mean_and_std_parts) and \
-                                re.search(crazier,right_of_colon) ):  # most likely a number in right_of_colon
-                                #find the number within the groups() of regex
-                                for item in re.search(crazier,right_of_colon.strip()).groups():
-                                    if ( item ):
-                                        this_mean_as_str = item
-                                        break
-                                flush_mean_and_std_parts[left_of_colon] = float(this_mean_as_str)
+                        if ( "Mean" in left_of_colon or "STD" in left_of_colon ):
+                            m = VAL_NUMBER_RE.search(right_of_colon.strip())
+                            if ( not(left_of_colon in flush_mean_and_std_parts) and m ):  # most likely a number in right_of_colon
+                                flush_mean_and_std_parts[left_of_colon] = float(m[0])
                             else:
                                 flush_mean_and_std_parts[left_of_colon] = right_of_colon
-                        elif ( "STD" in left_of_colon ):
-                            if ( not(left_of_colon in flush_mean_and_std_parts) and \
-                                re.search(crazier,right_of_colon) ):  # most likely a number in right_of_colon
-                                #find the number within the groups() of regex
-                                for item in re.search(crazier,right_of_colon.strip()).groups():
-                                    if ( item ):
-                                        this_std_as_str = item
-                                        break
-                                flush_mean_and_std_parts[left_of_colon] = float(this_std_as_str)
-                            else:
-                                flush_mean_and_std_parts[left_of_colon] = right_of_colon
-            elif ( re.search(r'Flushing validaiton gas for (\d+\.\d+|\d+) seconds',line) ):
-                flush_time_str = re.search(r'Flushing validaiton gas for (\d+\.\d+)|(\d+) seconds',line).groups()[0]
-                flush_mean_and_std_parts["flush_time"] = float(flush_time_str)
 
         flush_stuff[time_str] = flush_mean_and_std_parts
         mode_and_gas_stuff[time_str] = mode_and_gas_parts
@@ -1380,12 +1340,8 @@ def load_Val_File_into_dicts_v3(val_filename, timestamp_mode='ISO-8601 string'):
 
 def get_gaslist(mode_and_gas_stuff=None):
 
-    # read in from referencegases.txt and cast to float
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    referencegases_txt_filename = PROJECT_ROOT + '\\code\\referencegases.txt'
-    refgaslist = list(pd.read_csv(referencegases_txt_filename,\
-         skiprows=1).columns.values)
-    refgaslist = [float(x) for x in refgaslist]
+    # read in from referencegases.txt as floats, see config_cache.py
+    refgaslist = list(get_reference_gases())
 
     # if avalable in code, get the gaslist from mode_and_gas_stuff
     if mode_and_gas_stuff: 
@@ -1449,6 +1405,7 @@ def val_df_make_residual_column(super_big_val_df):
 
     return super_big_val_df
 
+@profile_function()
 def val_df_make_dry_residual_columns(super_big_val_df):
     super_big_val_df['residual_ave'] = [np.NaN]*len(super_big_val_df)
     super_big_val_df['residual_sd'] = [np.NaN]*len(super_big_val_df)
@@ -1529,6 +1486,78 @@ def val_df_make_dry_residual_columns(super_big_val_df):
 
     return super_big_val_df
 
+def get_datetime_key(ser):
+    # Timestamps parsed once into datetime64, used as the join key of the validation
+    # frame and the DRY, STATS, FLAGS and COEFF frames instead of comparing text
+    return pd.to_datetime(ser.astype(str).str.strip(),errors='coerce',utc=True)
+
+def join_on_datetime(left_df,left_on,list_of_right):
+    # Left join of several frames onto left_df in one step. list_of_right holds
+    # (right_df, right_on, suffix) tuples. Gives the same rows and columns as the
+    # left merges one after the other, left_df.merge(right_df,left_on=left_on,
+    # right_on=right_on,how='left',suffixes=('',suffix)), right key columns
+    # included, but the wide left frame is copied once instead of once per merge.
+    left_key = get_datetime_key(left_df[left_on])
+    all_columns = left_df.columns.to_list()
+    list_of_aligned = []
+    for right_df, right_on, suffix in list_of_right:
+        right_key = get_datetime_key(right_df[right_on])
+        if not ( right_key.is_unique ):
+            # one to many matches add rows, fall back to the merges
+            joined = left_df
+            for right_df, right_on, suffix in list_of_right:
+                joined = joined.merge(right_df,left_on=left_on,right_on=right_on,\
+                    how='left',suffixes=('',suffix))
+            return joined
+        overlap = [col for col in right_df.columns if col in all_columns]
+        if ( len(overlap) > 0 and suffix == '' ):
+            raise Exception(f'Columns {overlap} overlap but no suffix was given')
+        aligned = right_df.rename(columns={col:col + suffix for col in overlap})
+        aligned.index = right_key
+        aligned = aligned.reindex(left_key)
+        all_columns += aligned.columns.to_list()
+        list_of_aligned.append(aligned)
+
+    left_df = left_df.copy()
+    left_df.index = left_key
+    joined = pd.concat([left_df] + list_of_aligned,axis=1)
+    return joined.reset_index(drop=True)
+
+def get_Tcorr_coeff_of_SPOFF_rows(super_big_val_df, df_spoff):
+    # Temperature corrected span coefficients of every SPOFF row of the stats in df_spoff
+    # (columns renamed as in val_df_make_temp_and_dry_correction_v2()), with the
+    # coefficients of the first row of super_big_val_df with the same datetime.
+    # Returns arrays of zerocoeff, S0_tcorr, S1_tcorr and the SPOFF RH, one per row.
+    pos_of_datetime = pd.Series(np.arange(len(super_big_val_df)),\
+        index=super_big_val_df['datetime'].to_numpy())
+    pos_of_datetime = pos_of_datetime[~pos_of_datetime.index.duplicated(keep='first')]
+    pos = pos_of_datetime.reindex(df_spoff['Timestamp'].to_numpy())
+    if ( pos.isna().any() ):
+        missing = df_spoff['Timestamp'][pos.isna().to_numpy()].to_list()
+        raise Exception(f'No coefficients in the validation file for SPOFF at {missing}')
+    pos = pos.to_numpy(dtype=int)
+
+    S_0 = super_big_val_df['CO2kspan'].to_numpy(dtype=float)[pos]
+    S_1 = super_big_val_df['CO2kspan2'].to_numpy(dtype=float)[pos]
+    zerocoeff = super_big_val_df['CO2kzero'].to_numpy(dtype=float)[pos]
+    span2_in = super_big_val_df['secondaryspan_calibrated_temperature'].to_numpy(dtype=float)[pos]
+    slope_in = super_big_val_df['secondaryspan_temperaturedependantslope'].to_numpy(dtype=float)[pos]
+    w_mean = df_spoff['Li_Raw'].to_numpy(dtype=float,na_value=np.nan)
+    w0_mean = df_spoff['Li_ref'].to_numpy(dtype=float,na_value=np.nan)
+    span1_avgT = df_spoff['Temp'].to_numpy(dtype=float)
+
+    alphaC = (1 - ((w_mean / w0_mean) * zerocoeff))
+    BetaC = alphaC * (S_0 + S_1 * alphaC)
+    #difference in temp from span2 at 20C and span1 temp
+    span2_cal2_temp_diff = span1_avgT - span2_in
+    S1_tcorr = (S_1 + slope_in * span2_cal2_temp_diff)
+    # Algebraic manipulation from LiCor Appendix A, eq. A-28
+    # note that overbar symbol on alphaC symbol in the LiCor 830/850 manual indicates a 5 second average value
+    S0_tcorr = (BetaC / alphaC) - (S1_tcorr * alphaC)
+
+    return zerocoeff, S0_tcorr, S1_tcorr, df_spoff['RH(%)'].to_numpy(dtype=float)
+
+@profile_function()
 def val_df_make_temp_and_dry_correction_v2(super_big_val_df,big_stats_df):
     # State,SN,Timestamp,Li_Temp_ave(C),Li_Temp_sd,Li_Pres_ave(kPa),' + \
     #'Li_Pres_sd,CO2_ave(PPM),CO2_SD,O2_ave(%),O2_S,RH_ave(%),RH_sd,RH_T_ave(C),Rh_T_sd,' + \
@@ -1571,56 +1600,44 @@ def val_df_make_temp_and_dry_correction_v2(super_big_val_df,big_stats_df):
 
 
 
-    S_0_idx = super_big_val_df.columns.get_loc('CO2kspan')
-    S_1_idx = super_big_val_df.columns.get_loc('CO2kspan2')
-    z_0_idx = super_big_val_df.columns.get_loc('CO2kzero')
-    # Does not work for unknown reason,
-    for idx, row in temp_data.iterrows():
-        #print('loop ' + str(idx))
-        if ( 'SPOFF' in row['State'] ):
-            ts_val_filt = super_big_val_df['datetime'] == row['Timestamp']
-            # pd.set_option('max_columns',None)
-            # print('first five rows of filtered by ts super big val df')
-            # print(super_big_val_df[ts_val_filt].head())
-            # pd.reset_option('max_columns')
-
-            #print('spoff')
-            RH_span_prev = row['RH(%)']
-            S_0 = super_big_val_df[ts_val_filt].iloc[0,S_0_idx] 
-            S_1 = super_big_val_df[ts_val_filt].iloc[0,S_1_idx]
-            zerocoeff = super_big_val_df[ts_val_filt].iloc[0,z_0_idx]
-            w_mean = row['Li_Raw']; w0_mean = row['Li_ref']
-            alphaC = (1 - ((w_mean / w0_mean) * zerocoeff))
-            BetaC = alphaC * (S_0 + S_1 * alphaC)
-            span2_in = super_big_val_df[ts_val_filt].iloc[0,\
-                super_big_val_df.columns.\
-                get_loc('secondaryspan_calibrated_temperature')]
-            span1_avgT = row['Temp']
-            slope_in = super_big_val_df[ts_val_filt].iloc[0,\
-                super_big_val_df.columns.\
-                get_loc('secondaryspan_temperaturedependantslope')]
-            #difference in temp from span2 at 20C and span1 temp
-            span2_cal2_temp_diff = span1_avgT - span2_in
-            #span2_cal2_temp_diff = span2_in - span1_avgT
-            S1_tcorr = (S_1 + slope_in * span2_cal2_temp_diff)#.astype(float)
-            # Algebraic manipulation from LiCor Appendix A, eq. A-28
-            # note that overbar symbol on alphaC symbol in the LiCor 830/850 manual indicates a 5 second average value
-            S0_tcorr = (BetaC / alphaC) - (S1_tcorr * alphaC)
-        else:
-            #print('not spoff')
-            # use timestamp to get span coefficients
-            xCO2_tcorr = calculate_xco2_from_data_pt_by_pt(row,\
-                zerocoeff, S0_tcorr, S1_tcorr,scalar=True)
-            # the_numba = dry_correction(xCO2_tcorr,\
-            #     row['RH_T(C)'],row['Pres'],row['RH(%)'],RH_span_prev)
-            # print(f'the_numba = {the_numba}')
-            temp_data.loc[idx,'CO2_dry_Tcorr_ave'] = dry_correction(xCO2_tcorr,\
-                row['RH_T(C)'],row['Pres'],row['RH(%)'],RH_span_prev) 
+    # coefficients only change at SPOFF, carry them forward to the EPOFF and APOFF
+    # rows which follow and then recalculate all of those rows in one batch
+    is_SPOFF = temp_data['State'].str.contains("SPOFF").to_numpy()
+    zerocoeff, S0_tcorr, S1_tcorr, RH_span = get_Tcorr_coeff_of_SPOFF_rows(\
+        super_big_val_df,temp_data[is_SPOFF])
+    # each row gets the coefficients of the last SPOFF row before it, NaN before the first
+    n_rows = len(temp_data)
+    spoff_count = np.cumsum(is_SPOFF)
+    cycle = spoff_count - 1
+    has_cycle = cycle >= 0
+    zerocoeff_list = np.full(n_rows,np.NaN)
+    S0_tcorr_list = np.full(n_rows,np.NaN)
+    S1_tcorr_list = np.full(n_rows,np.NaN)
+    RH_span_list = np.full(n_rows,np.NaN)
+    zerocoeff_list[has_cycle] = zerocoeff[cycle[has_cycle]]
+    S0_tcorr_list[has_cycle] = S0_tcorr[cycle[has_cycle]]
+    S1_tcorr_list[has_cycle] = S1_tcorr[cycle[has_cycle]]
+    RH_span_list[has_cycle] = RH_span[cycle[has_cycle]]
+
+    not_SPOFF = ~is_SPOFF
+    xCO2_tcorr, xCO2_dry, xCO2_dry_tcorr = calculate_xco2_wet_dry_and_dry_Tcorr(\
+        temp_data['Li_Raw'].to_numpy(dtype=float,na_value=np.nan)[not_SPOFF],\
+        temp_data['Li_ref'].to_numpy(dtype=float,na_value=np.nan)[not_SPOFF],\
+        temp_data['Pres'].to_numpy(dtype=float)[not_SPOFF],\
+        temp_data['Temp'].to_numpy(dtype=float)[not_SPOFF],\
+        zerocoeff_list[not_SPOFF],\
+        S0_tcorr_list[not_SPOFF],\
+        S1_tcorr_list[not_SPOFF],\
+        temp_data['RH_T(C)'].to_numpy(dtype=float)[not_SPOFF],\
+        temp_data['RH(%)'].to_numpy(dtype=float)[not_SPOFF],\
+        RH_span_list[not_SPOFF])
+    CO2_dry_Tcorr_ave = np.full(n_rows,np.NaN)
+    CO2_dry_Tcorr_ave[not_SPOFF] = xCO2_dry_tcorr
+    temp_data['CO2_dry_Tcorr_ave'] = CO2_dry_Tcorr_ave
         
     #### Merge in the num samples data from the stats dataframe ####
-    super_big_val_df = super_big_val_df.merge(temp_data[\
-        ['Timestamp','CO2_dry_Tcorr_ave']],left_on='datetime',\
-        right_on='Timestamp',how='left',suffixes=('','_dtc'))
+    super_big_val_df = join_on_datetime(super_big_val_df,'datetime',\
+        [(temp_data[['Timestamp','CO2_dry_Tcorr_ave']],'Timestamp','_dtc')])
 
     del temp_data
 
@@ -1710,9 +1727,8 @@ def val_df_make_temp_and_dry_correction(super_big_val_df,big_stats_df):
                 row['RH_T(C)'],row['Pres'],row['RH(%)'],RH_span_prev) 
         
     #### Merge in the num samples data from the stats dataframe ####
-    super_big_val_df = super_big_val_df.merge(temp_data[\
-        ['Timestamp','CO2_dry_Tcorr_ave']],left_on='datetime',\
-        right_on='Timestamp',how='left',suffixes=('','_dtc'))
+    super_big_val_df = join_on_datetime(super_big_val_df,'datetime',\
+        [(temp_data[['Timestamp','CO2_dry_Tcorr_ave']],'Timestamp','_dtc')])
 
     del temp_data
 
@@ -1832,31 +1848,11 @@ def val_df_rename_columns(super_big_val_df):
 
 def val_df_add_gas_standard_tag_column(super_big_val_df):
     
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    json_file = open(PROJECT_ROOT + '/code/post_processing/config/gas_standard_tag_ranges.json','r',encoding='utf-8')
-    ppm_range2tag_name = json.load(json_file)
-    json_file.close()
-
-    #super_big_val_df['gas_standard_tag']=['']*len(super_big_val_df)
-
-    # For some reason, the above code does not write changes to the 'gas_standard_tag'
-    # column, so this code was re-written so that it will now work.
-    gas_standard_tag_list = []
-    for idx, row in super_big_val_df.iterrows():
-        in_range = False
-        for d in ppm_range2tag_name:
-            if ( row['gas_standard'] >= d['min'] and \
-                row['gas_standard'] <= d['max'] ):
-                gas_standard_tag_list.append(d['tag']) 
-                in_range = True
-                break
-        if not in_range:
-            gas_standard_tag_list.append('unknown')
+    ppm_range2tag_name = get_gas_standard_tag_ranges()
 
-    # first_entry=super_big_val_df['gas_standard_tag'].iloc[0]
-    # print(f'first_entry = {first_entry}')
-
-    super_big_val_df['gas_standard_tag'] = gas_standard_tag_list
+    # first range which holds the gas standard, 'unknown' if none does
+    super_big_val_df['gas_standard_tag'] = match_gas_standard_ranges(\
+        super_big_val_df['gas_standard'],ppm_range2tag_name,unknown='unknown')
 
     return super_big_val_df
 
@@ -1980,13 +1976,11 @@ def add_final_summary_rows(super_big_val_df):
 
     return super_big_val_df
 
+@profile_function()
 def add_final_summary_rows_v2(super_big_val_df):
 
     # read in json file from config folder to get the gas standard tag ranges for the summary
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    json_file = open(PROJECT_ROOT + '/code/post_processing/config/summary_gas_standard_tag_ranges.json','r',encoding='utf-8')
-    summary_gas_standard_tag_ranges = json.load(json_file)
-    json_file.close()
+    summary_gas_standard_tag_ranges = get_summary_gas_standard_tag_ranges()
     num_ranges = len(summary_gas_standard_tag_ranges)
 
     #if only the last row is copied, pandas will return series,
@@ -2387,9 +2381,86 @@ def val_df_add_range_check(super_big_val_df):
 
 #     return sys_rep
 
+def get_val_columns_in_order(bigDictionary, config_stuff):
+    # Column order of the validation frame, as pd.concat() of one DataFrame per cycle
+    # gave it: measurements, then the config of the cycle, then any span coefficient
+    # missing from the config, with columns first seen in later cycles at the end
+    list_of_columns = []
+    seen = set()
+    for k, v in bigDictionary.items():
+        cycle_columns = list(v.keys()) + list(config_stuff.get(k,{}).keys()) + \
+            ['CO2kzero','CO2kspan','CO2kspan2']
+        for col in cycle_columns:
+            if ( col not in seen ):
+                seen.add(col)
+                list_of_columns.append(col)
+    return list_of_columns
+
+def build_val_df(bigDictionary, config_stuff):
+    # Validation frame with one row per valve state. The measurements of each cycle
+    # are copied into one preallocated numpy column per field, float64 when every
+    # value is a number, and the config of each cycle is kept once per cycle in a
+    # cycle table which is broadcast to the rows of the cycle by its cycle id.
+    # Cycles without CO2kzero, CO2kspan or CO2kspan2 get NaN.
+    list_of_cycles = list(bigDictionary.keys())
+    list_of_lengths = [len(next(iter(v.values()))) if len(v) > 0 else 0 \
+        for v in bigDictionary.values()]
+    row_ends = np.cumsum(list_of_lengths)
+    row_starts = row_ends - np.array(list_of_lengths,dtype=int)
+    num_rows = int(row_ends[-1]) if len(row_ends) > 0 else 0
+    cycle_id = np.repeat(np.arange(len(list_of_cycles)),list_of_lengths)
+
+    #### cycle table, one row per cycle, joined on cycle id ####
+    df_cycle = pd.DataFrame.from_dict({idx:config_stuff.get(k,{}) \
+        for idx, k in enumerate(list_of_cycles)},orient='index')
+    df_cycle = df_cycle.reindex(index=range(len(list_of_cycles)))
+
+    columns = {}
+    for col in get_val_columns_in_order(bigDictionary, config_stuff):
+        in_cycles = [col in v for v in bigDictionary.values()]
+        if ( col in df_cycle.columns ):
+            config_values = df_cycle[col].to_numpy()[cycle_id]
+            if not ( any(in_cycles) ):
+                columns[col] = config_values
+                continue
+        all_float = all([all([isinstance(x,float) for x in v[col]]) \
+            for v in bigDictionary.values() if col in v])
+        if ( all_float ):
+            values = np.full(num_rows,np.NaN)
+        else:
+            values = np.full(num_rows,np.NaN,dtype=object)
+        for idx, v in enumerate(bigDictionary.values()):
+            if ( in_cycles[idx] ):
+                values[row_starts[idx]:row_ends[idx]] = v[col]
+        if ( col in df_cycle.columns ):
+            # the config of a cycle replaces a measurement of the same name
+            has_config = df_cycle[col].notna().to_numpy()[cycle_id]
+            values = pd.Series(values,dtype=object).where(~has_config,\
+                pd.Series(config_values,dtype=object)).infer_objects().to_numpy()
+        columns[col] = values
+
+    return pd.DataFrame(columns)
+
+def dump_val_dict_to_json(bigDictionary, config_stuff, list_of_json_filenames):
+    # Debug json of the validation file, the measurements of each cycle together
+    # with its config repeated for the 10 valve states
+    json_dict = {}
+    for k, v in bigDictionary.items():
+        json_dict[k] = dict(v)
+        for kk, vv in config_stuff.get(k,{}).items():
+            json_dict[k][kk] = [vv]*10  # 10 total valve states, duplicate the values
+    json_dict = val_fix_span_coeff_in_dict(json_dict)
+    json_str = json.dumps(json_dict, indent=4, ensure_ascii=False, allow_nan=True)
+    for json_filename in list_of_json_filenames:
+        with open(json_filename, "w") as out:
+            out.write(json_str)
+
+@profile_function()
 def load_Val_file(val_filename,big_dry_df=pd.DataFrame(),\
     big_stats_df=pd.DataFrame(),big_flags_df=pd.DataFrame(),\
-    big_coeff_sync_df=pd.DataFrame()):
+    big_coeff_sync_df=pd.DataFrame(),dump_json=False):
+    # dump_json=True writes the parsed validation file to parsed_data_pascal_style.json
+    # and parsed_data_w_other_stuff_pascal_style.json in the working folder, for debugging
 
     #### load_Val_File_into_dicts() is useful for validation datasets in 2021 ####
     # bigDictionary, config_stuff = load_Val_File_into_dicts(val_filename)
@@ -2418,25 +2489,18 @@ def load_Val_file(val_filename,big_dry_df=pd.DataFrame(),\
     # print(f'type of flow_ave bigDictionary = {typeflow_ave}')
     # print(f'first entry of Flow_ave = {flow_ave_example}')
 
-    # put config_stuff into bigDictionary
-    for k, v in config_stuff.items():
-        for kk, vv in v.items():
-            bigDictionary[k][kk] = [vv]*10  # 10 total valve states, duplicate the values
-
-    #deal with issues on missing entries of span coefficient, mostly at the first entry
-    bigDictionary = val_fix_span_coeff_in_dict(bigDictionary)
+    if ( dump_json ):
+        with profile_stage('load_Val_file: json dump'):
+            dump_val_dict_to_json(bigDictionary,config_stuff,\
+                ["parsed_data_pascal_style.json","parsed_data_w_other_stuff_pascal_style.json"])
 
-    out = open("parsed_data_pascal_style.json", "w")
-    json.dump(bigDictionary, out, indent=4, ensure_ascii=False, allow_nan=True) 
-    out.close()
-
-    list_of_val_df=[]
-    for k, v in bigDictionary.items():
-        list_of_val_df.append(pd.DataFrame(v))
-    super_big_val_df = pd.concat(list_of_val_df,axis=0,ignore_index=True)
+    # config_stuff is broadcast to the 10 valve states of each cycle, missing entries
+    # of span coefficient, mostly at the first entry, are NaN
+    super_big_val_df = build_val_df(bigDictionary,config_stuff)
     #super_big_val_df = super_big_val_df.rename(columns={'datetime':'time'})
     # print('### After pd.concat, first timestamp is = ',super_big_val_df.loc[0,'datetime'])
     
+    merge_stage = start_stage('load_Val_file: merge DRY, STATS, FLAGS and COEFF')
     if ( big_dry_df.empty or big_stats_df.empty or big_flags_df.empty or\
         big_coeff_sync_df.empty):
         super_big_val_df['CO2_dry_ave']=[np.NaN]*len(super_big_val_df)
@@ -2452,25 +2516,18 @@ def load_Val_file(val_filename,big_dry_df=pd.DataFrame(),\
     elif ( not big_dry_df.empty and not big_stats_df.empty \
         and not big_flags_df.empty and not big_coeff_sync_df.empty):
 
-        #### Merge in the dry CO2 data by timestamp from the dry dataframe #### 
-        super_big_val_df = super_big_val_df.merge(big_dry_df, left_on='datetime',\
-            right_on='TS',how='left',suffixes=('','_from_dry'))
+        #### Merge in the dry CO2 data by timestamp from the dry dataframe, ####
+        #### the num samples data from the stats dataframe, the flags data from ####
+        #### big_flags_df and the coefficient data, all in one join ####
+        super_big_val_df = join_on_datetime(super_big_val_df,'datetime',\
+            [(big_dry_df,'TS','_from_dry'),\
+            (big_stats_df[['Timestamp','Num_samples']],'Timestamp',''),\
+            (big_flags_df,'Timestamp','_flg'),\
+            (big_coeff_sync_df,'Timestamp','_sync')])
         dry_rename = {'xCO2(dry)':'CO2_dry_ave'}
         super_big_val_df = super_big_val_df.rename(columns=dry_rename)
 
-        #### Merge in the num samples data from the stats dataframe ####
-        super_big_val_df = super_big_val_df.merge(big_stats_df[['Timestamp','Num_samples']],\
-            left_on='datetime',right_on='Timestamp',how='left',suffixes=('',''))
-        
-        #super_big_val_df = super_big_val_df.drop(columns=[])
-
-        #### Merge in the flags data from the big_flags_df dataframe ####
-        super_big_val_df = super_big_val_df.merge(big_flags_df,\
-            left_on='datetime',right_on='Timestamp',how='left',suffixes=('','_flg'))
-
         #### Overwrite the coefficient data 'CO2kzero', 'CO2kspan' and 'CO2kspan2' ####
-        super_big_val_df = super_big_val_df.merge(big_coeff_sync_df,\
-            left_on='datetime',right_on='Timestamp',how='left',suffixes=('','_sync'))
         super_big_val_df = super_big_val_df.drop(columns=['CO2kzero','CO2kspan',\
             'CO2kspan2','Timestamp_sync','mode_sync'])
         super_big_val_df = super_big_val_df.rename(columns={'CO2kzero_sync':'CO2kzero',
@@ -2481,6 +2538,7 @@ def load_Val_file(val_filename,big_dry_df=pd.DataFrame(),\
         # print(f'super_big_val_df.columns.values = {super_big_val_df.columns.values}')
     else: 
         raise Exception('STATS data provided but not DRY data or vice versa')
+    stop_stage(merge_stage,rows=len(super_big_val_df))
 
     # synced = super_big_val_df['CO2_dry_ave'] >= -1.0 #np.NaN  # why doesn't xCO2(dry) have _from_dry suffix?
     # pd.set_option('max_columns',None)
@@ -2571,9 +2629,6 @@ def load_Val_file(val_filename,big_dry_df=pd.DataFrame(),\
     super_big_val_df = super_big_val_df.drop(columns=['CO2_DRY_TCORR_RESIDUAL_STDDEV_ASVCO2'])
 
     #### END New stuff for flow ####    
-    out = open("parsed_data_w_other_stuff_pascal_style.json", "w")
-    json.dump(bigDictionary, out, indent=4, ensure_ascii=False, allow_nan=True) 
-    out.close()
 
     #### BEGIN to put flow values into super_duper_df, which is derived from super_big_df ####
     # super_duper_df = super_big_df.append(super_big_val_df[['time','Flow_ave','Flow_sd']],sort=False)
@@ -2672,7 +2727,83 @@ def all_filename_is_current(validation_text_filename,all_filename):
         is_current_test = False
     return is_current_test 
 
-def extract_summary_and_raw_to_csv(sn,path_to_data,validation_text_filename):
+def count_csv_rows(filename):
+    # rows below the header, 0 if there is no such file
+    if not ( os.path.exists(filename) ):
+        return 0
+    with open(filename,'r') as f:
+        num_lines = sum(1 for line in f)
+    return max(num_lines - 1,0)
+
+@profile_function()
+def parse_and_correct_ASVall_file(filename):
+    # Everything extract_summary_and_raw_to_csv() needs from one ALL file, returned as
+    # (df_file, df_dry, df_dry_sync, df_stats, df_ts_flags, df_coeff_sync), or None if the
+    # file has no COEFF, DRY or FLAGS lines. Kept at module level so that it can be
+    # sent to a process pool. filename may also be what tokenize_ASVall_file() returns.
+    # Pascal, bypass files without coefficients
+    parsed_file = get_parsed_ASVall_file(filename)
+    COEFF_DRY_FLAGS_found_in_file = ( len(parsed_file['COEFF']) > 0 and \
+        len(parsed_file['DRY']) > 0 and len(parsed_file['FLAGS']) > 0 )
+    if ( COEFF_DRY_FLAGS_found_in_file ):
+        df_file = parse_all_file_df_w_summary_v2(parsed_file)
+        df_dry_sync, df_dry = loadASVall_dry(parsed_file)
+        df_stats = loadASVall_stats(parsed_file)
+        df_flags = loadASVall_flags(parsed_file)
+        df_ts_flags = add_ts_to_flags(df_flags,df_stats)
+        df_coeff_sync = loadASVall_coeff_sync(parsed_file)
+        return df_file, df_dry, df_dry_sync, df_stats, df_ts_flags, df_coeff_sync
+    else:
+        return None
+
+def iterate_ASVall_results(filenames, cache_path, cache_tag, use_cache=True, check_hash=False,\
+    max_workers=1):
+    # Yields (filename, result of parse_and_correct_ASVall_file(), True if it came from the
+    # cache) in filename order. With max_workers > 1 up to 2*max_workers files are parsed
+    # ahead of the one yielded, so only that many results are held in memory at once.
+    if ( max_workers > 1 and len(filenames) > 1 ):
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        executor = None
+    # (filename, future or None, result, from cache)
+    pending = collections.deque()
+    try:
+        for filename in filenames:
+            print(filename)
+            cached_result = None
+            if ( use_cache ):
+                cached_result = load_from_cache(cache_path,filename,cache_tag,\
+                    check_hash=check_hash)
+            if ( cached_result is not None ):
+                pending.append((filename,None,cached_result['result'],True))
+            elif ( executor is not None ):
+                pending.append((filename,executor.submit(parse_and_correct_ASVall_file,filename),\
+                    None,False))
+            else:
+                pending.append((filename,None,parse_and_correct_ASVall_file(filename),False))
+            while ( len(pending) > 0 and \
+                (pending[0][1] is None or pending[0][1].done() or len(pending) > 2*max_workers) ):
+                filename, future, result, from_cache = pending.popleft()
+                yield filename, future.result() if future is not None else result, from_cache
+        while ( len(pending) > 0 ):
+            filename, future, result, from_cache = pending.popleft()
+            yield filename, future.result() if future is not None else result, from_cache
+    finally:
+        if ( executor is not None ):
+            executor.shutdown()
+
+def extract_summary_and_raw_to_csv(sn,path_to_data,validation_text_filename,max_workers=1,\
+    use_cache=True,check_hash=False,max_cache_bytes=512*1024*1024,output_formats=('csv',),\
+    incremental=True):
+    # max_workers > 1 parses the ALL files in that many processes, results are still
+    # concatenated in filename order so the csv files match the serial run.
+    # Parsed files are kept in reports/.cache unless use_cache is False, see parse_cache.py
+    # incremental=True reuses the rows of the ALL files of the last run and only parses
+    # the files added since, see run_manifest.py. The raw rows of the last run are taken
+    # from its raw csv file, so without 'csv' in output_formats every run is a full one.
+    # output_formats is any of 'csv', 'parquet' and 'feather', see columnar_output.py
+    # The raw rows are written out file by file and not kept, the raw filenames written
+    # are returned with the summary dataframe.
     #%%
     if sys.platform.startswith('win'):
         dir_sep = '\\'
@@ -2709,57 +2840,101 @@ def extract_summary_and_raw_to_csv(sn,path_to_data,validation_text_filename):
     end_filename_without_path=re.findall(r'\d+_\d+\.txt',filenames[-1])[0]
     date_range=(start_filename_without_path,end_filename_without_path)
     
-    list_of_df = []
     list_of_dry_df = []
     list_of_dry_df_sync = []
     list_of_stats_df = []
     list_of_flags_df = []
     list_of_coeff_sync_df =[]
-    for idx, filename in enumerate(filenames):
-        print(filename)
-        # Pascal, bypass files without coefficients
-        COEFF_DRY_FLAGS_found_in_file=False
-        with open(filename) as f:
-            file_text = f.read()
-            if (('COEFF' in file_text) and \
-                ('DRY' in file_text) and \
-                ('FLAGS' in file_text)):
-                COEFF_DRY_FLAGS_found_in_file =True
-            f.close()
-            del f,file_text
-        if ( COEFF_DRY_FLAGS_found_in_file ):
-            df_file = parse_all_file_df_w_summary_v2(filename)
-            df_dry_sync, df_dry = loadASVall_dry(filename)
-            df_stats = loadASVall_stats(filename)
-            df_flags = loadASVall_flags(filename)
-            df_ts_flags = add_ts_to_flags(df_flags,df_stats)
-            df_coeff_sync = loadASVall_coeff_sync(filename)
-            list_of_df.append(df_file)
+    cache_path = reports_path + dir_sep + '.cache'
+    cache_tag = 'parse_and_correct_ASVall_file'
+    raw_filename = csv_path + dir_sep + 'raw_' + sn + '_' + date_range[0][0:8]
+
+    #### rows of the files already processed by the last run ####
+    run_manifest_filename = csv_path + dir_sep + 'run_manifest_' + sn + '.json'
+    run_frames_filename = cache_path + dir_sep + 'run_frames_' + sn + '.pickle'
+    previous_frames = None
+    list_of_previous_entries = []
+    if ( incremental ):
+        with profile_stage('extract: load previous run') as stage:
+            previous_frames, list_of_previous_entries = get_previous_run(run_manifest_filename,\
+                run_frames_filename,validation_text_filename,filenames,check_hash=check_hash)
+            # the raw rows of the last run are read back from its raw csv file, as text,
+            # so they can only be reused when the csv output is written, see run_manifest.py
+            if ( previous_frames is not None ):
+                num_previous_raw_rows = list_of_previous_entries[-1]['rows']['raw'][1]
+                if ( 'csv' not in output_formats or \
+                    count_csv_rows(raw_filename + '.csv') < num_previous_raw_rows ):
+                    previous_frames, list_of_previous_entries = None, []
+            stage['rows'] = len(list_of_previous_entries)
+    if ( previous_frames is not None ):
+        list_of_dry_df, list_of_dry_df_sync, list_of_stats_df, \
+            list_of_flags_df, list_of_coeff_sync_df = [[df] for df in previous_frames[1:]]
+    new_filenames = filenames[len(list_of_previous_entries):]
+
+    #### raw rows are written as each file is parsed, only the smaller frames are kept ####
+    raw_stream = open_output_stream(raw_filename,output_formats)
+    list_of_new_row_counts = []
+    with profile_stage('extract: parse and write raw') as stage:
+        if ( previous_frames is not None ):
+            for df_previous_raw in pd.read_csv(raw_filename + '.csv',dtype=str,\
+                keep_default_na=False,nrows=num_previous_raw_rows,chunksize=100000):
+                append_df_to_output_stream(raw_stream,df_previous_raw)
+        for filename, result, from_cache in iterate_ASVall_results(new_filenames,cache_path,\
+            cache_tag,use_cache=use_cache,check_hash=check_hash,max_workers=max_workers):
+            if ( use_cache and not from_cache ):
+                # wrapped in a dict so files without COEFF, DRY or FLAGS are cached too
+                save_to_cache(cache_path,filename,cache_tag,{'result':result},\
+                    check_hash=check_hash)
+            if ( result is None ):
+                list_of_new_row_counts.append(None)
+                continue
+            df_file, df_dry, df_dry_sync, df_stats, df_ts_flags, df_coeff_sync = result
+            list_of_new_row_counts.append([len(df) for df in result])
+            append_df_to_output_stream(raw_stream,df_file)
             list_of_dry_df.append(df_dry)
             list_of_stats_df.append(df_stats)
             list_of_flags_df.append(df_ts_flags)
-            #print(f'percent done = {100*idx/len(filenames)}%')
             list_of_dry_df_sync.append(df_dry_sync)
             list_of_coeff_sync_df.append(df_coeff_sync)
-
-    super_big_df = pd.concat(list_of_df,axis=0,ignore_index=True)
-    super_big_dry_df = pd.concat(list_of_dry_df,axis=0,ignore_index=True)
-    super_big_dry_df_sync = pd.concat(list_of_dry_df_sync,axis=0,ignore_index=True)
-    super_big_stats_df = pd.concat(list_of_stats_df,axis=0,ignore_index=True)
-    super_big_flags_df = pd.concat(list_of_flags_df,axis=0,ignore_index=True)
-    super_big_coeff_sync_df = pd.concat(list_of_coeff_sync_df,axis=0,ignore_index=True)
-    raw_csv_filename = csv_path + dir_sep + 'raw_' + sn + '_' + date_range[0][0:8] + '.csv'
-    super_big_df.to_csv(raw_csv_filename, index=False)
-
-    stats_csv_filename = csv_path + dir_sep + 'stats_' + sn + '_' + date_range[0][0:8] + '.csv'
-    super_big_stats_df.to_csv(stats_csv_filename, index=False)
+        stage['rows'] = raw_stream['rows']
+    if ( use_cache ):
+        evict_cache(cache_path,max_cache_bytes)
+
+    with profile_stage('extract: concat') as stage:
+        super_big_dry_df = pd.concat(list_of_dry_df,axis=0,ignore_index=True)
+        super_big_dry_df_sync = pd.concat(list_of_dry_df_sync,axis=0,ignore_index=True)
+        super_big_stats_df = pd.concat(list_of_stats_df,axis=0,ignore_index=True)
+        super_big_flags_df = pd.concat(list_of_flags_df,axis=0,ignore_index=True)
+        super_big_coeff_sync_df = pd.concat(list_of_coeff_sync_df,axis=0,ignore_index=True)
+        stage['rows'] = len(super_big_stats_df)
+
+    list_of_raw_filenames = close_output_stream(raw_stream)
+
+    if ( incremental ):
+        with profile_stage('extract: save run manifest'):
+            save_run(run_manifest_filename,run_frames_filename,validation_text_filename,\
+                list_of_previous_entries,new_filenames,list_of_new_row_counts,\
+                [None,super_big_dry_df,super_big_dry_df_sync,super_big_stats_df,\
+                super_big_flags_df,super_big_coeff_sync_df],check_hash=check_hash)
+
+    with profile_stage('extract: write stats') as stage:
+        stats_filename = csv_path + dir_sep + 'stats_' + sn + '_' + date_range[0][0:8]
+        for output_format in output_formats:
+            write_df_to_file(super_big_stats_df, stats_filename, output_format)
+        stage['rows'] = len(super_big_stats_df)
 
     super_big_val_df = load_Val_file(validation_text_filename,super_big_dry_df_sync,\
         super_big_stats_df,super_big_flags_df,super_big_coeff_sync_df)
-    summary_csv_filename = csv_path + dir_sep + 'summary_' + sn + '_' + date_range[0][0:8] + '.csv'
-    super_big_val_df.to_csv(summary_csv_filename,index=False)
+    with profile_stage('extract: write summary') as stage:
+        summary_filename = csv_path + dir_sep + 'summary_' + sn + '_' + date_range[0][0:8]
+        for output_format in output_formats:
+            write_df_to_file(super_big_val_df, summary_filename, output_format)
+        stage['rows'] = len(super_big_val_df)
+
+    # profile of the stages above, when turned on with ASVCO2_PROFILE, see pipeline_profiler.py
+    write_profile(reports_path + dir_sep + 'profile','extract_summary_and_raw_to_csv')
 
-    return super_big_val_df, super_big_df
+    return super_big_val_df, list_of_raw_filenames
 
 
 if __name__ == '__main__':
@@ -2802,23 +2977,17 @@ if __name__ == '__main__':
         print(filename)
 
         # Pascal, bypass files without coefficients
-        COEFF_DRY_FLAGS_found_in_file=False
-        with open(filename) as f:
-            file_text = f.read()
-            if (('COEFF' in file_text) and \
-                ('DRY' in file_text) and \
-                ('FLAGS' in file_text)):
-                COEFF_DRY_FLAGS_found_in_file =True
-            f.close()
-            del f,file_text
+        parsed_file = tokenize_ASVall_file(filename)
+        COEFF_DRY_FLAGS_found_in_file = ( len(parsed_file['COEFF']) > 0 and \
+            len(parsed_file['DRY']) > 0 and len(parsed_file['FLAGS']) > 0 )
 
         if ( COEFF_DRY_FLAGS_found_in_file ):
-            df_file = parse_all_file_df_w_summary_v2(filename)
-            df_dry_sync, df_dry = loadASVall_dry(filename)
-            df_stats = loadASVall_stats(filename)
-            df_flags = loadASVall_flags(filename)
+            df_file = parse_all_file_df_w_summary_v2(parsed_file)
+            df_dry_sync, df_dry = loadASVall_dry(parsed_file)
+            df_stats = loadASVall_stats(parsed_file)
+            df_flags = loadASVall_flags(parsed_file)
             df_ts_flags = add_ts_to_flags(df_flags,df_stats)
-            df_coeff_sync = loadASVall_coeff_sync(filename)
+            df_coeff_sync = loadASVall_coeff_sync(parsed_file)
             list_of_df.append(df_file)
             list_of_dry_df.append(df_dry)
             list_of_stats_df.append(df_stats)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk cache for results parsed out of ALL files, so that re-running the
+reports over an unchanged ALL folder does not re-parse every file.
+
+Each cache entry is one pickle file in the cache folder, normally
+reports/.cache, holding the cache version, the signature of the source file
+(path, size, mtime and, when asked for, a sha1 of the contents), an optional
+extra key for anything else the result depends on and the result itself.
+
+The cache version is CACHE_VERSION and a hash of the source of the modules
+which compute the cached results, CACHED_RESULT_MODULES, so any edit of them
+makes a new cache and nobody has to remember to bump a number.
+"""
+import os
+import hashlib
+import pickle
+
+# Layout of the cached results, part of the key of every entry. Changes of the modules
+# in CACHED_RESULT_MODULES are caught by their hash, bump this only when the results
+# change because of code outside of them.
+#   1 - string columns (entries without a version)
+#   2 - typed DATA and STATS columns, nullable Int64 raw counts
+CACHE_VERSION = 2
+
+# modules of this folder whose functions' results are cached, or used by them
+CACHED_RESULT_MODULES = ['parse_all_into_csv9_dry_Tcorr','special_functions','postprocessingLICOR']
+
+def get_source_hash(list_of_module_names):
+    # sha1 of the source files of the modules, read once at import
+    sha1 = hashlib.sha1()
+    for module_name in list_of_module_names:
+        source_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),\
+            module_name + '.py')
+        with open(source_filename, 'rb') as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()[:16]
+
+SOURCE_HASH = get_source_hash(CACHED_RESULT_MODULES)
+
+def get_cache_version():
+    return str(CACHE_VERSION) + '-' + SOURCE_HASH
+
+def get_file_signature(filename, with_sha1=True):
+    # path, size and mtime of filename, and the sha1 of its contents if with_sha1,
+    # None otherwise since it means reading the whole file
+    file_stat = os.stat(filename)
+    sha1_hexdigest = None
+    if ( with_sha1 ):
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        sha1_hexdigest = sha1.hexdigest()
+    signature = {'path':os.path.abspath(filename),'size':file_stat.st_size,\
+        'mtime':file_stat.st_mtime_ns,'sha1':sha1_hexdigest}
+    return signature
+
+def get_cache_filename(cache_path, filename, tag):
+    # one cache file per (source file, tag, cache version), tag is normally the
+    # parsing function's name
+    key = hashlib.sha1((os.path.abspath(filename) + '|' + tag + '|' + \
+        get_cache_version()).encode('utf-8')).hexdigest()
+    return os.path.join(cache_path, tag + '_' + key + '.pickle')
+
+def load_from_cache(cache_path, filename, tag, extra_key=None, check_hash=False):
+    # Returns the cached result, or None if there is no valid entry. An entry is valid
+    # if it was written with this cache version, path, size and mtime match, and the
+    # content hash too if check_hash is True.
+    cache_filename = get_cache_filename(cache_path, filename, tag)
+    if not os.path.exists(cache_filename):
+        return None
+
+    try:
+        with open(cache_filename, 'rb') as f:
+            entry = pickle.load(f)
+    except Exception:  # truncated or unreadable entry, treat as a miss
+        return None
+
+    file_stat = os.stat(filename)
+    cached_signature = entry['signature']
+    if ( entry.get('version') != get_cache_version() or \
+        cached_signature['path'] != os.path.abspath(filename) or \
+        cached_signature['size'] != file_stat.st_size or \
+        cached_signature['mtime'] != file_stat.st_mtime_ns or \
+        entry['extra_key'] != extra_key ):
+        return None
+    # entries saved without a hash are a miss when the hash is checked
+    if ( check_hash and (cached_signature['sha1'] is None or \
+        cached_signature['sha1'] != get_file_signature(filename)['sha1']) ):
+        return None
+
+    os.utime(cache_filename)  # mark as recently used for evict_cache()
+    return entry['result']
+
+def save_to_cache(cache_path, filename, tag, result, extra_key=None, check_hash=False):
+    # the sha1 of filename is only computed with check_hash, as load_from_cache() needs it then
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_path)
+    cache_filename = get_cache_filename(cache_path, filename, tag)
+    entry = {'version':get_cache_version(),\
+        'signature':get_file_signature(filename,with_sha1=check_hash),\
+        'extra_key':extra_key,'result':result}
+    # write to a temporary file first so an interrupted run never leaves half an entry
+    temp_filename = cache_filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, cache_filename)
+
+def evict_cache(cache_path, max_cache_bytes=512*1024*1024):
+    # Least recently used entries are removed until the folder fits in max_cache_bytes
+    if not os.path.exists(cache_path):
+        return
+    entries = []
+    for name in os.listdir(cache_path):
+        if name.endswith('.pickle'):
+            cache_filename = os.path.join(cache_path, name)
+            file_stat = os.stat(cache_filename)
+            entries.append((file_stat.st_mtime, file_stat.st_size, cache_filename))
+    entries.sort()
+    total_bytes = sum([entry[1] for entry in entries])
+    for mtime, size, cache_filename in entries:
+        if ( total_bytes <= max_cache_bytes ):
+            break
+        os.remove(cache_filename)
+        total_bytes -= size
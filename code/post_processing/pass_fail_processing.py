@@ -1,22 +1,9 @@
 import numpy as np
 import pandas as pd
+import functools
 
-def pf_limits(gas_conc,calc_type='Tcorr',output_type='combined'):
-    '''
-    The values below are gathered from the following document
-    https://docs.google.com/document/d/1nNsXKDLFjpTtatEaTFqVL7Rxe7GRthU4CqpGqM7NBt8/edit#heading=h.gjdgxs
-    
-    Text excerpt is the following:
-    The system passes validation if the CO2 value falls within the criteria listed below.
-    MAPCO2 passes when the residual between the standard reference gas and MAPCO2 measurements is less than:
-	    0 -  <2 (if higher then run again to see if there is residual from the 2500)
-        200 <4 ppm
-        300, 400, 500 less than 3 ppm
-        800,  less than 3 ppm (this may be adjusted)
-        2500 ppm less than 40 (typically less than 20)
-
-    Pass-fail limits exist as tuples of (gas concentration, limit) pairs
-    '''
+def get_gas_limits(calc_type='Tcorr',output_type='combined'):
+    # GAS_LIMITS table of (gas concentration, limit) pairs used by pf_limits()
     # 6/8/2021
     # These limits will apply to temperature corrected units.
     # We would like to have a bare minimum of 3 samples, ideally 5 or 6 samples.
@@ -121,6 +108,26 @@ def pf_limits(gas_conc,calc_type='Tcorr',output_type='combined'):
     else:
         raise Exception(f'Unknown argument {output_type} given to pf_limits()')
 
+    return GAS_LIMITS
+
+def pf_limits(gas_conc,calc_type='Tcorr',output_type='combined'):
+    '''
+    The values below are gathered from the following document
+    https://docs.google.com/document/d/1nNsXKDLFjpTtatEaTFqVL7Rxe7GRthU4CqpGqM7NBt8/edit#heading=h.gjdgxs
+    
+    Text excerpt is the following:
+    The system passes validation if the CO2 value falls within the criteria listed below.
+    MAPCO2 passes when the residual between the standard reference gas and MAPCO2 measurements is less than:
+	    0 -  <2 (if higher then run again to see if there is residual from the 2500)
+        200 <4 ppm
+        300, 400, 500 less than 3 ppm
+        800,  less than 3 ppm (this may be adjusted)
+        2500 ppm less than 40 (typically less than 20)
+
+    Pass-fail limits exist as tuples of (gas concentration, limit) pairs
+    '''
+    GAS_LIMITS = get_gas_limits(calc_type,output_type)
+
     N = len(GAS_LIMITS)
     if ( gas_conc < GAS_LIMITS[0][0] or gas_conc > GAS_LIMITS[N-1][0]):
         raise Exception(f'''{gas_conc} ppm is outside limits of the GAS_LIMITS table in
@@ -153,18 +160,51 @@ def pf_limits(gas_conc,calc_type='Tcorr',output_type='combined'):
     
     return pf_limit
 
+@functools.lru_cache(maxsize=None)
+def get_gas_limits_arrays(calc_type='Tcorr',output_type='combined',version=1):
+    # GAS_LIMITS table as numpy breakpoint arrays, built once per table. version=1 is
+    # the table used by pf_limits() and version=2 the table used by pf_limits_v2()
+    if ( version == 1 ):
+        GAS_LIMITS = get_gas_limits(calc_type,output_type)
+    elif ( version == 2 ):
+        GAS_LIMITS = get_gas_limits_v2(calc_type,output_type)
+    else:
+        raise Exception(f'Unknown version {version} given to get_gas_limits_arrays()')
+    gas_conc_breakpoints = np.array([x[0] for x in GAS_LIMITS],dtype=float)
+    limit_breakpoints = np.array([x[1] for x in GAS_LIMITS],dtype=float)
+    # shared between calls, so make them read only
+    gas_conc_breakpoints.setflags(write=False)
+    limit_breakpoints.setflags(write=False)
+    return gas_conc_breakpoints, limit_breakpoints
+
+def pf_limits_array(gas_conc,calc_type='Tcorr',output_type='combined',version=1):
+    # Same as pf_limits() or pf_limits_v2(), see version above, for an array of gas concentrations
+    gas_conc = np.asarray(gas_conc,dtype=float)
+    gas_conc_breakpoints, limit_breakpoints = \
+        get_gas_limits_arrays(calc_type,output_type,version)
+    outside_of_table = (gas_conc < gas_conc_breakpoints[0]) | \
+        (gas_conc > gas_conc_breakpoints[-1])
+    if ( np.any(outside_of_table) ):
+        raise Exception(f'''{gas_conc[outside_of_table]} ppm is outside limits of the GAS_LIMITS table in
+        pass_fail_processing.py, which must be between {gas_conc_breakpoints[0]} and 
+        {gas_conc_breakpoints[-1]} ppm''')
+
+    #Limits with the nearest gas concentration value will be linearly interpolated
+    pf_limit = np.interp(gas_conc,gas_conc_breakpoints,limit_breakpoints)
+    # pf_limits() returns the last limit of the table for NaN, do the same here
+    pf_limit[np.isnan(gas_conc)] = limit_breakpoints[-1]
+
+    return pf_limit
+
 def calculate_pf_df(df_with_stdev_mean,n_std_dev,calc_type='Tcorr',output_type='combined'):
     #print(f'calc_type = {calc_type}, output_type = {output_type}')
+    gas_standard = df_with_stdev_mean["gas_standard"].to_numpy(dtype=float)
+    mean = df_with_stdev_mean["mean"].to_numpy(dtype=float)
+    stdev = df_with_stdev_mean["stdev"].to_numpy(dtype=float)
     if ( output_type == 'combined' ):
-        pass_or_fail_column=[]
-        for idx, row in df_with_stdev_mean.iterrows():
-            if (abs(row["mean"])+n_std_dev*row["stdev"]) > pf_limits(row["gas_standard"],\
-                calc_type, output_type):
-                pass_or_fail_column.append("FAIL") 
-            else:
-                pass_or_fail_column.append("PASS")
-            
-        upper_limit_column = [pf_limits(row["gas_standard"],calc_type) for idx, row in df_with_stdev_mean.iterrows()]
+        upper_limit_column = pf_limits_array(gas_standard,calc_type,output_type)
+        pass_or_fail_column = np.where((np.abs(mean)+n_std_dev*stdev) > upper_limit_column,\
+            "FAIL","PASS")
         
         df_4_table_2 = df_with_stdev_mean.copy()
         df_4_table_2["pass_or_fail"] = pass_or_fail_column
@@ -174,30 +214,18 @@ def calculate_pf_df(df_with_stdev_mean,n_std_dev,calc_type='Tcorr',output_type='
     
     elif ( output_type == 'separate' ):
         #### calculate pass/fail for the mean only ####
-        mean_pass_or_fail_column=[]
-        for idx, row in df_with_stdev_mean.iterrows():
-            if (abs(row["mean"])) > pf_limits(row["gas_standard"],calc_type, 'mean'):
-                mean_pass_or_fail_column.append("FAIL") 
-            else:
-                mean_pass_or_fail_column.append("PASS")
-            
-        mean_upper_limit_column = [pf_limits(row["gas_standard"],calc_type, 'mean')\
-             for idx, row in df_with_stdev_mean.iterrows()]
+        mean_upper_limit_column = pf_limits_array(gas_standard,calc_type,'mean')
+        mean_pass_or_fail_column = np.where(np.abs(mean) > mean_upper_limit_column,\
+            "FAIL","PASS")
         
         df_4_table_2 = df_with_stdev_mean.copy()
         df_4_table_2["mean_pass_or_fail"] = mean_pass_or_fail_column
         df_4_table_2["mean_upper_limit"] = mean_upper_limit_column
 
         #### calculate pass/fail for standard deviation only ####
-        stdev_pass_or_fail_column=[]
-        for idx, row in df_with_stdev_mean.iterrows():
-            if (abs(row["stdev"])) > pf_limits(row["gas_standard"],calc_type, 'stdev'):
-                stdev_pass_or_fail_column.append("FAIL") 
-            else:
-                stdev_pass_or_fail_column.append("PASS")
-            
-        stdev_upper_limit_column = [pf_limits(row["gas_standard"],calc_type, 'stdev')\
-             for idx, row in df_with_stdev_mean.iterrows()]
+        stdev_upper_limit_column = pf_limits_array(gas_standard,calc_type,'stdev')
+        stdev_pass_or_fail_column = np.where(np.abs(stdev) > stdev_upper_limit_column,\
+            "FAIL","PASS")
         
         df_4_table_2["stdev_pass_or_fail"] = stdev_pass_or_fail_column
         df_4_table_2["stdev_upper_limit"] = stdev_upper_limit_column
@@ -207,22 +235,8 @@ def calculate_pf_df(df_with_stdev_mean,n_std_dev,calc_type='Tcorr',output_type='
 
     return df_4_table_2
 
-def pf_limits_v2(gas_conc,calc_type='Tcorr',output_type='combined'):
-    '''
-    The values below are gathered from the following document
-    https://docs.google.com/document/d/1nNsXKDLFjpTtatEaTFqVL7Rxe7GRthU4CqpGqM7NBt8/edit#heading=h.gjdgxs
-    
-    Text excerpt is the following:
-    The system passes validation if the CO2 value falls within the criteria listed below.
-    MAPCO2 passes when the residual between the standard reference gas and MAPCO2 measurements is less than:
-	    0 -  <2 (if higher then run again to see if there is residual from the 2500)
-        200 <4 ppm
-        300, 400, 500 less than 3 ppm
-        800,  less than 3 ppm (this may be adjusted)
-        2500 ppm less than 40 (typically less than 20)
-
-    Pass-fail limits exist as tuples of (gas concentration, limit) pairs
-    '''
+def get_gas_limits_v2(calc_type='Tcorr',output_type='combined'):
+    # GAS_LIMITS table of (gas concentration, limit) pairs used by pf_limits_v2()
     # 6/8/2021
     # These limits will apply to temperature corrected units.
     # We would like to have a bare minimum of 3 samples, ideally 5 or 6 samples.
@@ -330,6 +344,26 @@ def pf_limits_v2(gas_conc,calc_type='Tcorr',output_type='combined'):
     else:
         raise Exception(f'Unknown argument {output_type} given to pf_limits()')
 
+    return GAS_LIMITS
+
+def pf_limits_v2(gas_conc,calc_type='Tcorr',output_type='combined'):
+    '''
+    The values below are gathered from the following document
+    https://docs.google.com/document/d/1nNsXKDLFjpTtatEaTFqVL7Rxe7GRthU4CqpGqM7NBt8/edit#heading=h.gjdgxs
+    
+    Text excerpt is the following:
+    The system passes validation if the CO2 value falls within the criteria listed below.
+    MAPCO2 passes when the residual between the standard reference gas and MAPCO2 measurements is less than:
+	    0 -  <2 (if higher then run again to see if there is residual from the 2500)
+        200 <4 ppm
+        300, 400, 500 less than 3 ppm
+        800,  less than 3 ppm (this may be adjusted)
+        2500 ppm less than 40 (typically less than 20)
+
+    Pass-fail limits exist as tuples of (gas concentration, limit) pairs
+    '''
+    GAS_LIMITS = get_gas_limits_v2(calc_type,output_type)
+
     N = len(GAS_LIMITS)
     if ( gas_conc < GAS_LIMITS[0][0] or gas_conc > GAS_LIMITS[N-1][0]):
         raise Exception(f'''{gas_conc} ppm is outside limits of the GAS_LIMITS table in
@@ -363,55 +397,18 @@ def pf_limits_v2(gas_conc,calc_type='Tcorr',output_type='combined'):
     return pf_limit
 
 def calculate_pf_df_v2(df_with_stdev_mean_max,calc_type='Tcorr'):
-    #### calculate pass/fail for the mean only ####
-
-    mean_pass_or_fail_column=[]
-    for idx, row in df_with_stdev_mean_max.iterrows():
-        ref_gas_midpoint = (row["gas_standard_lower"]+row["gas_standard_upper"])/2.0
-        if (abs(row["mean"])) > pf_limits_v2(ref_gas_midpoint,calc_type, 'mean'):
-            mean_pass_or_fail_column.append("FAIL") 
-        else:
-            mean_pass_or_fail_column.append("PASS")
-            
-    mean_upper_limit_column = [pf_limits_v2((row["gas_standard_lower"]+\
-        row["gas_standard_upper"])/2.0, calc_type, 'mean')\
-        for idx, row in df_with_stdev_mean_max.iterrows()]
-        
+    # limits are looked up at the midpoint of the lower and upper reference gas
+    ref_gas_midpoint = (df_with_stdev_mean_max["gas_standard_lower"].to_numpy(dtype=float)+\
+        df_with_stdev_mean_max["gas_standard_upper"].to_numpy(dtype=float))/2.0
     df_4_table_2 = df_with_stdev_mean_max.copy()
-    df_4_table_2["mean_pass_or_fail"] = mean_pass_or_fail_column
-    df_4_table_2["mean_upper_limit"] = mean_upper_limit_column
-
-    #### calculate pass/fail for standard deviation only ####
-    stdev_pass_or_fail_column=[]
-    for idx, row in df_with_stdev_mean_max.iterrows():
-        ref_gas_midpoint = (row["gas_standard_lower"]+row["gas_standard_upper"])/2.0
-        if (abs(row["stdev"])) > pf_limits_v2(ref_gas_midpoint,calc_type, 'stdev'):
-            stdev_pass_or_fail_column.append("FAIL") 
-        else:
-            stdev_pass_or_fail_column.append("PASS")
-            
-    stdev_upper_limit_column = [pf_limits_v2((row["gas_standard_lower"]+\
-        row["gas_standard_upper"])/2.0,calc_type, 'stdev')\
-        for idx, row in df_with_stdev_mean_max.iterrows()]
-        
-    df_4_table_2["stdev_pass_or_fail"] = stdev_pass_or_fail_column
-    df_4_table_2["stdev_upper_limit"] = stdev_upper_limit_column
-
-    #### calculate pass/fail for max only ####
-    max_pass_or_fail_column=[]
-    for idx, row in df_with_stdev_mean_max.iterrows():
-        ref_gas_midpoint = (row["gas_standard_lower"]+row["gas_standard_upper"])/2.0
-        if (abs(row["max"])) > pf_limits_v2(ref_gas_midpoint,calc_type, 'max'):
-            max_pass_or_fail_column.append("FAIL") 
-        else:
-            max_pass_or_fail_column.append("PASS")
-            
-    max_upper_limit_column = [pf_limits_v2((row["gas_standard_lower"]+\
-        row["gas_standard_upper"])/2.0,calc_type, 'max')\
-        for idx, row in df_with_stdev_mean_max.iterrows()]
-        
-    df_4_table_2["max_pass_or_fail"] = max_pass_or_fail_column
-    df_4_table_2["max_upper_limit"] = max_upper_limit_column
+
+    #### calculate pass/fail for the mean, standard deviation and max ####
+    for output_type in ['mean','stdev','max']:
+        upper_limit_column = pf_limits_array(ref_gas_midpoint,calc_type,output_type,version=2)
+        values = df_with_stdev_mean_max[output_type].to_numpy(dtype=float)
+        df_4_table_2[output_type + "_pass_or_fail"] = np.where(\
+            np.abs(values) > upper_limit_column,"FAIL","PASS")
+        df_4_table_2[output_type + "_upper_limit"] = upper_limit_column
 
     return df_4_table_2
         
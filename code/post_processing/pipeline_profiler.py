@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stage level timing and memory profile of the report pipeline.
+
+Turned on with the environment variable ASVCO2_PROFILE,
+    ASVCO2_PROFILE=1      record the stages and write the profile files
+    ASVCO2_PROFILE=print  same, and also print a summary table at the end
+When it is off, the stages below cost one flag check each.
+
+Stages are recorded with,
+    with profile_stage('extract: concat') as stage:
+        ...
+        stage['rows'] = len(df)   # optional, rows processed
+
+    @profile_function()            # stage name is the function name
+    def load_Val_file(...):
+
+    stage = start_stage('plots')   # for long blocks of older code
+    ...
+    stop_stage(stage)
+
+Per stage name the profile has the number of calls, wall time, CPU time, rows
+processed and the peak resident memory (peak RSS, the process high-water mark
+when the stage ended) and how much the stage raised it. Times of nested stages
+are included in their parent. write_profile() writes the json and csv files.
+Stages run inside worker processes (max_workers > 1) are not recorded, only
+the stage around the process pool.
+"""
+import os
+import sys
+import json
+import time
+import functools
+import contextlib
+import datetime as dt
+import pandas as pd
+
+try:
+    import resource  # not available on Windows, memory is then left out
+except ImportError:
+    resource = None
+
+PROFILING_ENABLED = os.environ.get('ASVCO2_PROFILE','0').strip().lower() not in ['','0','false','no']
+PRINT_SUMMARY = os.environ.get('ASVCO2_PROFILE','').strip().lower() == 'print'
+
+stage_records = {}  # stage name -> totals over all calls
+stage_stack = []  # names of the stages currently running, for the parent of a stage
+DISABLED_STAGE = contextlib.nullcontext({})
+
+def enable_profiling(enabled=True):
+    global PROFILING_ENABLED
+    PROFILING_ENABLED = enabled
+
+def get_peak_rss_mb():
+    if ( resource is None ):
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if ( sys.platform.startswith('darwin') ):
+        return max_rss/(1024*1024)  # bytes on macOS
+    return max_rss/1024  # kilobytes on Linux
+
+def start_stage(stage_name):
+    # Returns the running stage, pass it to stop_stage(). None when profiling is off.
+    if ( not PROFILING_ENABLED ):
+        return None
+    stage = {'name':stage_name,'rows':None,\
+        'parent':stage_stack[-1] if len(stage_stack) > 0 else '',\
+        'wall_start':time.perf_counter(),'cpu_start':time.process_time(),\
+        'rss_start':get_peak_rss_mb()}
+    stage_stack.append(stage_name)
+    return stage
+
+def stop_stage(stage, rows=None):
+    if ( stage is None ):
+        return
+    wall_time = time.perf_counter() - stage['wall_start']
+    cpu_time = time.process_time() - stage['cpu_start']
+    peak_rss = get_peak_rss_mb()
+    if ( rows is None ):
+        rows = stage['rows']
+    if ( len(stage_stack) > 0 and stage_stack[-1] == stage['name'] ):
+        stage_stack.pop()
+
+    if ( stage['name'] not in stage_records ):
+        stage_records[stage['name']] = {'stage':stage['name'],'parent':stage['parent'],\
+            'calls':0,'wall_time_s':0.0,'cpu_time_s':0.0,'rows':None,\
+            'peak_rss_mb':None,'rss_growth_mb':None}
+    record = stage_records[stage['name']]
+    record['calls'] += 1
+    record['wall_time_s'] += wall_time
+    record['cpu_time_s'] += cpu_time
+    if ( rows is not None ):
+        record['rows'] = rows if record['rows'] is None else record['rows'] + rows
+    if ( peak_rss is not None ):
+        record['peak_rss_mb'] = peak_rss if record['peak_rss_mb'] is None \
+            else max(record['peak_rss_mb'],peak_rss)
+        growth = peak_rss - stage['rss_start']
+        record['rss_growth_mb'] = growth if record['rss_growth_mb'] is None \
+            else record['rss_growth_mb'] + growth
+
+@contextlib.contextmanager
+def record_stage(stage_name):
+    stage = start_stage(stage_name)
+    try:
+        yield stage
+    finally:
+        stop_stage(stage)
+
+def profile_stage(stage_name):
+    # Context manager, yields a dict where the number of rows processed can be put
+    if ( not PROFILING_ENABLED ):
+        return DISABLED_STAGE
+    return record_stage(stage_name)
+
+def profile_function(stage_name=None):
+    # Decorator, the stage is named after the function unless stage_name is given.
+    # If the function returns a DataFrame its length is counted as the rows processed.
+    def decorator(func):
+        name = func.__name__ if stage_name is None else stage_name
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if ( not PROFILING_ENABLED ):
+                return func(*args, **kwargs)
+            stage = start_stage(name)
+            try:
+                result = func(*args, **kwargs)
+                if ( isinstance(result,pd.DataFrame) ):
+                    stage['rows'] = len(result)
+                return result
+            finally:
+                stop_stage(stage)
+        return wrapper
+    return decorator
+
+def get_profile_df():
+    columns = ['stage','parent','calls','wall_time_s','cpu_time_s','rows',\
+        'peak_rss_mb','rss_growth_mb']
+    return pd.DataFrame(list(stage_records.values()),columns=columns)
+
+def write_profile(output_path, run_name, print_summary=None):
+    # Writes <output_path>/profile_<run_name>_YYYYMMDD-HHMMSS.json and .csv of the
+    # stages recorded so far, then starts over. Returns the json filename, or None
+    # if profiling is off or nothing was recorded.
+    if ( not PROFILING_ENABLED or len(stage_records) == 0 ):
+        return None
+    if ( print_summary is None ):
+        print_summary = PRINT_SUMMARY
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    df_profile = get_profile_df()
+    time_str = dt.datetime.now().strftime('%Y%m%d-%H%M%S')
+    base_filename = os.path.join(output_path,f'profile_{run_name}_{time_str}')
+    profile = {'run':run_name,'datetime':time_str,\
+        'stages':df_profile.to_dict(orient='records')}
+    with open(base_filename + '.json','w') as f:
+        json.dump(profile,f,indent=4,allow_nan=True)
+    df_profile.to_csv(base_filename + '.csv',index=False)
+
+    if ( print_summary ):
+        pd.set_option('display.max_columns',None)
+        pd.set_option('display.width',200)
+        print(f'#### Profile of {run_name} ####')
+        print(df_profile.to_string(index=False,float_format=lambda x: f'{x:.3f}'))
+        pd.reset_option('display.max_columns')
+        pd.reset_option('display.width')
+
+    stage_records.clear()
+    del stage_stack[:]
+    return base_filename + '.json'
@@ -15,8 +15,6 @@ Further edits on 6/23/2021 and later
 """
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm   #plot one color for each run
 import glob
 import re
 import pickle
@@ -24,21 +22,20 @@ import os
 import sys
 import pprint
 import json
-from scipy.stats import t
-from special_functions import dry_correction  # need an udpate import statement for python 3.10, 3/3/2022
+from special_functions import dry_correction, match_gas_standards, calculate_xco2_kernel  # need an udpate import statement for python 3.10, 3/3/2022
 import datetime as dt
+from config_cache import get_reference_gases, get_summary_gas_standard_tag_ranges
+from parse_cache import load_from_cache, save_to_cache, evict_cache
+from pipeline_profiler import profile_function, profile_stage, write_profile
+from calibration_registry import normalize_licor_serial, get_date_of_validation_file, get_span2_calibration
+from parse_all_into_csv9_dry_Tcorr import tokenize_ASVall_file, get_parsed_ASVall_file
 
 
+# The loadASVall_*() functions below accept either a filename or what
+# tokenize_ASVall_file() returns, so that one read can be shared between them.
+
 def loadASVall_coeff(filename):
-    coeff = []
-    # apoff = []
-    linenum = 0
-    pattern_coeff = re.compile("COEFF")  
-    with open(filename, 'rt') as myfile:
-        for line in myfile:
-            linenum += 1
-            if pattern_coeff.search(line) != None:  # If a match is found
-                coeff.append((linenum, line.rstrip('\n')))
+    coeff = list(get_parsed_ASVall_file(filename)['COEFF'])
     df = pd.DataFrame(coeff, columns=['Linenumber', 'Data'])
     df = df.Data.str.split(':', expand=True)
     df = df.drop(columns=[0]).rename(columns={1: "label", 2: "coeff"})
@@ -54,17 +51,14 @@ def loadASVall_coeff(filename):
 
 def loadASVall_flags(filename):
     sub_flags = []
-    pattern_flags = re.compile("FLAGS")  
-    with open(filename, 'rt') as myfile:
-        lines = myfile.readlines()
-        flags_found = False
-        for line in reversed(lines):
-            if pattern_flags.search(line) != None:  # If a match is found
-                flags_found = True
-                each4=re.findall(r'(\d{4})',line.rstrip('\n'))
-                # all4 = '0x' + ''.join(each4)
-                sub_flags=re.split(r' ',line.rstrip('\n'))
-                break
+    flags_lines = get_parsed_ASVall_file(filename)['FLAGS']
+    flags_found = False
+    if ( len(flags_lines) > 0 ):  # the last FLAGS line of the file
+        linenum, line = flags_lines[-1]
+        flags_found = True
+        each4=re.findall(r'(\d{4})',line)
+        # all4 = '0x' + ''.join(each4)
+        sub_flags=re.split(r' ',line)
     
     list_of_flag_names = ['ASVCO2_GENERAL_ERROR_FLAGS', 'ASVCO2_ZERO_ERROR_FLAGS',
     'ASVCO2_SPAN_ERROR_FLAGS', 'ASVCO2_SECONDARYSPAN_ERROR_FLAGS',
@@ -88,16 +82,9 @@ def loadASVall_flags(filename):
 
     return df
 
-##### Modified by Pascal to take in modename as an argument #####
-def loadASVall_data_with_mode(filename,modename):
-    data = []
-    linenum = 0
-    pattern_data = re.compile("DATA")
-    with open(filename, 'rt') as myfile:
-        for line in myfile:
-            linenum += 1
-            if pattern_data.search(line) != None:  # If a match is found
-                data.append((linenum, line.rstrip('\n')))
+def loadASVall_data_all_modes(filename):
+    # DATA lines of every mode, split once, use get_data_with_mode() to pick out a mode
+    data = list(get_parsed_ASVall_file(filename)['DATA'])
     df = pd.DataFrame(data, columns=['Linenumber', 'Data'])
 
     df = df.Data.str.split(':|,', expand=True)
@@ -105,66 +92,67 @@ def loadASVall_data_with_mode(filename,modename):
     df = df.drop(columns=[0]).rename(
         columns={1: "Mode", 2: "Date", 3: "Minute", 4: "Seconds", 5: "SN", 6: "CO2", 7: "Temp", 8: "Pres", 9: "Li_Raw",
                  10: "Li_ref", 11: "RHperc", 12: "RH_T", 13: "O2perc"})
+    return df
 
-    mask = df['Mode'].str.contains(modename)  
-    df = df[mask]
+def get_data_with_mode(df_data_all_modes,modename):
+    mask = df_data_all_modes['Mode'].str.contains(modename)  
+    df = df_data_all_modes[mask]
     return df
 
+##### Modified by Pascal to take in modename as an argument #####
+def loadASVall_data_with_mode(filename,modename):
+    return get_data_with_mode(loadASVall_data_all_modes(filename),modename)
+
 def loadASVall_stats(filename):
     data_dict = {}
-    linenum = 0
     first_header_entered = False
-    pattern_stats = re.compile("STATS")
-    with open(filename, 'rt') as myfile:
-        for line in myfile:
-            linenum += 1
-            if pattern_stats.search(line) != None:  # If a match is found
-                #check if it's a header or not
-                line=line.rstrip('\n')
-                right_of_STATS=re.split(r'STATS:',line)[1]
-                letter_score = sum([c.isalpha() for c in right_of_STATS]) \
-                    /len(right_of_STATS)
-                header_detected = letter_score > 0.5
-                #csv_txt = re.split(r':|,',line)[1:]  # split by ',' or ':' ignore the first item, STATS
-                csv_txt = re.split(r',',line)
-                str_list = [s.strip() for s in csv_txt]  # remove leading and trailing whitespace
-                str_list = [s.replace(" ","") for s in str_list] # remove all whitespace
-                str_list[0]=str_list[0].replace("STATS:","")
-                if ( (not header_detected) and \
-                    first_header_entered ):
-                    #data.append(pd.DataFrame(columns=header,data=str_list))
-                    for idx, k in enumerate(data_dict.keys()):
-                        data_dict[k].append(str_list[idx])
-                elif ( header_detected and \
-                    not first_header_entered ):
-                    header=str_list
-                    #populate empty list with keys, k, the items from the header
-                    for k in header:
-                        data_dict[k] = []
-                    first_header_entered=True
-                elif ( header_detected and \
-                    first_header_entered):
-                    pass  # do nothing 
-                else:
-                    weird_txt = f'File:{filename}\nUnexpected text happened on line number = {linenum}\n{line}'
-                    raise Exception(weird_txt)
-
-        if ( data_dict ):
-            #convert from string to float, if applicable
-            crazy = r'[+-]?\\d+\\.?\\d*[eE][+-]?\\d+|[-]?\\d+\\.\\d+|[-]?\\d+'
-            ts_re = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.?\d*Z'
-            for k, v in data_dict.items():
-                temp = []
-                for item in v:
-                    if ( re.match(crazy,item) and \
-                        re.match(ts_re,item) is None):
-                        temp.append(float(item))
-                    else:
-                        temp.append(item)
-            #construct dataframe
-            df = pd.DataFrame(data_dict)
+    ASVall_file = get_parsed_ASVall_file(filename)
+    for linenum, line in ASVall_file['STATS']:
+        #check if it's a header or not
+        right_of_STATS=re.split(r'STATS:',line)[1]
+        letter_score = sum([c.isalpha() for c in right_of_STATS]) \
+            /len(right_of_STATS)
+        header_detected = letter_score > 0.5
+        #csv_txt = re.split(r':|,',line)[1:]  # split by ',' or ':' ignore the first item, STATS
+        csv_txt = re.split(r',',line)
+        str_list = [s.strip() for s in csv_txt]  # remove leading and trailing whitespace
+        str_list = [s.replace(" ","") for s in str_list] # remove all whitespace
+        str_list[0]=str_list[0].replace("STATS:","")
+        if ( (not header_detected) and \
+            first_header_entered ):
+            #data.append(pd.DataFrame(columns=header,data=str_list))
+            for idx, k in enumerate(data_dict.keys()):
+                data_dict[k].append(str_list[idx])
+        elif ( header_detected and \
+            not first_header_entered ):
+            header=str_list
+            #populate empty list with keys, k, the items from the header
+            for k in header:
+                data_dict[k] = []
+            first_header_entered=True
+        elif ( header_detected and \
+            first_header_entered):
+            pass  # do nothing 
         else:
-            df = pd.DataFrame()
+            weird_txt = f'File:{ASVall_file["filename"]}\nUnexpected text happened on line number = {linenum}\n{line}'
+            raise Exception(weird_txt)
+
+    if ( data_dict ):
+        #convert from string to float, if applicable
+        crazy = r'[+-]?\\d+\\.?\\d*[eE][+-]?\\d+|[-]?\\d+\\.\\d+|[-]?\\d+'
+        ts_re = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.?\d*Z'
+        for k, v in data_dict.items():
+            temp = []
+            for item in v:
+                if ( re.match(crazy,item) and \
+                    re.match(ts_re,item) is None):
+                    temp.append(float(item))
+                else:
+                    temp.append(item)
+        #construct dataframe
+        df = pd.DataFrame(data_dict)
+    else:
+        df = pd.DataFrame()
     
 
     #df = df.Data.str.split(':|,', expand=True)
@@ -179,20 +167,10 @@ def loadASVall_stats(filename):
 
 def loadASVall_dry(filename):
     dry = []
-    pattern_dry = re.compile("DRY")  
-    with open(filename, 'rt') as myfile:
-        lines = myfile.readlines()
-        numlines = len(lines)
-        linenum = numlines
-        for idx in range(numlines-1,-1,-1):  # start from reverse
-            line = lines[idx]
-            linenum -= 1
-            if pattern_dry.search(line) != None:  # If a match is found
-                right_of_DRY = re.split(r'DRY:',line)[1]
-                dry.append((linenum, right_of_DRY.replace(' ','').rstrip('\n')))
-            if len(dry) >= 2:
-                break  # all done, only expecting 2 lines here
-    dry.reverse()
+    ASVall_file = get_parsed_ASVall_file(filename)
+    for linenum, line in ASVall_file['DRY'][-2:]:  # only expecting the last 2 lines here
+        right_of_DRY = re.split(r'DRY:',line)[1]
+        dry.append((linenum - 1, right_of_DRY.replace(' ','')))
 
     # No dry data found, insert NaN and Jan 1st in the year 1 A.D?
     if ( len(dry) == 0 ):
@@ -217,7 +195,7 @@ def loadASVall_dry(filename):
     df = df.drop(columns=['index'])  # silly pandas artifact, a new column named index appears
 
     #### move dry xCO2 values into corresponding timestamps found in STATS ####
-    df_stats = loadASVall_stats(filename)
+    df_stats = loadASVall_stats(ASVall_file)
     #print(df_stats.columns.values)
     mask_apoff = df_stats['State'].str.contains('APOFF')
     #ts_apoff = df_stats['Timestamp'].loc[mask_apoff]
@@ -244,111 +222,113 @@ def loadASVall_dry(filename):
     return df_dry_sync, df
 
 ##### Special addition to avoid manual maintenance of gaslist #####
+#### patterns used by load_Val_File_into_dicts_v3(), compiled once ####
+VAL_NUMBER_RE = re.compile(r'[+-]?\d+\.?\d*[eE][+-]?\d+|[-]?\d+\.\d+|[-]?\d+')  # number, scientific notation
+VAL_TIME_RE = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z')
+VAL_ROW_RE = re.compile(r'(\w+,)+')
+VAL_TIME_EQUALS_RE = re.compile(r'time=(.*)')
+VAL_REF_GAS_RE = re.compile(r'Validation with reference gas:\s*(\d+\.\d+|\d+)')
+
+@profile_function()
 def load_Val_File_into_dicts_v3(val_filename, timestamp_mode='ISO-8601 string'):
     # optional timestamp_mode = 'Unix epoch, days'
+    # Single pass over each section, lines are dispatched on their first token
+    # and each candidate number is searched for once with VAL_NUMBER_RE.
 
-    val_file = open(val_filename,'rt')
-    big_str = val_file.read()
-    stuff = re.split(r'ASVCO2v2\n',big_str)
+    with open(val_filename,'rt') as val_file:
+        big_str = val_file.read()
+    stuff = big_str.split('ASVCO2v2\n')
     #print("...stuff[0]... ",stuff[0])
     d_by_time = {}
     other_stuff = {}
     mode_and_gas_stuff = {}
     flush_stuff = {}
     for idx in range(1,len(stuff)):
-        time_str = re.search(r'time=(.*)',stuff[idx]).groups()[0]#.strip()
-        ref_gas = float(re.search(r'Validation with reference gas:\s*(\d+\.\d+|\d+)',\
-            stuff[idx]).groups()[0])
-        split_by_newline = re.split(r'\n',stuff[idx])
+        time_str = VAL_TIME_EQUALS_RE.search(stuff[idx]).groups()[0]#.strip()
+        ref_gas = float(VAL_REF_GAS_RE.search(stuff[idx]).groups()[0])
+        ref_gas_str = str(ref_gas)  # cast back to string
         first_header_entered=False
         nested_dict = {}
         other_parts = {}
         mode_and_gas_parts = {}
         flush_mean_and_std_parts = {}
-        crazy = r'[+-]?\d+\.?\d*[eE][+-]?\d+|[-]?\d+\.\d+|[-]?\d+'  # number, scientific notation
-        crazier=r'([+-]?\d+\.?\d*[eE][+-]?\d+)|([-]?\d+\.\d+)|([-]?\d+)'  # number, scientific notation with groups
-        time_re = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z'
-        for idx, line in enumerate(split_by_newline):
+        for line in stuff[idx].split('\n'):
             line = line.replace(" ","")
-            if len(line) > 0:
-                letter_score = sum([c.isalpha() for c in line]) \
-                        /len(line)
-            else:
-                letter_score = 0
-            if ( re.match(r'(\w+,)+',line) \
-                and letter_score > 0.5 and first_header_entered == False):
-                header = re.split(r',',line)
-                header.append('gas_standard')
-                for field_name in header:
-                    nested_dict[field_name]=[]
-                first_header_entered = True
-            elif ( first_header_entered == True \
-                and re.match(r'(\w+,)+',line) ):
-                entries_of_data = re.split(r',',line)
-                entries_of_data.append(str(ref_gas))  # cast back to string
-                for idx,field_name in enumerate(header):
-                    if ( re.search(crazy,entries_of_data[idx]) and \
-                         len(re.search(crazy,entries_of_data[idx])[0]) == \
-                         len(entries_of_data[idx]) ):  # most likely a number
-                        entries_of_data[idx]=float(entries_of_data[idx])
-                    if (field_name == 'datetime' and \
-                        timestamp_mode == 'Unix epoch, days'):
-                        some_datetime_object = pd.to_datetime(float(entries_of_data[idx]),unit='D')
-                        ### round up to the nearest second ###
-                        if some_datetime_object.microsecond > 500_000:
-                            some_datetime_object += dt.timedelta(seconds=1)
-                        some_datetime_object = some_datetime_object.replace(microsecond=0)
-                        #entries_of_data[idx]=some_datetime_object.strftime(" %Y-%m-%dT%H:%M:%S.%f")[:-5]+'Z'
-                        entries_of_data[idx]=some_datetime_object.strftime(" %Y-%m-%dT%H:%M:%S")+'Z'
-                    elif (field_name == 'datetime' and \
-                        timestamp_mode == 'ISO-8601 string'):
-                        #if ( re.search(time_re,parts[1].strip()) ):
-                        if ( re.search(time_re,entries_of_data[idx]) ):
-                            entries_of_data[idx] = " " + entries_of_data[idx]  # prepend leading space???
-                        else:
-                            raise Exception (f"""Unrecognized timestamp format for {entries_of_data[idx]} 
-                            found in {val_filename}""")
-                    elif (field_name == 'datetime' and \
-                        not ( timestamp_mode == 'ISO-8601 string' or \
-                            timestamp_mode == 'Unix epoch, days')):
-                        raise Exception (f"""Unrecognized timestamp format of {timestamp_mode} as
-                        second argument of this subroutine""")
-                    nested_dict[field_name].append(entries_of_data[idx])
-            elif ( "=" in line ):
+            if ( len(line) == 0 ):
+                continue
+
+            #### comma separated header or data row, first token is a word followed by a comma ####
+            if ( VAL_ROW_RE.match(line) ):
+                if ( first_header_entered == True ):
+                    entries_of_data = line.split(',')
+                    entries_of_data.append(ref_gas_str)
+                    for jdx,field_name in enumerate(header):
+                        entry = entries_of_data[jdx]
+                        m = VAL_NUMBER_RE.search(entry)
+                        if ( m and len(m[0]) == len(entry) ):  # most likely a number
+                            entry = float(entry)
+                        if ( field_name == 'datetime' ):
+                            if ( timestamp_mode == 'Unix epoch, days' ):
+                                some_datetime_object = pd.to_datetime(float(entry),unit='D')
+                                ### round up to the nearest second ###
+                                if some_datetime_object.microsecond > 500_000:
+                                    some_datetime_object += dt.timedelta(seconds=1)
+                                some_datetime_object = some_datetime_object.replace(microsecond=0)
+                                entry = some_datetime_object.strftime(" %Y-%m-%dT%H:%M:%S")+'Z'
+                            elif ( timestamp_mode == 'ISO-8601 string' ):
+                                if ( VAL_TIME_RE.search(entry) ):
+                                    entry = " " + entry  # prepend leading space???
+                                else:
+                                    raise Exception (f"""Unrecognized timestamp format for {entry} 
+                                    found in {val_filename}""")
+                            else:
+                                raise Exception (f"""Unrecognized timestamp format of {timestamp_mode} as
+                                second argument of this subroutine""")
+                        nested_dict[field_name].append(entry)
+                    continue
+                elif ( sum([c.isalpha() for c in line])/len(line) > 0.5 ):
+                    header = line.split(',')
+                    header.append('gas_standard')
+                    for field_name in header:
+                        nested_dict[field_name]=[]
+                    first_header_entered = True
+                    continue
+                # otherwise fall through, same as a line which is not comma separated
+
+            #### system report, key=value ####
+            if ( "=" in line ):
                 parts = line.split( "=" )
-                #print(line)
-                # if ( re.search(crazy,parts[1].strip()) 
-                if ( re.search(crazy,parts[1].strip()) and \
-                    len(re.search(crazy,parts[1].strip())[0]) == \
-                         len(parts[1].strip()) ):  # most likely a number
-                    other_parts[parts[0].strip()] = float(parts[1].strip())
+                key = parts[0].strip()
+                value = parts[1].strip()
+                m = VAL_NUMBER_RE.search(value)
+                if ( m and len(m[0]) == len(value) ):  # most likely a number
+                    other_parts[key] = float(value)
                 #special case for time = YYYY-MM-DDThh:mm:ssZ
-                elif ( re.search(time_re,parts[1].strip()) and \
-                    'time' in line ):
-                    other_parts['time_of_report_command'] = parts[1].strip()
+                elif ( 'time' in line and VAL_TIME_RE.search(value) ):
+                    other_parts['time_of_report_command'] = value
                 else:
-                    other_parts[parts[0].strip()] = parts[1].strip()
-            elif ( ":" in line and \
-                re.search(time_re,line) is None and \
-                    "Mode" not in line and \
-                    ("CO2k" in line or "CO2L" in line) and \
-                    "Validationwithreferencegas" not in line):
+                    other_parts[key] = value
+                continue
+
+            if ( not ":" in line or "Validationwithreferencegas" in line or \
+                VAL_TIME_RE.search(line) ):
+                continue
+
+            #### coefficients, CO2kzero:, CO2LastZero:, etc. ####
+            if ( "Mode" not in line and ("CO2k" in line or "CO2L" in line) ):
                 parts = line.split(":")
-                if ( re.search(crazy,parts[1].strip()) and \
-                    len(re.search(crazy,parts[1].strip())[0]) == \
-                         len(parts[1].strip()) ):  # most likely a number
-                    other_parts[parts[0].strip()] = float(parts[1].strip())
+                key = parts[0].strip()
+                value = parts[1].strip()
+                m = VAL_NUMBER_RE.search(value)
+                if ( m and len(m[0]) == len(value) ):  # most likely a number
+                    other_parts[key] = float(value)
                 else:
-                    other_parts[parts[0].strip()] = parts[1].strip()
-            elif ( ":" in line and \
-                re.search(time_re,line) is None and \
-                    "Mode" in line and \
-                    "CO2k" not in line and \
-                    "CO2L" not in line and \
-                    "Validationwithreferencegas" not in line and \
-                    "OFF" in line):
-                mode_and_gas_comma_parts = line.split(",")
-                for this_txt in mode_and_gas_comma_parts:
+                    other_parts[key] = value
+
+            #### Mode:XXOFF, Gas:XXX ####
+            elif ( "Mode" in line and "CO2k" not in line and "CO2L" not in line and \
+                "OFF" in line ):
+                for this_txt in line.split(","):
                     left_and_right_of_colon = this_txt.split(":")
                     if ( len(left_and_right_of_colon) == 2 ):
                         left_of_colon = left_and_right_of_colon[0]
@@ -358,63 +338,31 @@ def load_Val_File_into_dicts_v3(val_filename, timestamp_mode='ISO-8601 string'):
                                 mode_and_gas_parts[right_of_colon] = {}
                             this_mode = right_of_colon
                         else:
-                            if ( re.search(crazy,right_of_colon.strip()) and \
-                                len(re.search(crazy,right_of_colon.strip())[0]) == \
-                                    len(right_of_colon.strip()) ):  # most likely a number
-                                mode_and_gas_parts[this_mode][left_of_colon] = \
-                                    float(right_of_colon.strip())
-                            elif ( not(left_of_colon in mode_and_gas_parts[this_mode]) and \
-                                re.search(crazier,right_of_colon.strip()) ):
-                                #find the number within the groups() of regex
-                                for item in re.search(crazier,right_of_colon.strip()).groups():
-                                    if ( item ):
-                                        num_as_str = item
-                                        break
-                                mode_and_gas_parts[this_mode][left_of_colon] = \
-                                    float(num_as_str)
+                            value = right_of_colon.strip()
+                            m = VAL_NUMBER_RE.search(value)
+                            if ( m and len(m[0]) == len(value) ):  # most likely a number
+                                mode_and_gas_parts[this_mode][left_of_colon] = float(value)
+                            elif ( not(left_of_colon in mode_and_gas_parts[this_mode]) and m ):
+                                # first number within the text
+                                mode_and_gas_parts[this_mode][left_of_colon] = float(m[0])
                             else:
                                 mode_and_gas_parts[this_mode][left_of_colon] = \
                                     right_of_colon
-            elif ( ":" in line and \
-                re.search(time_re,line) is None and \
-                    "Mode" not in line and \
-                    "CO2k" not in line and \
-                    "CO2L" not in line and \
-                    "Mean" in line and \
-                    "STD" in line and \
-                    "Validationwithreferencegas" not in line and \
-                    "OFF" not in line):
-                flush_mean_and_std_comma_parts = line.split(",")
-                for this_txt in flush_mean_and_std_comma_parts:
+
+            #### Mean:XXX, STD:XXX from flushing ####
+            elif ( "Mode" not in line and "CO2k" not in line and "CO2L" not in line and \
+                "Mean" in line and "STD" in line and "OFF" not in line ):
+                for this_txt in line.split(","):
                     left_and_right_of_colon = this_txt.split(":")
                     if ( len(left_and_right_of_colon) == 2 ):
                         left_of_colon = left_and_right_of_colon[0]
                         right_of_colon = left_and_right_of_colon[1]
-                        if ( "Mean" in left_of_colon ):
-                            if ( not(left_of_colon in flush_mean_and_std_parts) and \
-                                re.search(crazier,right_of_colon) ):  # most likely a number in right_of_colon
-                                #find the number within the groups() of regex
-                                for item in re.search(crazier,right_of_colon.strip()).groups():
-                                    if ( item ):
-                                        this_mean_as_str = item
-                                        break
-                                flush_mean_and_std_parts[left_of_colon] = float(this_mean_as_str)
+                        if ( "Mean" in left_of_colon or "STD" in left_of_colon ):
+                            m = VAL_NUMBER_RE.search(right_of_colon.strip())
+                            if ( not(left_of_colon in flush_mean_and_std_parts) and m ):  # most likely a number in right_of_colon
+                                flush_mean_and_std_parts[left_of_colon] = float(m[0])
                             else:
                                 flush_mean_and_std_parts[left_of_colon] = right_of_colon
-                        elif ( "STD" in left_of_colon ):
-                            if ( not(left_of_colon in flush_mean_and_std_parts) and \
-                                re.search(crazier,right_of_colon) ):  # most likely a number in right_of_colon
-                                #find the number within the groups() of regex
-                                for item in re.search(crazier,right_of_colon.strip()).groups():
-                                    if ( item ):
-                                        this_std_as_str = item
-                                        break
-                                flush_mean_and_std_parts[left_of_colon] = float(this_std_as_str)
-                            else:
-                                flush_mean_and_std_parts[left_of_colon] = right_of_colon
-            elif ( re.search(r'Flushing validaiton gas for (\d+\.\d+|\d+) seconds',line) ):
-                flush_time_str = re.search(r'Flushing validaiton gas for (\d+\.\d+)|(\d+) seconds',line).groups()[0]
-                flush_mean_and_std_parts["flush_time"] = float(flush_time_str)
 
         flush_stuff[time_str] = flush_mean_and_std_parts
         mode_and_gas_stuff[time_str] = mode_and_gas_parts
@@ -427,12 +375,8 @@ def load_Val_File_into_dicts_v3(val_filename, timestamp_mode='ISO-8601 string'):
 ##### Special addition to avoid manual maintenance of gaslist #####
 def get_gaslist(mode_and_gas_stuff=None):
 
-    # read in from referencegases.txt and cast to float
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    referencegases_txt_filename = PROJECT_ROOT + '\\code\\referencegases.txt'
-    refgaslist = list(pd.read_csv(referencegases_txt_filename,\
-         skiprows=1).columns.values)
-    refgaslist = [float(x) for x in refgaslist]
+    # read in from referencegases.txt as floats, see config_cache.py
+    refgaslist = list(get_reference_gases())
 
     # if avalable in code, get the gaslist from mode_and_gas_stuff
     if mode_and_gas_stuff: 
@@ -537,14 +481,70 @@ def all_filename_is_current(validation_text_filename,all_filename):
         is_current_test = False
     return is_current_test 
 
-def extra_range_checks(filename,validation_text_filename):
-    df_flags = loadASVall_flags(filename)
-    df_stats = loadASVall_stats(filename)
+def dump_val_file_dicts_to_json(bigDictionary, config_stuff, mode_and_gas_stuff):
+    # Debug output of what load_Val_File_into_dicts_v3() found, written to the current folder
+
+    #### New stuff to fix "nan" issues found in data from 3CADC7565 ####
+    bigDictionary = val_fix_nan_in_dict(bigDictionary)
+    bDkeys = list(bigDictionary.keys())
+    typeflow_ave = type(bigDictionary[bDkeys[0]]['Flow_ave'][0])
+    flow_ave_example = bigDictionary[bDkeys[0]]['Flow_ave'][0]
+    print(f'type of flow_ave bigDictionary = {typeflow_ave}')
+    print(f'first entry of Flow_ave = {flow_ave_example}')
+    pp = pprint.PrettyPrinter(indent=4)
+    #pp.pprint(bigDictionary)
+    out = open("bigD_parsed_from_val_file.json", "w")
+    json.dump(bigDictionary, out, indent=4, ensure_ascii=False, allow_nan=True) 
+    out.close()
+
+    #pp.pprint(mode_and_gas_stuff)
+    out = open("mode_and_gas_parsed_from_val_file.json", "w")
+    json.dump(mode_and_gas_stuff, out, indent=4, ensure_ascii=False, allow_nan=True) 
+    out.close()
+
+    cskeys = list(config_stuff.keys())
+    something = type(config_stuff[cskeys[0]]['LI_ser'])
+    something_else = config_stuff[cskeys[0]]['LI_ser']
+    print(f'type of LI_ser = {something}')
+    print(f'LI_ser = {something_else}')
+    #pp.pprint(config_stuff)
+    out = open("other_stuff_from_val_file.json", "w")
+    json.dump(config_stuff, out, indent=4, ensure_ascii=False, allow_nan=True) 
+    out.close()
+
+    mgkeys = list(mode_and_gas_stuff.keys())
+    #pp.pprint(mode_and_gas_stuff[mgkeys[0]])
+    out = open("mode_and_gas_stuff_from_val_file.json", "w")
+    json.dump(mode_and_gas_stuff, out, indent=4, ensure_ascii=False, allow_nan=True) 
+    out.close()
+
+def get_span_gas_from_val_file(validation_text_filename, dump_json=False):
+    bigDictionary, config_stuff, mode_and_gas_stuff, flush_stuff = \
+        load_Val_File_into_dicts_v3(validation_text_filename)
+
+    k0 = list(mode_and_gas_stuff.keys())[0]
+    span_gas = mode_and_gas_stuff[k0]["SPOFF"]["Gas"]
+
+    if ( dump_json ):
+        dump_val_file_dicts_to_json(bigDictionary, config_stuff, mode_and_gas_stuff)
+
+    return span_gas
+
+@profile_function()
+def extra_range_checks(filename,validation_text_filename,span_gas=None,dump_json=False):
+    # span_gas can be passed in by the caller, e.g. once per report run, to avoid
+    # parsing the validation file again for every ALL file
+    # filename may also be what tokenize_ASVall_file() returns
+    ASVall_file = get_parsed_ASVall_file(filename)
+    filename = ASVall_file['filename']
+    df_flags = loadASVall_flags(ASVall_file)
+    df_stats = loadASVall_stats(ASVall_file)
+    df_data_all_modes = loadASVall_data_all_modes(ASVall_file)
     data_all_modes = []
     all_modes = ['ZPON','ZPOFF','ZPPCAL','SPON','SPOFF','SPPCAL',\
         'EPON','EPOFF','APON','APOFF']
     for m in all_modes:
-        data_all_modes.append(loadASVall_data_with_mode(filename,m))
+        data_all_modes.append(get_data_with_mode(df_data_all_modes,m))
     df_all_modes = pd.concat(data_all_modes,ignore_index=True)
 
     #initialize fault string
@@ -647,49 +647,12 @@ def extra_range_checks(filename,validation_text_filename):
     
 
     #### New stuff to avoid doing gaslist manually ####
-    bigDictionary, config_stuff, mode_and_gas_stuff, flush_stuff = \
-        load_Val_File_into_dicts_v3(validation_text_filename)
-
-    k0 = list(mode_and_gas_stuff.keys())[0]
-    span_gas = mode_and_gas_stuff[k0]["SPOFF"]["Gas"]
+    if ( span_gas is None ):
+        span_gas = get_span_gas_from_val_file(validation_text_filename,dump_json=dump_json)
 
     # bigDictionary, config_stuff, mode_and_gas_stuff, flush_stuff = \
     #     load_Val_File_into_dicts_v3(validation_text_filename,timestamp_mode='Unix epoch, days')
 
-    #### New stuff to fix "nan" issues found in data from 3CADC7565 ####
-    bigDictionary = val_fix_nan_in_dict(bigDictionary)
-    bDkeys = list(bigDictionary.keys())
-    typeflow_ave = type(bigDictionary[bDkeys[0]]['Flow_ave'][0])
-    flow_ave_example = bigDictionary[bDkeys[0]]['Flow_ave'][0]
-    print(f'type of flow_ave bigDictionary = {typeflow_ave}')
-    print(f'first entry of Flow_ave = {flow_ave_example}')
-    pp = pprint.PrettyPrinter(indent=4)
-    #pp.pprint(bigDictionary)
-    out = open("bigD_parsed_from_val_file.json", "w")
-    json.dump(bigDictionary, out, indent=4, ensure_ascii=False, allow_nan=True) 
-    out.close()
-
-    #pp.pprint(mode_and_gas_stuff)
-    out = open("mode_and_gas_parsed_from_val_file.json", "w")
-    json.dump(mode_and_gas_stuff, out, indent=4, ensure_ascii=False, allow_nan=True) 
-    out.close()
-
-    cskeys = list(config_stuff.keys())
-    something = type(config_stuff[cskeys[0]]['LI_ser'])
-    something_else = config_stuff[cskeys[0]]['LI_ser']
-    print(f'type of LI_ser = {something}')
-    print(f'LI_ser = {something_else}')
-    #pp.pprint(config_stuff)
-    out = open("other_stuff_from_val_file.json", "w")
-    json.dump(config_stuff, out, indent=4, ensure_ascii=False, allow_nan=True) 
-    out.close()
-
-    mgkeys = list(mode_and_gas_stuff.keys())
-    #pp.pprint(mode_and_gas_stuff[mgkeys[0]])
-    out = open("mode_and_gas_stuff_from_val_file.json", "w")
-    json.dump(mode_and_gas_stuff, out, indent=4, ensure_ascii=False, allow_nan=True) 
-    out.close()
-
     #add column for standard gas
     df_all_modes['CO2'] = df_all_modes['CO2'].astype(float)
     mask_sppcal = df_all_modes['Mode'].str.contains('SPPCAL')
@@ -723,118 +686,40 @@ def extra_range_checks(filename,validation_text_filename):
     return fault_str
 
 def calculate_xco2_from_data(data, zerocoeff, S0_tcorr, S1_tcorr):
-    
-    # CO2 calibration function constants (from Israel's email)
-    a1 = 0.3989974
-    a2 = 18.249359
-    a3 = 0.097101984
-    a4 = 1.8458913
-    n = ((a2 * a3) + (a1 * a4))
-    o = (a2 + a4)
-    q = (a2 - a4)
-    q_1 = (q ** 2)
-    r = ((a2 * a3) + (a1 * a4))
-    r_1 = (r ** 2)
-    D = 2 * (a2 - a4) * ((a1 * a4) - (a2 * a3))
-
-    # constants to compute X
-    b1 = 1.10158  # 'a
-    b2 = -0.00612178  # 'b
-    b3 = -0.266278  # 'c
-    b4 = 3.69895  # 'd
-    z = a1 + a3
-
-    p0 = 99  # po is std pressure, po = 99.0 kPa
-
-    Li_Raw_float = data.Li_Raw.astype(int)  # w - raw count
-    Li_ref_float = data.Li_ref.astype(int)  # w0 - raw count reference
-    Pres_float = data.Pres.astype(float)  # p1 - measured pressure
-    Temp_float = data.Temp.astype(float)  # T - temperature
-
-    w = Li_Raw_float
-    w0 = Li_ref_float
-    p1 = Pres_float
-    T = Temp_float
-    
-    #use averaged values
-    w_mean = w.mean()
-    w0_mean =w0.mean()
-    p1_mean = p1.mean()
-    T_mean = T.mean()
-
-    #Pascal, new alphaC to reflect "APOFF" dataset
-    alphaC = (1 - ((w_mean / w0_mean) * zerocoeff))
-    
-    # Pascal - valid, these are intermediate variables used to calculate alphaCprime, below
-
-    #Need to shift S0_tcorr index to match alphaC index for calculation
-    #idx_delta = S0_tcorr.index[0]-alphaC.index[0]
-    #S0_tcorr.index = [val-idx_delta for val in S0_tcorr.index]
-    print(f'double check: S0_tcorr = {S1_tcorr}, S0_tcorr = {S1_tcorr}')
-    alphaC_1 = alphaC * S0_tcorr
-    alphaC_2 = (alphaC ** 2) * S1_tcorr
-    # print("alphaC_2\n",alphaC_2)
-
-    # Pascal - valid, relates to eq. A-3 or eq. A-10 of LiCor 830/850 manual
-    alphaCprime = alphaC_1 + alphaC_2
-    print("alphaCprime\n",alphaCprime)
-
-    #df_bugs = pd.DataFrame([alphaC, BetaC, S0_tcorr, alphaCprime, alphaCprime-BetaC])
-    #df_bugs = df_bugs.transpose()
-
-    p = p1_mean / p0
-    pif = p > 1
-
-    if pif.any():
-        p = p1_mean / p0
-    else:
-        p = p0 / p1_mean
-
-    # Pascal - valid, relates to eq. A-11 of LiCor 830/850 manual, note b1:=a, b2:=b, b3:=c and b4:=d
-    #    ' compute some terms for the pressure correction function
-    A = (1 / (b1 * (p - 1)))
-    B = 1 / ((1 / (b2 + (b3 * p))) + b4)
-    X = 1 + (1 / (A + (B * ((1 / (z - alphaC)) - (1 / z)))))  # change whether alphaC or alphaCprime here
-    
-    # Pascal - valid, w.r.t g, relates to eq. A-13 or eq. A-11 of LiCor 830/850 manual
-    # g is the empirical correction function and is a function of absorptance and pressure
-
-    if pif.any():
-        g = 1 / X
-    else:
-        g = X
-
-    # Pascal - valid, w.r.t. eq. A-10 of LiCor 830/850 manual
-    #    'alphapc is the pressure corrected absorptance, alphaC'', and equal absorptance(absp) * correction (g)
-    alphapc = alphaCprime * g
-
-    #print(f'span2_temp = {span2_in}')
-    
-    #    'F is the calibration polynomial
-
-    # Pascal - invalid without stated assumption of psi(W) per eq. A-18, A-14 and A-16 in LiCor 830/850 manual
-    # if it is presumed that psi(W) is 1, then this should be valid, but that needs some kind of statement
-    numr = (n - o * alphapc) - np.sqrt(q_1 * (alphapc ** 2) + D * alphapc + r_1)
-    denom = 2 * (alphapc - a1 - a3)
-
-    # Pascal - invalid per eq. A-16 of LiCor 830/850 manual, where x should be alphapc/psi(W)
-    # if psi(W) is 1, then it is valid, but the psi(W) being assumed as 1 should be stated
-    F = numr / denom
-    #print(f'F_mean = {F.mean()}')
-    
-    # Pascal - invalid without stated assumption of psi(W) per eq. A-18, A-14 and A-16 in LiCor 830/850 manual
-    # if it is presumed that psi(W) is 1, then this should be valid, but that needs some kind of statement
-    xco2 = F * ((T_mean + 273.15))  # / (T0 + 273.15)) # added the bottom TO
-    #print(f'T_mean = {T.mean()}')
-    #print(f'xco2_mean = {xco2.mean()}')
+    # xCO2 of the averaged raw counts, reference counts, pressure and temperature of data
+    w_mean = data.Li_Raw.astype(int).mean()  # w - raw count
+    w0_mean = data.Li_ref.astype(int).mean()  # w0 - raw count reference
+    p1_mean = data.Pres.astype(float).mean()  # p1 - measured pressure
+    T_mean = data.Temp.astype(float).mean()  # T - temperature
+
+    #Pascal, new alphaC to reflect "APOFF" dataset, g is X when the pressure ratio is inverted
+    xco2 = calculate_xco2_kernel(w_mean, w0_mean, p1_mean, T_mean, zerocoeff, S0_tcorr, S1_tcorr,\
+        g_is_X_below_p0=True)
     return xco2
 # %%
 def postprocesslicorspan2_w_mode(filename_coeff, filename_data, span2_in, S1_lab_in, slope_in,\
     mode_for_recalc):
+    return postprocesslicorspan2_w_modes(filename_coeff, filename_data, span2_in, S1_lab_in,\
+        slope_in, [mode_for_recalc])[mode_for_recalc]
+
+@profile_function()
+def postprocesslicorspan2_w_modes(filename_coeff, filename_data, span2_in, S1_lab_in, slope_in,\
+    modes_for_recalc=('APOFF','EPOFF')):
+    # Same as postprocesslicorspan2_w_mode(), but for several modes at once. The ALL file is
+    # read once and the SPOFF temperature correction is shared by all modes in modes_for_recalc.
+    # Returns a dictionary of df_res by mode. filename_coeff and filename_data may also be
+    # what tokenize_ASVall_file() returns.
+
+    ASVall_file_data = get_parsed_ASVall_file(filename_data)
+    if ( filename_coeff is filename_data or filename_coeff == ASVall_file_data['filename'] ):
+        ASVall_file_coeff = ASVall_file_data
+    else:
+        ASVall_file_coeff = get_parsed_ASVall_file(filename_coeff)
 
-    coeff = loadASVall_coeff(filename_coeff)  #
+    coeff = loadASVall_coeff(ASVall_file_coeff)  #
     # print(coeff)
-    data_spoff = loadASVall_data_with_mode(filename_data,"SPOFF")  # Modified by Pascal to change dataset from APOFF to SPOFF
+    df_data_all_modes = loadASVall_data_all_modes(ASVall_file_data)
+    data_spoff = get_data_with_mode(df_data_all_modes,"SPOFF")  # Modified by Pascal to change dataset from APOFF to SPOFF
     # print(data)
 
     #span1 = loadASVall_data_with_mode(filename_data,"SPOFF")  # Modified by Pascal, but span1 should be the same
@@ -865,32 +750,6 @@ def postprocesslicorspan2_w_mode(filename_coeff, filename_data, span2_in, S1_lab
     p1_mean = p1.mean()
     T_mean = T.mean()
     
-    ######################## BEGIN - Constants which do not vary upon loaded dataset ######################
-    # CO2 calibration function constants (from Israel's email)
-    a1 = 0.3989974
-    a2 = 18.249359
-    a3 = 0.097101984
-    a4 = 1.8458913
-    n = ((a2 * a3) + (a1 * a4))
-    o = (a2 + a4)
-    q = (a2 - a4)
-    q_1 = (q ** 2)
-    r = ((a2 * a3) + (a1 * a4))
-    r_1 = (r ** 2)
-    D = 2 * (a2 - a4) * ((a1 * a4) - (a2 * a3))
-
-    # constants to compute X
-    b1 = 1.10158  # 'a
-    b2 = -0.00612178  # 'b
-    b3 = -0.266278  # 'c
-    b4 = 3.69895  # 'd
-    z = a1 + a3
-
-    T0 = 50
-    p0 = 99  # po is std pressure, po = 99.0 kPa
-    # p1 is the measured pressure
-    # P is the ratio of the std pressure and measured press whichever is > 1
-    ######################## END - Constants which do not vary upon loaded dataset #######################
 
     #    'innerTerm is alphaC
 
@@ -927,80 +786,79 @@ def postprocesslicorspan2_w_mode(filename_coeff, filename_data, span2_in, S1_lab
 
     # alphaCprime = ((alphaC * S0) + ((alphaC ** 2) * S1)) .astype(float)   #without coefficient temp correction
 
-    ################ Temperature adjustment done, use "APOFF" dataset to calculate the rest #####################
-    #data = loadASVall_data_with_mode(filename_data, "APOFF")
-    data = loadASVall_data_with_mode(filename_data, mode_for_recalc)
-
-    # Use temperature adjusted S0 and S1, S0_tcorr and S1_tcorr, to get xco2 using data
-    xco2 = calculate_xco2_from_data(data, zerocoeff, S0_tcorr, S1_tcorr)
+    # Get DRY ppm values from ALL file
+    df_dry_sync, df_dry = loadASVall_dry(ASVall_file_data)
 
-    # Do dry recalculation here
-    RH_T = data['RH_T'].astype(float).mean()
-    Pressure = data['Pres'].astype(float).mean()
-    RH_sample = data['RHperc'].astype(float).mean()
-    RH_span = data_spoff['RHperc'].astype(float).mean()
-    xco2_dry = dry_correction(xco2,RH_T,Pressure,RH_sample,RH_span)
+    # Added 3/29/2022
+    gaslist = get_gaslist()
 
-    # Get DRY ppm values from ALL file
-    df_dry_sync, df_dry = loadASVall_dry(filename_data)
-
-    #avg_830 = pd.Series(data.CO2.astype(float).mean())  # old, used wet data previously, 10/25/2021
-    #avg_830_recalc = pd.Series(xco2.mean())  # old, used temperature corrected values, 10/25/2021
-    avg_830_recalc = pd.Series(xco2_dry.mean())  # new, use dry and temperature corrected values, 10/25/2021
-    if ( mode_for_recalc == "APOFF" ):
-        avg_830 = pd.Series(df_dry['Atm_xCO2(dry)'].astype(float).mean())  # mean of one number is just the number
-    elif ( mode_for_recalc == "EPOFF" ): 
-        avg_830 = pd.Series(df_dry['SW_xCO2(dry)'].astype(float).mean())  # mean of one number is just the number
-    else:
-        avg_830 = pd.Series(np.NaN)
-        raise Exception('currently, only dry values exist for APOFF and EPOFF')
+    df_res_by_mode = {}
+    for mode_for_recalc in modes_for_recalc:
+        ################ Temperature adjustment done, use "APOFF" dataset to calculate the rest #####################
+        #data = loadASVall_data_with_mode(filename_data, "APOFF")
+        data = get_data_with_mode(df_data_all_modes, mode_for_recalc)
+
+        # Use temperature adjusted S0 and S1, S0_tcorr and S1_tcorr, to get xco2 using data
+        xco2 = calculate_xco2_from_data(data, zerocoeff, S0_tcorr, S1_tcorr)
+
+        # Do dry recalculation here
+        RH_T = data['RH_T'].astype(float).mean()
+        Pressure = data['Pres'].astype(float).mean()
+        RH_sample = data['RHperc'].astype(float).mean()
+        RH_span = data_spoff['RHperc'].astype(float).mean()
+        xco2_dry = dry_correction(xco2,RH_T,Pressure,RH_sample,RH_span)
+
+        #avg_830 = pd.Series(data.CO2.astype(float).mean())  # old, used wet data previously, 10/25/2021
+        #avg_830_recalc = pd.Series(xco2.mean())  # old, used temperature corrected values, 10/25/2021
+        avg_830_recalc = pd.Series(xco2_dry.mean())  # new, use dry and temperature corrected values, 10/25/2021
+        if ( mode_for_recalc == "APOFF" ):
+            avg_830 = pd.Series(df_dry['Atm_xCO2(dry)'].astype(float).mean())  # mean of one number is just the number
+        elif ( mode_for_recalc == "EPOFF" ): 
+            avg_830 = pd.Series(df_dry['SW_xCO2(dry)'].astype(float).mean())  # mean of one number is just the number
+        else:
+            avg_830 = pd.Series(np.NaN)
+            raise Exception('currently, only dry values exist for APOFF and EPOFF')
 
-    df_res = pd.concat([avg_830, avg_830_recalc], axis=1)
+        df_res = pd.concat([avg_830, avg_830_recalc], axis=1)
       
-    df_res['gas_standard']=np.nan
+        df_res['gas_standard']=np.nan
 
-    #Pascal, 8/13/2021, choose which gas list to use based upon time string from filename,
-    #will need to update this to a more fully featured lookup later
-    # time_str=re.search(r'\d{8}_\d{6}\.txt',filename_data)[0]  #grab 8 digits, underscore and 6 digits
-    # year_month_day_str = re.split(r'_',time_str)[0]
-    # num_yr_mo_dd = float(year_month_day_str)
+        #Pascal, 8/13/2021, choose which gas list to use based upon time string from filename,
+        #will need to update this to a more fully featured lookup later
+        # time_str=re.search(r'\d{8}_\d{6}\.txt',filename_data)[0]  #grab 8 digits, underscore and 6 digits
+        # year_month_day_str = re.split(r'_',time_str)[0]
+        # num_yr_mo_dd = float(year_month_day_str)
     
-    # if ( (20210801 - num_yr_mo_dd) > 0 ):  # if it preceded Aug 1 2021, then used older gaslist
-    #     gaslist=[0, 104.25, 349.79, 506.16, 732.64, 999.51, 1487.06, 1994.25] #552.9 before 4/27
-    # else:  # use newer gaslist if after Aug 1 2021
-    #     gaslist=[0, 104.25, 349.79, 494.72, 732.64, 999.51, 1487.06, 1961.39] #update in early Aug 2021
-
-    # if ( (20210801 - num_yr_mo_dd) > 0 ):  # if it preceded Aug 1 2021, then used older gaslists
-    #     if ((20210427 - num_yr_mo_dd) > 0):
-    #         gaslist=[0, 104.25, 349.79, 552.9, 732.64, 999.51, 1487.06, 1994.25] #552.9 before 4/27
-    #     else:
-    #         gaslist=[0, 104.25, 349.79, 506.16, 732.64, 999.51, 1487.06, 1994.25]
-    # else:  # use newer gaslist if after Aug 1 2021
-    #     gaslist=[0, 104.25, 349.79, 494.72, 732.64, 999.51, 1487.06, 1961.39] #update in early Aug 2021
-
-    # Added 3/29/2022
-    gaslist = get_gaslist()
-
-    #add column for standard gas
-    for i in range(len(df_res)):
-        for gas in gaslist:
-            minimum=abs(df_res.iloc[:,1][i]-gas)
-            #print(minimum)
-            if minimum<50:
-                df_res['gas_standard'][i]=gas
+        # if ( (20210801 - num_yr_mo_dd) > 0 ):  # if it preceded Aug 1 2021, then used older gaslist
+        #     gaslist=[0, 104.25, 349.79, 506.16, 732.64, 999.51, 1487.06, 1994.25] #552.9 before 4/27
+        # else:  # use newer gaslist if after Aug 1 2021
+        #     gaslist=[0, 104.25, 349.79, 494.72, 732.64, 999.51, 1487.06, 1961.39] #update in early Aug 2021
+
+        # if ( (20210801 - num_yr_mo_dd) > 0 ):  # if it preceded Aug 1 2021, then used older gaslists
+        #     if ((20210427 - num_yr_mo_dd) > 0):
+        #         gaslist=[0, 104.25, 349.79, 552.9, 732.64, 999.51, 1487.06, 1994.25] #552.9 before 4/27
+        #     else:
+        #         gaslist=[0, 104.25, 349.79, 506.16, 732.64, 999.51, 1487.06, 1994.25]
+        # else:  # use newer gaslist if after Aug 1 2021
+        #     gaslist=[0, 104.25, 349.79, 494.72, 732.64, 999.51, 1487.06, 1961.39] #update in early Aug 2021
+
+        #add column for standard gas
+        df_res['gas_standard'] = match_gas_standards(df_res.iloc[:,1],gaslist,tolerance=50)[0]
             
     
     
-    #df_res[ = data.CO2.astype(float) - xco2
+        #df_res[ = data.CO2.astype(float) - xco2
     
-    df_res['std_830_res'] = df_res.iloc[:,0]-df_res.gas_standard
-    df_res['std_830recalc_res'] = df_res.iloc[:,1]-df_res.gas_standard
+        df_res['std_830_res'] = df_res.iloc[:,0]-df_res.gas_standard
+        df_res['std_830recalc_res'] = df_res.iloc[:,1]-df_res.gas_standard
+
+        # print(avg_830.mean())
+        # print(avg_830_recalc.mean())
+        # print(df_res['std_830recalc_res'].mean())
 
-    # print(avg_830.mean())
-    # print(avg_830_recalc.mean())
-    # print(df_res['std_830recalc_res'].mean())
+        df_res_by_mode[mode_for_recalc] = df_res
 
-    return df_res #, df_bugs
+    return df_res_by_mode #, df_bugs
 
 # # %%
 
@@ -1018,10 +876,7 @@ def get_summary_stats_df_by_group(df_830_830eq_EPOFF,df_830_830eq_APOFF):
     #gas_standard_groups = [(0,750),(0,2),(2,300),(300,775),(775,1075),(1075,2575)]
 
     # read in json file from config folder to get the gas standard tag ranges for the summary
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    json_file = open(PROJECT_ROOT + '/code/post_processing/config/summary_gas_standard_tag_ranges.json','r',encoding='utf-8')
-    summary_gas_standard_tag_ranges = json.load(json_file)
-    json_file.close()
+    summary_gas_standard_tag_ranges = get_summary_gas_standard_tag_ranges()
     num_ranges = len(summary_gas_standard_tag_ranges)
 
     list_of_df_APOFF = []
@@ -1092,6 +947,10 @@ def get_summary_stats_df_by_group(df_830_830eq_EPOFF,df_830_830eq_APOFF):
         df_EPOFF_not_t_corr_summary_stats, df_APOFF_not_t_corr_summary_stats
 
 def plot_and_produce_report(sn,path_to_data,validation_text_filename):
+    # matplotlib is imported here and not at the top, so that the csv extraction
+    # and the range checks do not pay for it
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm   #plot one color for each run
     #%%
     if sys.platform.startswith('win'):
         dir_sep = '\\'
@@ -1138,24 +997,6 @@ def plot_and_produce_report(sn,path_to_data,validation_text_filename):
     # slope_cal_2_all = pd.read_csv('./post_processing/config/slope_cal_2_csv_7_6.csv',index_col=0)
     # slope_cal_1_all = pd.read_csv('./post_processing/config/slope_cal_1_csv_all_8_12.csv',index_col=0)
     # slope_cal_2_all = pd.read_csv('./post_processing/config/slope_cal_2_csv_all_8_12.csv',index_col=0)
-    slope_cal_1_all = pd.read_csv('./post_processing/config/slope_cal_1_csv_all_8_25.csv',index_col=0)
-    slope_cal_2_all = pd.read_csv('./post_processing/config/slope_cal_2_csv_all_8_25.csv',index_col=0)
-
-
-    # pd.set_option('max_columns',None)
-    # print('Data from slope_cal_1_all is like...')
-    # print(slope_cal_1_all.describe(include='all'))
-    # print('Headers from slope_cal_1_all...')
-    # print(slope_cal_1_all.head())
-    # print('Data from slope_cal_2_all is like...')
-    # print(slope_cal_2_all.describe(include='all'))
-    # print('Headers from slope_cal_2_all...')
-    # print(slope_cal_2_all.head())
-    # pd.reset_option('max_columns')  # Pascal, added to check on pickle files
-
-    #replace old pickle data with the latest from csv
-    #del slope_cal_1, slope_cal_2
-    slope_cal_1 = slope_cal_1_all; slope_cal_2 = slope_cal_2_all
 
     # SN for 1004 is 5272, licor SN for 1005 is 5030
 
@@ -1168,48 +1009,9 @@ def plot_and_produce_report(sn,path_to_data,validation_text_filename):
     '3CD6D1DD5':'cga-5376','3CD94292C':'cga-5352','1011':'cga-5180','ASVTEST12':'cga-5081'}
     licorsernum = ASVCO2sn2LICORsn[sn]
 
-    #choose 1st or 2nd cal for slope
-    # calnum = slope_cal_1  # older choice, dates back to code from Sophie on May 17th, 2021
-    calnum = slope_cal_2
-
-    mask_ota = (calnum['Serialnum'] == licorsernum) & \
-            (calnum.index == 'co2kspan2')  
-
-    oventesta_licor_cal2_span2 = calnum[mask_ota]  
-    print("oventesta_licor_cal2_span2 = ",oventesta_licor_cal2_span2)
-    # load span2 coefficient from 20 deg 2nd cal
-    # with open('span2_20deg_cal2_temp.pickle', 'rb') as f:  
-    #     span2_20deg_cal2_temp = pickle.load(f)
-
-    # Instead of using pickle file, use csv file with LI-COR serial numbers 5081, 5177 and 5269
-    # span2_20deg_cal2_temp = pd.read_csv('./post_processing/config/span2_20deg_cal2_temp_csv_all_6_10.csv')
-    #
-    # Changed on 8/5/2021 per Noah's direction, use averaged co2kspan2, etc. see email from Sophie on 7/28/2021
-    # span2_20deg_cal2_temp = pd.read_csv('./post_processing/config/tempavg_20deg_span2_cal1.csv') 
-
-    # Changed on 8/12/2021 for temporary data post processing on 3CA8A2535
-    # span2_20deg_cal2_temp = pd.read_csv('./post_processing/config/twenty_degree_avg_no_T_Ramp_down_07_06.csv')
-
-    # Changed on 8/13/2021 for larger dataset and long term processing
-    # span2_20deg_cal2_temp = pd.read_csv('./post_processing/config/span2_20deg_cal2_temp_avg_csv_all_8_12.csv')
-    # span2_20deg_cal2_temp = pd.read_csv('./post_processing/config/span2_20deg_cal2_temp_avg_csv_all_8_16.csv')
-
-    span2_20deg_cal2_temp = pd.read_csv('./post_processing/config/span2_20deg_cal2_temp_avg_csv_all_8_25.csv') 
-
-    print(f'licorsernum = {licorsernum}')
-    mask_sp2 = span2_20deg_cal2_temp.serialnum == licorsernum  
-    span2_20deg_cal2_temp_licor = span2_20deg_cal2_temp[mask_sp2]
-    print(f'co2kspan2 = {span2_20deg_cal2_temp_licor.co2kspan2}')
-    # set span2 (S1_lab) coefficient to 20 deg span 2 cal 2
-    # Correct Sc1(lab) for the temperature change from the temperature at which Sc1(lab) was calibrated (linear eq based on oven testA results) to get Sc1(Tcorr).
-    S1_lab = float(span2_20deg_cal2_temp_licor.co2kspan2)#-0.00591593#0.005772628#float(span2_20deg_cal2_temp_licor.co2kspan2)
-
-    # set actual span2 temperature with setpoint 20 deg
-    span2_temp = float(span2_20deg_cal2_temp_licor.celltemp.values)#27.0689#22.13#float(span2_20deg_cal2_temp_licor.celltemp.values)
-
-    # set slope of licor from oven test a results
-    print(f'slope = {oventesta_licor_cal2_span2.slope.values}')
-    slope_licor = float(oventesta_licor_cal2_span2.slope.values)#0#-0.00260834#float(oventesta_licor_cal2_span2.slope.values)
+    # S1_lab, span2_temp and slope_licor of the 2nd cal, see plot_and_produce_report_w_extra_checks()
+    S1_lab, span2_temp, slope_licor = get_span2_calibration(licorsernum,\
+        get_date_of_validation_file(validation_text_filename),calnum=2)
 
     # double check values
     print(f'double check: S1_lab = {S1_lab}, span2_temp = {span2_temp}, slope_licor = {slope_licor}')
@@ -1251,10 +1053,10 @@ def plot_and_produce_report(sn,path_to_data,validation_text_filename):
 
             # Pascal, only process the file if COEFF was found in the file
             if COEFF_found_in_file:
-                res_from_each_file_APOFF = postprocesslicorspan2_w_mode(filename_coeff, filename_data, \
-                    span2_temp, S1_lab, slope_licor, "APOFF")
-                res_from_each_file_EPOFF = postprocesslicorspan2_w_mode(filename_coeff, filename_data, \
-                    span2_temp, S1_lab, slope_licor, "EPOFF")
+                res_from_each_file = postprocesslicorspan2_w_modes(filename_coeff, filename_data, \
+                    span2_temp, S1_lab, slope_licor, ["APOFF","EPOFF"])
+                res_from_each_file_APOFF = res_from_each_file["APOFF"]
+                res_from_each_file_EPOFF = res_from_each_file["EPOFF"]
                 #print (i, res_from_each_file)
                 data_APOFF.append(res_from_each_file_APOFF)
                 data_EPOFF.append(res_from_each_file_EPOFF)
@@ -1544,7 +1346,16 @@ def plot_and_produce_report(sn,path_to_data,validation_text_filename):
     generate_bigger_validation_report(reports_path,sn,date_range,figure_filenames_and_sizes,\
         tuple_of_df_4_tables,validation_text_filename)
 
-def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filename):
+def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filename,\
+    use_cache=True,check_hash=False,max_cache_bytes=512*1024*1024,dump_json=False,\
+    figure_workers=None):
+    # per file results are kept in reports/.cache unless use_cache is False, see parse_cache.py
+    # dump_json=True writes the debug json files of the parsed validation file
+    # figure_workers is the number of processes drawing the figures, 1 draws them here,
+    # None uses one per figure up to the number of CPUs, or 1 in a worker process
+    # scipy is imported here and not at the top, so that the csv extraction and the
+    # range checks do not pay for it
+    from scipy.stats import t
     #%%
     if sys.platform.startswith('win'):
         dir_sep = '\\'
@@ -1562,13 +1373,6 @@ def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filen
     path_to_ALL = path_to_data + dir_sep + 'ALL'
     
 
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    slope_cal_1_all = pd.read_csv(PROJECT_ROOT + '/code/post_processing/config/slope_cal_1_csv_all_8_25.csv',index_col=0)
-    slope_cal_2_all = pd.read_csv(PROJECT_ROOT + '/code/post_processing/config/slope_cal_2_csv_all_8_25.csv',index_col=0)
-
-
-    slope_cal_1 = slope_cal_1_all; slope_cal_2 = slope_cal_2_all
-
     # SN for 1004 is 5272, licor SN for 1005 is 5030
 
     #choose licor to get span 2 slope*********************
@@ -1584,48 +1388,23 @@ def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filen
     bigDictionary, config_stuff, mode_and_gas_stuff, flush_stuff = \
         load_Val_File_into_dicts_v3(validation_text_filename)
 
+    # parsed once here for the whole report instead of once per ALL file in extra_range_checks()
+    k0 = list(mode_and_gas_stuff.keys())[0]
+    span_gas = mode_and_gas_stuff[k0]["SPOFF"]["Gas"]
+    if ( dump_json ):
+        dump_val_file_dicts_to_json(bigDictionary, config_stuff, mode_and_gas_stuff)
+
     # convert licorsernum with CGA-XXXX to lowercase cga-XXXX, where XXXX represents digits
     k0 = list(config_stuff.keys())[0]
-    licorsernum_upper = config_stuff[k0]["LI_ser"]
-    m = re.match(r'\s*(\w+)-(\d+)',licorsernum_upper)  
-    if ( m and len(m.groups()) == 2 ):
-        letters = m.groups()[0]
-        numbers = m.groups()[1]
-        # need to swap from uppercase to lower case for csv file lookup
-        if ( letters.isupper() ):  
-            letters = letters.lower()
-        licorsernum = letters + '-' + numbers
-    else:
-        raise Exception(f'Unexpected serialnumber found {licorsernum_upper}')
-
-    #choose 1st or 2nd cal for slope
-    # calnum = slope_cal_1  # older choice, dates back to code from Sophie on May 17th, 2021
-    calnum = slope_cal_2
-
-    mask_ota = (calnum['Serialnum'] == licorsernum) & \
-            (calnum.index == 'co2kspan2')  
-
-    oventesta_licor_cal2_span2 = calnum[mask_ota]  
-    print("oventesta_licor_cal2_span2 = ",oventesta_licor_cal2_span2)
-    
-    # load span2 coefficient from 20 deg 2nd cal    
-    span2_20deg_cal2_temp = pd.read_csv(PROJECT_ROOT + '/code/post_processing/config/span2_20deg_cal2_temp_avg_csv_all_8_25.csv')  
-
+    licorsernum = normalize_licor_serial(config_stuff[k0]["LI_ser"])
     print(f'licorsernum = {licorsernum}')
-    mask_sp2 = span2_20deg_cal2_temp.serialnum == licorsernum  
-    span2_20deg_cal2_temp_licor = span2_20deg_cal2_temp[mask_sp2]
-    print(f'co2kspan2 = {span2_20deg_cal2_temp_licor.co2kspan2}')
-    
-    # set span2 (S1_lab) coefficient to 20 deg span 2 cal 2
-    # Correct Sc1(lab) for the temperature change from the temperature at which Sc1(lab) was calibrated (linear eq based on oven testA results) to get Sc1(Tcorr).
-    S1_lab = float(span2_20deg_cal2_temp_licor.co2kspan2)#-0.00591593#0.005772628#float(span2_20deg_cal2_temp_licor.co2kspan2)
-
-    # set actual span2 temperature with setpoint 20 deg
-    span2_temp = float(span2_20deg_cal2_temp_licor.celltemp.values)#27.0689#22.13#float(span2_20deg_cal2_temp_licor.celltemp.values)
 
-    # set slope of licor from oven test a results
-    print(f'slope = {oventesta_licor_cal2_span2.slope.values}')
-    slope_licor = float(oventesta_licor_cal2_span2.slope.values)#0#-0.00260834#float(oventesta_licor_cal2_span2.slope.values)
+    # S1_lab is the span2 coefficient of the 20 deg span 2 cal 2 and span2_temp its actual
+    # temperature with setpoint 20 deg, slope_licor is the slope from the oven test a results
+    # of the 2nd cal, from the calibration tables valid on the date of the validation file
+    # Correct Sc1(lab) for the temperature change from the temperature at which Sc1(lab) was calibrated (linear eq based on oven testA results) to get Sc1(Tcorr).
+    S1_lab, span2_temp, slope_licor = get_span2_calibration(licorsernum,\
+        get_date_of_validation_file(validation_text_filename),calnum=2)
 
     # double check values
     print(f'double check: S1_lab = {S1_lab}, span2_temp = {span2_temp}, slope_licor = {slope_licor}')
@@ -1660,38 +1439,63 @@ def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filen
 
     fault_text = ''  # new feature added 9/21/2021
     complete_filenames = []  # list of filenames that are actually complete
-    for i in range(len(filenames)):
-        if i > 0:
-            filename_data = filenames[i]
-            filename_coeff = filenames[i] #when data and coeff wasn't lined up, used filenames[i-1]
-            
-            # Pascal, bypass files without coefficients
-            COEFF_DRY_FLAGS_found_in_file=False
-            with open(filename_coeff) as f:
-                file_text = f.read()
-                if (('COEFF' in file_text) and \
-                    ('DRY' in file_text) and \
-                    ('FLAGS' in file_text)):
-                    COEFF_DRY_FLAGS_found_in_file =True
-            f.close()
-            del f,file_text
 
-            # Pascal, only process the file if COEFF was found in the file
-            print(f'COEFF_DRY_FLAGS_found_in_file = {COEFF_DRY_FLAGS_found_in_file}')
-            if COEFF_DRY_FLAGS_found_in_file:
-                complete_filenames.append(filenames[i])  # it's complete, add it to the list
-                res_from_each_file_APOFF = postprocesslicorspan2_w_mode(filename_coeff, filename_data, \
-                    span2_temp, S1_lab, slope_licor, "APOFF")
-                res_from_each_file_EPOFF = postprocesslicorspan2_w_mode(filename_coeff, filename_data, \
-                    span2_temp, S1_lab, slope_licor, "EPOFF")
-                #print (i, res_from_each_file)
-                #print(f'filename = {filenames[i]}')
-                fault_text += extra_range_checks(filenames[i],\
-                    validation_text_filename)  # new feature added 9/21/2021
-                #print(f'fault_text = {fault_text}')
-                data_APOFF.append(res_from_each_file_APOFF)
-                data_EPOFF.append(res_from_each_file_EPOFF)
+    # results also depend on the span 2 config and on the validation file, key on those too
+    cache_path = reports_path + dir_sep + '.cache'
+    cache_tag = 'plot_and_produce_report_w_extra_checks'
+    val_file_stat = os.stat(validation_text_filename)
+    cache_extra_key = (span2_temp, S1_lab, slope_licor, os.path.abspath(validation_text_filename),\
+        val_file_stat.st_size, val_file_stat.st_mtime_ns)
+    with profile_stage('report: ALL files') as ALL_files_stage:
+        for i in range(len(filenames)):
+            if i > 0:
+                filename_data = filenames[i]
+                filename_coeff = filenames[i] #when data and coeff wasn't lined up, used filenames[i-1]
+            
+                # only complete files are cached, a file found in the cache is not read at all
+                cached_result = None
+                if ( use_cache ):
+                    cached_result = load_from_cache(cache_path,filenames[i],cache_tag,\
+                        extra_key=cache_extra_key,check_hash=check_hash)
+
+                # Pascal, bypass files without coefficients
+                # read once, the same lines are used for the checks and recalculations below
+                ASVall_file = None
+                if ( cached_result is not None ):
+                    COEFF_DRY_FLAGS_found_in_file = True
+                else:
+                    ASVall_file = tokenize_ASVall_file(filename_coeff)
+                    COEFF_DRY_FLAGS_found_in_file = ( len(ASVall_file['COEFF']) > 0 and \
+                        len(ASVall_file['DRY']) > 0 and len(ASVall_file['FLAGS']) > 0 )
+
+                # Pascal, only process the file if COEFF was found in the file
+                print(f'COEFF_DRY_FLAGS_found_in_file = {COEFF_DRY_FLAGS_found_in_file}')
+                if COEFF_DRY_FLAGS_found_in_file:
+                    complete_filenames.append(filenames[i])  # it's complete, add it to the list
+                    if ( cached_result is not None ):
+                        res_from_each_file_APOFF, res_from_each_file_EPOFF, file_fault_text = \
+                            cached_result
+                    else:
+                        res_from_each_file = postprocesslicorspan2_w_modes(ASVall_file, ASVall_file, \
+                            span2_temp, S1_lab, slope_licor, ["APOFF","EPOFF"])
+                        res_from_each_file_APOFF = res_from_each_file["APOFF"]
+                        res_from_each_file_EPOFF = res_from_each_file["EPOFF"]
+                        #print (i, res_from_each_file)
+                        #print(f'filename = {filenames[i]}')
+                        file_fault_text = extra_range_checks(ASVall_file,\
+                            validation_text_filename,span_gas=span_gas)  # new feature added 9/21/2021
+                        if ( use_cache ):
+                            save_to_cache(cache_path,filenames[i],cache_tag,\
+                                (res_from_each_file_APOFF,res_from_each_file_EPOFF,file_fault_text),\
+                                extra_key=cache_extra_key,check_hash=check_hash)
+                    fault_text += file_fault_text
+                    #print(f'fault_text = {fault_text}')
+                    data_APOFF.append(res_from_each_file_APOFF)
+                    data_EPOFF.append(res_from_each_file_EPOFF)
                 
+        if ( use_cache ):
+            evict_cache(cache_path,max_cache_bytes)
+        ALL_files_stage['rows'] = len(complete_filenames)
     print(fault_text)
 
     #Pascal, needed to rewrite for different file types in different folders
@@ -1799,223 +1603,50 @@ def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filen
     print(df_EPOFF_group_stats)
     pd.reset_option('max_columns')
 
-    ############################## Plotting for APOFF ##############################
-    fig1 = plt.figure(1)
-    #ax11 = plt.gca()
-    l1=plt.scatter(df_830_830eq_APOFF.gas_standard, df_830_830eq_APOFF.std_830_res)
-    l2=plt.scatter(df_830_830eq_APOFF.gas_standard, df_830_830eq_APOFF.std_830recalc_res)
-    
-    # ax11.scatter(df_830_830eq_APOFF.gas_standard, df_830_830eq_APOFF.std_830_res,\
-    #     label='Measured CO2 - standard CO2, ppm')
-    # ax11.scatter(df_830_830eq_APOFF.gas_standard, df_830_830eq_APOFF.std_830recalc_res,\
-    #     label='Recalculated CO2 - standard CO2, ppm')
-    
-    plt.legend([l1,l2],['Measured CO2 - standard CO2, ppm','Recalculated CO2 - standard CO2, ppm'])  # Pascal, changed legend
-    # plt.grid(b=True,which='major',axis='both')  # Pascal, added grid
-    # plt.ylabel('Avg CO2 residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel 
-    # plt.xlabel('CO2 gas standard') 
-    # plt.title('APOFF ' + sn + ' ' + date_range[0][0:8])
-
-    #fig1.legend(loc='upper left')  # Pascal, changed legend
-    plt.grid(b=True,which='major',axis='both')  # Pascal, added grid
-    plt.ylabel('Avg CO2 residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel 
-    plt.xlabel('CO2 gas standard') 
-    plt.title('APOFF ' + sn + ' ' + date_range[0][0:8])
-
-    #save plot as...
-    saveplotname_recalc_vs_no_recalc_APOFF = figs_path + dir_sep + \
-        'APOFF_' + sn + '_' + date_range[0][0:8] + '_T_recalc_vs_No_T_recalc.png'
-
-    #plt.savefig(saveplotname_recalc_vs_no_recalc_APOFF)  # Pascal, changed to png file
-    fig1.savefig(saveplotname_recalc_vs_no_recalc_APOFF)  # Pascal, changed to png file
-
-    ############################## Plotting for EPOFF ##############################
-    fig2 = plt.figure(2)
-    #ax21 = plt.gca()
-    
-    l3=plt.scatter(df_830_830eq_EPOFF.gas_standard, df_830_830eq_EPOFF.std_830_res)
-    l4=plt.scatter(df_830_830eq_EPOFF.gas_standard, df_830_830eq_EPOFF.std_830recalc_res)
-
-    #plt.legend([l1,l2],['Meas - std','Recalc-std'])
-    plt.legend([l3,l4],['Measured CO2 - standard CO2, ppm','Recalculated CO2 - standard CO2, ppm'])  # Pascal, changed legend
-    plt.grid(b=True,which='major',axis='both')  # Pascal, added grid
-    #plt.ylabel('Avg CO2 res (830-std)') 
-    plt.ylabel('Avg CO2 residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel 
-    plt.xlabel('CO2 gas standard') 
-    #plt.savefig('830_830eq_res_all.jpg')
-    plt.title('EPOFF ' + sn + ' ' + date_range[0][0:8])
-
-    #save plot as...
-    saveplotname_recalc_vs_no_recalc_EPOFF = figs_path + dir_sep + \
-        'EPOFF_' + sn + '_' + date_range[0][0:8] + '_T_recalc_vs_No_T_recalc.png'
-    #plt.savefig(saveplotname_recalc_vs_no_recalc_EPOFF)  # Pascal, changed to png file
-    fig2.savefig(saveplotname_recalc_vs_no_recalc_EPOFF)  # Pascal, changed to png file
-
-    #### close figures ####
-    plt.close()
-    plt.close()
-
-    ###################### Dataframes for APOFF ################################
-    df_830_830eq_avg_APOFF = df_830_830eq_APOFF.groupby('gas_standard').std_830recalc_res.agg(['mean','std'])
-    df_830_830eq_avg_APOFF = df_830_830eq_avg_APOFF.reset_index()
-    df_830_830eq_avg_APOFF = df_830_830eq_avg_APOFF.rename(columns={'std':'stdev'})
-
-    ###################### Dataframes for EPOFF ################################
-    df_830_830eq_avg_EPOFF = df_830_830eq_EPOFF.groupby('gas_standard').std_830recalc_res.agg(['mean','std'])
-    df_830_830eq_avg_EPOFF = df_830_830eq_avg_EPOFF.reset_index()
-    df_830_830eq_avg_EPOFF = df_830_830eq_avg_EPOFF.rename(columns={'std':'stdev'})
-
-    # To Do - put df_830_830eq_avg into table for reportlab
-    # print('Data from df_830_830eq_avg is like...')
-    # print(df_830_830eq_avg_EPOFF.describe())
-    # print(df_830_830eq_avg_EPOFF.head())
-    pd.set_option('max_columns',None)
-    print('Data from df_830_830eq_APOFF is like...')
-    print(df_830_830eq_APOFF.describe())
-    print(df_830_830eq_APOFF.head())
-
-    print('Data from df_830_830eq_EPOFF is like...')
-    print(df_830_830eq_EPOFF.describe())
-    print(df_830_830eq_EPOFF.head())
-    pd.reset_option('max_columns')
-
-    ##################### Save Dataframes as csv in the csv folder ##################
-    savecsvname_APOFF = csv_path + dir_sep \
-        + "APOFF_" + sn + '_' + date_range[0][0:8] + '.csv'
-    savecsvname_EPOFF = csv_path + dir_sep \
-        + "EPOFF_" + sn + '_' + date_range[0][0:8] + '.csv'
-    df_830_830eq_APOFF.to_csv(savecsvname_APOFF,index=False)
-    df_830_830eq_EPOFF.to_csv(savecsvname_EPOFF,index=False)
-
-    ##################### More plots for APOFF ######################################
-
-    lengthofrun = len(df_830_830eq_APOFF)
-    numberofruns = round(lengthofrun/8)
-
-    #number of runs
-    n = numberofruns
-    print(f'lengthofrun = {lengthofrun}')
-    print(f'numberofruns = {numberofruns}')
-
-    #save plot name as *******************
-    #change this, changed by Pascal, 6/22/2021
-    saveplotname_APOFF_T_recalc = figs_path + dir_sep \
-        + "APOFF_" + sn + '_' + date_range[0][0:8] + '_T_recalc.png' 
-    fig_title_APOFF_T_recalc =  "APOFF_" + sn + '_' + date_range[0][0:8] + '_T_recalc'
-
-    #create colorbar
-    colors = cm.cool(np.linspace(0,1,n))
-
-    #make plot with one color for each run
-    fig3, (ax31,ax32) = plt.subplots(1,2)
-
-    for run in range(0,n):
-        #print(run)
-
-        startind=run*8
-        endind=startind+8
-
-        p=ax31.scatter(df_830_830eq_APOFF.gas_standard.iloc[startind:endind],df_830_830eq_APOFF.std_830recalc_res.iloc[startind:endind], color=colors[run])
-        ax32.scatter(df_830_830eq_APOFF.gas_standard.iloc[startind:endind],df_830_830eq_APOFF.std_830recalc_res.iloc[startind:endind], color=colors[run])
-        maxy=max(df_830_830eq_APOFF.std_830recalc_res)+3
-
-        labels = list(range(1,n+1))
-
-
-    ax31.set_title(fig_title_APOFF_T_recalc) 
-    ax31.set_xlabel('Standard Gas Concentration (ppm)')
-    #ax31.set_ylabel('Residual (ppm)')
-    ax31.set_ylabel('Residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
-    ax31.set_xlim([-100,2700])
-    ax31.set_ylim([-maxy,maxy])
-    ax31.axhline(y=0,color='k', linestyle='--')
-
-    #plt.grid(b=True,which='major',axis='both')  # Pascal, added grid
-
-    #ax32.legend([1,2,3,4,5], loc='lower left')
-    ax32.legend(labels, bbox_to_anchor=(1.9, 1), loc="upper right",framealpha=0, title='# of run', fontsize="small")
-
-    ax32.set_title('Zoomed <1000 ppm')
-    ax32.set_xlabel('Std Gas Conc (ppm)')
-    #ax32.set_ylabel('Residual (ppm)')
-    ax32.set_ylabel('Residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
-    ax32.set_xlim([-100,1100])
-    ax32.set_ylim([-5,5])
-    ax32.axhline(y=0,color='k', linestyle='--')
-
-    ax31.grid(b=True,which='major',axis='both')  # Pascal, added grid
-    ax32.grid(b=True,which='major',axis='both')  # Pascal, added grid
-
-    fig3.set_size_inches(10,6) # Pascal, added to expand size
-
-    ##################### More plots for EPOFF ######################################
-
-    lengthofrun = len(df_830_830eq_EPOFF)
-    numberofruns = round(lengthofrun/8)
-
-    #number of runs
-    n = numberofruns
-
-    #save plot name as *******************
-    #change this, changed by Pascal, 6/22/2021
-    saveplotname_EPOFF_T_recalc = figs_path + dir_sep \
-        + "EPOFF_" + sn + '_' + date_range[0][0:8] + '_T_recalc.png' 
-    fig_title_EPOFF_T_recalc =  "EPOFF_" + sn + '_' + date_range[0][0:8] + '_T_recalc'
-
-    #create colorbar
-    colors = cm.cool(np.linspace(0,1,n))
-
-    #make plot with one color for each run
-    fig4, (ax41,ax42) = plt.subplots(1,2)
-
-    for run in range(0,n):
-        #print(run)
-
-        startind=run*8
-        endind=startind+8
-
-        p=ax41.scatter(df_830_830eq_EPOFF.gas_standard.iloc[startind:endind],df_830_830eq_EPOFF.std_830recalc_res.iloc[startind:endind], color=colors[run])
-        ax42.scatter(df_830_830eq_EPOFF.gas_standard.iloc[startind:endind],df_830_830eq_EPOFF.std_830recalc_res.iloc[startind:endind], color=colors[run])
-        maxy=max(df_830_830eq_EPOFF.std_830recalc_res)+3
-
-        labels = list(range(1,n+1))
-
-
-    ax41.set_title(fig_title_EPOFF_T_recalc) 
-    ax41.set_xlabel('Standard Gas Concentration (ppm)')
-    ax41.set_ylabel('Residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
-    ax41.set_xlim([-100,2700])
-    ax41.set_ylim([-maxy,maxy])
-    ax41.axhline(y=0,color='k', linestyle='--')
-
-    #plt.grid(b=True,which='major',axis='both')  # Pascal, added grid
-
-    #ax2.legend([1,2,3,4,5], loc='lower left')
-    ax42.legend(labels, bbox_to_anchor=(1.9, 1), loc="upper right",framealpha=0, title='# of run', fontsize="small")
-
-    ax42.set_title('Zoomed <1000 ppm')
-    ax42.set_xlabel('Std Gas Conc (ppm)')
-    #ax2.set_ylabel('Residual (ppm)')
-    ax42.set_ylabel('Residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
-    ax42.set_xlim([-100,1100])
-    ax42.set_ylim([-5,5])
-    ax42.axhline(y=0,color='k', linestyle='--')
-
-    ax41.grid(b=True,which='major',axis='both')  # Pascal, added grid
-    ax42.grid(b=True,which='major',axis='both')  # Pascal, added grid
-
-    fig4.set_size_inches(10,6) # Pascal, added to expand size
-
-
-    plt.tight_layout()
-    #plt.show()
-
-    fig3.savefig(saveplotname_APOFF_T_recalc, dpi=300) #change this filename
-    fig4.savefig(saveplotname_EPOFF_T_recalc, dpi=300) #change this filename
-
-    #### close figures ####
-    plt.close()
-    plt.close()
+    with profile_stage('report: plots'):
+        ###################### Dataframes for APOFF ################################
+        df_830_830eq_avg_APOFF = df_830_830eq_APOFF.groupby('gas_standard').std_830recalc_res.agg(['mean','std'])
+        df_830_830eq_avg_APOFF = df_830_830eq_avg_APOFF.reset_index()
+        df_830_830eq_avg_APOFF = df_830_830eq_avg_APOFF.rename(columns={'std':'stdev'})
+
+        ###################### Dataframes for EPOFF ################################
+        df_830_830eq_avg_EPOFF = df_830_830eq_EPOFF.groupby('gas_standard').std_830recalc_res.agg(['mean','std'])
+        df_830_830eq_avg_EPOFF = df_830_830eq_avg_EPOFF.reset_index()
+        df_830_830eq_avg_EPOFF = df_830_830eq_avg_EPOFF.rename(columns={'std':'stdev'})
+
+        # To Do - put df_830_830eq_avg into table for reportlab
+        # print('Data from df_830_830eq_avg is like...')
+        # print(df_830_830eq_avg_EPOFF.describe())
+        # print(df_830_830eq_avg_EPOFF.head())
+        pd.set_option('max_columns',None)
+        print('Data from df_830_830eq_APOFF is like...')
+        print(df_830_830eq_APOFF.describe())
+        print(df_830_830eq_APOFF.head())
+
+        print('Data from df_830_830eq_EPOFF is like...')
+        print(df_830_830eq_EPOFF.describe())
+        print(df_830_830eq_EPOFF.head())
+        pd.reset_option('max_columns')
+
+        ##################### Save Dataframes as csv in the csv folder ##################
+        savecsvname_APOFF = csv_path + dir_sep \
+            + "APOFF_" + sn + '_' + date_range[0][0:8] + '.csv'
+        savecsvname_EPOFF = csv_path + dir_sep \
+            + "EPOFF_" + sn + '_' + date_range[0][0:8] + '.csv'
+        df_830_830eq_APOFF.to_csv(savecsvname_APOFF,index=False)
+        df_830_830eq_EPOFF.to_csv(savecsvname_EPOFF,index=False)
+
+        ##################### Plots for APOFF and EPOFF ######################################
+        # drawn in worker processes without pyplot, see report_figures.py
+        from report_figures import render_report_figures
+        print(f'lengthofrun = {len(df_830_830eq_APOFF)}')
+        print(f'numberofruns = {round(len(df_830_830eq_APOFF)/8)}')
+        figure_filenames = render_report_figures(df_830_830eq_APOFF,df_830_830eq_EPOFF,\
+            sn,date_range[0][0:8],figs_path,max_workers=figure_workers)
+        saveplotname_recalc_vs_no_recalc_APOFF = figure_filenames['APOFF_recalc_vs_no_recalc']
+        saveplotname_recalc_vs_no_recalc_EPOFF = figure_filenames['EPOFF_recalc_vs_no_recalc']
+        saveplotname_APOFF_T_recalc = figure_filenames['APOFF_T_recalc']
+        saveplotname_EPOFF_T_recalc = figure_filenames['EPOFF_T_recalc']
 
     #################### Create a pdf report ##########################
     from create_a_pdf_dry import generate_validation_report, generate_bigger_validation_report
@@ -2110,6 +1741,9 @@ def plot_and_produce_report_w_extra_checks(sn,path_to_data,validation_text_filen
     # generate_bigger_validation_report(reports_path,sn,date_range,figure_filenames_and_sizes,\
     #     tuple_of_df_4_tables,validation_text_filename,fault_text)
 
+    # profile of the stages above, when turned on with ASVCO2_PROFILE, see pipeline_profiler.py
+    write_profile(reports_path + dir_sep + 'profile','plot_and_produce_report_w_extra_checks')
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Figures of the pdf report made by plot_and_produce_report_w_extra_checks().
+
+Each figure is drawn on its own Agg canvas with the object oriented matplotlib
+API, without pyplot and its global figure numbers, so the four figures can be
+drawn at the same time in worker processes. The runs of the T_recalc figures
+are drawn with one scatter per panel and a color per point, instead of one
+scatter per run of 8 gas standards.
+"""
+import os
+import concurrent.futures
+import multiprocessing
+import numpy as np
+from matplotlib import cm
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+def plot_recalc_vs_no_recalc(gas_standard, std_830_res, std_830recalc_res, title, filename):
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1,1,1)
+    l1 = ax.scatter(gas_standard, std_830_res)
+    l2 = ax.scatter(gas_standard, std_830recalc_res)
+    ax.legend([l1,l2],['Measured CO2 - standard CO2, ppm','Recalculated CO2 - standard CO2, ppm'])  # Pascal, changed legend
+    ax.grid(True,which='major',axis='both')  # Pascal, added grid
+    ax.set_ylabel('Avg CO2 residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
+    ax.set_xlabel('CO2 gas standard')
+    ax.set_title(title)
+    fig.savefig(filename)  # Pascal, changed to png file
+    return filename
+
+def plot_T_recalc(gas_standard, std_830recalc_res, title, filename, tight_layout=False):
+    #number of runs, 8 gas standards per run
+    n = round(len(gas_standard)/8)
+
+    #create colorbar, one color for each run
+    colors = cm.cool(np.linspace(0,1,n))
+    run_of_row = np.arange(min(n*8,len(gas_standard)))//8
+    x = np.asarray(gas_standard,dtype=float)[0:len(run_of_row)]
+    y = np.asarray(std_830recalc_res,dtype=float)[0:len(run_of_row)]
+    maxy = max(std_830recalc_res)+3
+    labels = list(range(1,n+1))
+    # legend entries for the runs, the runs share one scatter
+    handles = [Line2D([],[],linestyle='',marker='o',color=colors[run]) for run in range(0,n)]
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(1,2)
+    ax1.scatter(x, y, color=colors[run_of_row])
+    ax2.scatter(x, y, color=colors[run_of_row])
+
+    ax1.set_title(title)
+    ax1.set_xlabel('Standard Gas Concentration (ppm)')
+    ax1.set_ylabel('Residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
+    ax1.set_xlim([-100,2700])
+    ax1.set_ylim([-maxy,maxy])
+    ax1.axhline(y=0,color='k', linestyle='--')
+
+    ax2.legend(handles, labels, bbox_to_anchor=(1.9, 1), loc="upper right",framealpha=0, title='# of run', fontsize="small")
+
+    ax2.set_title('Zoomed <1000 ppm')
+    ax2.set_xlabel('Std Gas Conc (ppm)')
+    ax2.set_ylabel('Residual, measured CO2 - CO2 gas standard (ppm)')  # Pascal, changed ylabel
+    ax2.set_xlim([-100,1100])
+    ax2.set_ylim([-5,5])
+    ax2.axhline(y=0,color='k', linestyle='--')
+
+    ax1.grid(True,which='major',axis='both')  # Pascal, added grid
+    ax2.grid(True,which='major',axis='both')  # Pascal, added grid
+
+    fig.set_size_inches(10,6) # Pascal, added to expand size
+    if ( tight_layout ):
+        fig.tight_layout()
+    fig.savefig(filename, dpi=300)
+    return filename
+
+def render_figure(figure_args):
+    # figure_args is (name of one of the plot functions above, arguments), so that
+    # it can be sent to a worker process
+    plot_function_name, args = figure_args
+    return globals()[plot_function_name](*args)
+
+def render_report_figures(df_830_830eq_APOFF, df_830_830eq_EPOFF, sn, date_str, figs_path,\
+    max_workers=None):
+    # Draws the four figures of the report into figs_path, in max_workers processes
+    # when max_workers > 1, by default one per figure up to the number of CPUs.
+    # Inside a worker process, e.g. a job of fleet_batch_runner.py, the default is to
+    # draw them in this process, the CPUs are already shared out between the workers.
+    # Returns the filenames, keyed APOFF_T_recalc, APOFF_recalc_vs_no_recalc,
+    # EPOFF_T_recalc and EPOFF_recalc_vs_no_recalc.
+    if ( max_workers is None ):
+        if ( multiprocessing.parent_process() is not None ):
+            max_workers = 1
+        else:
+            max_workers = min(4,os.cpu_count() or 1)
+    filenames = {}
+    list_of_figure_args = []
+    for mode, df in [('APOFF',df_830_830eq_APOFF),('EPOFF',df_830_830eq_EPOFF)]:
+        gas_standard = df['gas_standard'].to_numpy()
+        std_830_res = df['std_830_res'].to_numpy()
+        std_830recalc_res = df['std_830recalc_res'].to_numpy()
+
+        filenames[mode + '_recalc_vs_no_recalc'] = os.path.join(figs_path,\
+            mode + '_' + sn + '_' + date_str + '_T_recalc_vs_No_T_recalc.png')
+        list_of_figure_args.append(('plot_recalc_vs_no_recalc',(gas_standard,std_830_res,\
+            std_830recalc_res,mode + ' ' + sn + ' ' + date_str,\
+            filenames[mode + '_recalc_vs_no_recalc'])))
+
+        filenames[mode + '_T_recalc'] = os.path.join(figs_path,\
+            mode + '_' + sn + '_' + date_str + '_T_recalc.png')
+        # the report has always had tight_layout() on the EPOFF figure only
+        list_of_figure_args.append(('plot_T_recalc',(gas_standard,std_830recalc_res,\
+            mode + '_' + sn + '_' + date_str + '_T_recalc',filenames[mode + '_T_recalc'],\
+            mode == 'EPOFF')))
+
+    if ( max_workers > 1 ):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(render_figure,list_of_figure_args))
+    else:
+        for figure_args in list_of_figure_args:
+            render_figure(figure_args)
+
+    return filenames
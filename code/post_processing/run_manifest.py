@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run manifest of extract_summary_and_raw_to_csv(), so that a rerun over an ALL
+folder which only gained new files parses just the new ones.
+
+The manifest, reports/csv/run_manifest_<sn>.json, lists every ALL file of the
+last run with its size, mtime and sha1 and the rows it contributed to each of
+the combined dataframes (raw, DRY, DRY synced, stats, FLAGS and COEFF synced).
+The combined dataframes themselves are kept in reports/.cache/run_frames_<sn>.pickle,
+except the raw one, which is written to the raw csv file as it is made and
+read back from there. On a rerun with the same validation file, the rows of
+the files at the start of the list which are unchanged since the last run are
+taken from the stored dataframes, and only the files after them are parsed, so
+a changed, removed or inserted file means everything after it is parsed again.
+
+The reused raw rows are copied as text from the raw csv file of the last run,
+so they are what that file holds, not a new parse of the ALL files, and a rerun
+can only reuse them when the csv output is written. The manifest records
+RUN_MANIFEST_VERSION and the cache version of parse_cache.py, a last run
+written by code with another layout of the frames or of the csv files, or by
+an edited parser, is not reused.
+"""
+import os
+import json
+import pickle
+from parse_cache import get_file_signature, get_cache_version
+
+LIST_OF_FRAME_NAMES = ['raw','dry','dry_sync','stats','flags','coeff_sync']
+
+# Layout of the manifest and the stored frames, bump it when they change
+#   1 - raw frame stored in the pickle (manifests without a version)
+#   2 - raw rows read back from the raw csv file
+RUN_MANIFEST_VERSION = 2
+
+def get_previous_run(manifest_filename, frames_filename, validation_text_filename,\
+    filenames, check_hash=False):
+    # Returns (list of the 6 stored dataframes, manifest entries of the reused files),
+    # or (None, []) if the last run cannot be reused for these filenames. A dataframe
+    # which was not stored, the raw one, is None.
+    if not ( os.path.exists(manifest_filename) and os.path.exists(frames_filename) ):
+        return None, []
+    try:
+        with open(manifest_filename,'r') as f:
+            manifest = json.load(f)
+        with open(frames_filename,'rb') as f:
+            list_of_frames = pickle.load(f)
+    except Exception:  # unreadable manifest or frames, do a full run
+        return None, []
+
+    if ( manifest.get('version') != RUN_MANIFEST_VERSION or \
+        manifest.get('cache_version') != get_cache_version() ):
+        return None, []
+    if ( manifest['validation_text_filename'] != os.path.abspath(validation_text_filename) ):
+        return None, []
+    list_of_entries = manifest['files']
+    if ( len(list_of_entries) == 0 ):
+        return None, []
+    # the stored dataframes must end where the manifest says they do
+    for frame_name, df in zip(LIST_OF_FRAME_NAMES,list_of_frames):
+        if ( df is not None and len(df) != list_of_entries[-1]['rows'][frame_name][1] ):
+            return None, []
+
+    # reuse the files from the start of the list up to the first one which changed
+    num_unchanged = 0
+    for entry, filename in zip(list_of_entries,filenames):
+        if ( entry['filename'] != os.path.abspath(filename) ):
+            break
+        file_stat = os.stat(filename)
+        if ( entry['size'] != file_stat.st_size or entry['mtime'] != file_stat.st_mtime_ns ):
+            break
+        if ( check_hash and (entry['sha1'] is None or \
+            entry['sha1'] != get_file_signature(filename)['sha1']) ):
+            break
+        num_unchanged += 1
+    if ( num_unchanged == 0 ):
+        return None, []
+
+    list_of_entries = list_of_entries[:num_unchanged]
+    list_of_frames = [df.iloc[0:list_of_entries[-1]['rows'][frame_name][1]] \
+        if df is not None else None for frame_name, df in zip(LIST_OF_FRAME_NAMES,list_of_frames)]
+    return list_of_frames, list_of_entries
+
+def save_run(manifest_filename, frames_filename, validation_text_filename,\
+    list_of_previous_entries, new_filenames, list_of_new_row_counts, list_of_frames,\
+    check_hash=False):
+    # list_of_new_row_counts are the rows of each of the 6 dataframes of the files parsed
+    # in this run, or None for a file which could not be parsed.
+    # list_of_frames are the 6 combined dataframes written by this run, None for one
+    # which is not stored. The sha1 of the files is only computed with check_hash.
+    list_of_entries = list(list_of_previous_entries)
+    if ( len(list_of_entries) > 0 ):
+        row_counts = [list_of_entries[-1]['rows'][frame_name][1] for frame_name in LIST_OF_FRAME_NAMES]
+    else:
+        row_counts = [0]*len(LIST_OF_FRAME_NAMES)
+    for filename, row_counts_of_file in zip(new_filenames,list_of_new_row_counts):
+        signature = get_file_signature(filename,with_sha1=check_hash)
+        rows = {}
+        for i, frame_name in enumerate(LIST_OF_FRAME_NAMES):
+            num_rows = row_counts_of_file[i] if row_counts_of_file is not None else 0
+            rows[frame_name] = [row_counts[i],row_counts[i] + num_rows]
+            row_counts[i] += num_rows
+        list_of_entries.append({'filename':signature['path'],'size':signature['size'],\
+            'mtime':signature['mtime'],'sha1':signature['sha1'],'rows':rows})
+
+    frames_path = os.path.dirname(frames_filename)
+    if not os.path.exists(frames_path):
+        os.makedirs(frames_path)
+    # temporary files first, so an interrupted run never leaves half a manifest
+    with open(frames_filename + '.tmp','wb') as f:
+        pickle.dump(list_of_frames,f,protocol=pickle.HIGHEST_PROTOCOL)
+    manifest = {'version':RUN_MANIFEST_VERSION,'cache_version':get_cache_version(),\
+        'validation_text_filename':os.path.abspath(validation_text_filename),\
+        'files':list_of_entries}
+    with open(manifest_filename + '.tmp','w') as f:
+        json.dump(manifest,f,indent=4)
+    os.replace(frames_filename + '.tmp',frames_filename)
+    os.replace(manifest_filename + '.tmp',manifest_filename)
@@ -1,283 +1,244 @@
 import pandas as pd
 import numpy as np
 
-def calculate_xco2_from_data_pt_by_pt(data, zerocoeff, S0_tcorr, S1_tcorr, scalar=False):
-    
-    # CO2 calibration function constants (from Israel's email)
-    a1 = 0.3989974
-    a2 = 18.249359
-    a3 = 0.097101984
-    a4 = 1.8458913
-    n = ((a2 * a3) + (a1 * a4))
-    o = (a2 + a4)
-    q = (a2 - a4)
-    q_1 = (q ** 2)
-    r = ((a2 * a3) + (a1 * a4))
-    r_1 = (r ** 2)
-    D = 2 * (a2 - a4) * ((a1 * a4) - (a2 * a3))
-
+# CO2 calibration function constants of the LI-830 (from Israel's email), and the
+# terms derived from them, computed once instead of on every xCO2 calculation
+LI830_CONSTANTS = {
+    'a1':0.3989974,
+    'a2':18.249359,
+    'a3':0.097101984,
+    'a4':1.8458913,
     # constants to compute X
-    b1 = 1.10158  # 'a
-    b2 = -0.00612178  # 'b
-    b3 = -0.266278  # 'c
-    b4 = 3.69895  # 'd
-    z = a1 + a3
-
-    p0 = 99  # po is std pressure, po = 99.0 kPa
-    
-    if ( not scalar):
-        Li_Raw_float = data.Li_Raw.astype(int)  # w - raw count
-        Li_ref_float = data.Li_ref.astype(int)  # w0 - raw count reference
-        Pres_float = data.Pres.astype(float)  # p1 - measured pressure
-        Temp_float = data.Temp.astype(float)  # T - temperature
-    else:
-        Li_Raw_float = float(data.Li_Raw)
-        Li_ref_float = float(data.Li_ref)
-        Pres_float = float(data.Pres)
-        Temp_float = float(data.Temp)
-
-    w = Li_Raw_float
-    w0 = Li_ref_float
-    p1 = Pres_float
-    T = Temp_float
-    #print(f'w = {w}, w0 = {w0}, p1 = {p1}, T = {T}')
-    #use averaged values
-    # w_mean = w.mean()
-    # w0_mean =w0.mean()
-    # p1_mean = p1.mean()
-    # T_mean = T.mean()
-
-    #Pascal, new alphaC to reflect "APOFF" dataset
-    #alphaC = (1 - ((w_mean / w0_mean) * zerocoeff))
-
-    # No longer using averaged values
-    alphaC = (1 - (w/w0)*zerocoeff)
-    
-    # Pascal - valid, these are intermediate variables used to calculate alphaCprime, below
-
-    #Need to shift S0_tcorr index to match alphaC index for calculation
-    #idx_delta = S0_tcorr.index[0]-alphaC.index[0]
-    #S0_tcorr.index = [val-idx_delta for val in S0_tcorr.index]
-    #print(f'double check: S0_tcorr = {S1_tcorr}, S0_tcorr = {S1_tcorr}')
-    alphaC_1 = alphaC * S0_tcorr
-    alphaC_2 = (alphaC ** 2) * S1_tcorr
-    # print("alphaC_2\n",alphaC_2)
-
-    # Pascal - valid, relates to eq. A-3 or eq. A-10 of LiCor 830/850 manual
-    alphaCprime = alphaC_1 + alphaC_2
-    #print(f"alphaCprime = {alphaCprime}")
-
-    #df_bugs = pd.DataFrame([alphaC, BetaC, S0_tcorr, alphaCprime, alphaCprime-BetaC])
-    #df_bugs = df_bugs.transpose()
-
-    #p = p1_mean / p0 
-    p = p1 / p0  # No longer using averaged values
-    #pif = p > 1
-    
-    # if pif.any():
-    #     p = p1_mean / p0
-    # else:
-    #     p = p0 / p1_mean
-
-    # No longer using averaged values
-    if ( not scalar ):
-        mask_p_gt_1 = p < 1.0
-        temp = pd.Series(dtype='float64')
-        temp = p0 / p1.loc[mask_p_gt_1]
-        p.update(temp)
-        del temp
-    else:
-        if p <= 1:
+    'b1':1.10158,  # 'a
+    'b2':-0.00612178,  # 'b
+    'b3':-0.266278,  # 'c
+    'b4':3.69895,  # 'd
+    'p0':99,  # po is std pressure, po = 99.0 kPa
+}
+LI830_CONSTANTS['n'] = ((LI830_CONSTANTS['a2'] * LI830_CONSTANTS['a3']) + \
+    (LI830_CONSTANTS['a1'] * LI830_CONSTANTS['a4']))
+LI830_CONSTANTS['o'] = (LI830_CONSTANTS['a2'] + LI830_CONSTANTS['a4'])
+LI830_CONSTANTS['q_1'] = ((LI830_CONSTANTS['a2'] - LI830_CONSTANTS['a4']) ** 2)
+LI830_CONSTANTS['r_1'] = (LI830_CONSTANTS['n'] ** 2)  # r is the same as n
+LI830_CONSTANTS['D'] = 2 * (LI830_CONSTANTS['a2'] - LI830_CONSTANTS['a4']) * \
+    ((LI830_CONSTANTS['a1'] * LI830_CONSTANTS['a4']) - (LI830_CONSTANTS['a2'] * LI830_CONSTANTS['a3']))
+LI830_CONSTANTS['z'] = LI830_CONSTANTS['a1'] + LI830_CONSTANTS['a3']
+# the terms calculate_xco2_kernel() uses, in the order it unpacks them
+LI830_KERNEL_TERMS = tuple([LI830_CONSTANTS[k] for k in \
+    ['a1','a3','n','o','q_1','r_1','D','z','b1','b2','b3','b4','p0']])
+SCALAR_TYPES = (int, float, np.number)
+
+def calculate_xco2_kernel(w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr, out=None,\
+    g_is_X_below_p0=False, invert_at_p0=True):
+    # xCO2 from the raw counts w, reference counts w0, pressure p1 (kPa) and
+    # temperature T (C), LiCor 830/850 manual Appendix A. The pressure ratio p is
+    # inverted wherever p1 <= p0, or p1 < p0 if not invert_at_p0 (as the pandas
+    # version of calculate_xco2_from_data_pt_by_pt() did), there g is 1/X, or X if
+    # g_is_X_below_p0 (as the pandas versions below always did). zerocoeff, S0_tcorr
+    # and S1_tcorr may be arrays of per-row coefficients or single values.
+    # Arrays are evaluated in place, in a few scratch arrays, and the result is
+    # written into out if given. Single values are evaluated with float math,
+    # which is much faster when this is called once per row.
+    a1, a3, n, o, q_1, r_1, D, z, b1, b2, b3, b4, p0 = LI830_KERNEL_TERMS
+
+    if ( out is None and isinstance(w, SCALAR_TYPES) and isinstance(w0, SCALAR_TYPES) and \
+        isinstance(p1, SCALAR_TYPES) and isinstance(T, SCALAR_TYPES) and \
+        isinstance(zerocoeff, SCALAR_TYPES) and isinstance(S0_tcorr, SCALAR_TYPES) and \
+        isinstance(S1_tcorr, SCALAR_TYPES) ):
+        alphaC = (1 - (w/w0)*zerocoeff)
+        # Pascal - valid, relates to eq. A-3 or eq. A-10 of LiCor 830/850 manual
+        alphaCprime = alphaC * S0_tcorr + (alphaC ** 2) * S1_tcorr
+        p = p1 / p0
+        inverted = ( p <= 1 ) if invert_at_p0 else ( p < 1.0 )
+        if ( inverted ):
             p = p0 / p1  #invert p
-
-
-    # Pascal - valid, relates to eq. A-11 of LiCor 830/850 manual, note b1:=a, b2:=b, b3:=c and b4:=d
-    #    ' compute some terms for the pressure correction function
-    A = (1 / (b1 * (p - 1)))
-    B = 1 / ((1 / (b2 + (b3 * p))) + b4)
-    X = 1 + (1 / (A + (B * ((1 / (z - alphaC)) - (1 / z)))))  # change whether alphaC or alphaCprime here
-    
-    # Pascal - valid, w.r.t g, relates to eq. A-13 or eq. A-11 of LiCor 830/850 manual
-    # g is the empirical correction function and is a function of absorptance and pressure
-
-    # if pif.any():
-    #     g = 1 / X
-    # else:
-    #     g = X
-
-    # No longer using averaged values
-    if (not scalar):
-        g = 1/X
-        temp = pd.Series(dtype='float64')
-        temp = X.loc[mask_p_gt_1]
-        g.update(temp)
-        del temp
+        # Pascal - valid, relates to eq. A-11 of LiCor 830/850 manual, note b1:=a, b2:=b, b3:=c and b4:=d
+        A = (1 / (b1 * (p - 1)))
+        B = 1 / ((1 / (b2 + (b3 * p))) + b4)
+        X = 1 + (1 / (A + (B * ((1 / (z - alphaC)) - (1 / z)))))
+        g = X if ( inverted and g_is_X_below_p0 ) else 1/X
+        # Pascal - valid, w.r.t. eq. A-10 of LiCor 830/850 manual
+        alphapc = alphaCprime * g
+        # F is the calibration polynomial, psi(W) presumed to be 1
+        numr = (n - o * alphapc) - np.sqrt(q_1 * (alphapc ** 2) + D * alphapc + r_1)
+        denom = 2 * (alphapc - a1 - a3)
+        return (numr / denom) * (T+273.15)
+
+    w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr = [np.asarray(x, dtype='float64') for x in \
+        [w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr]]
+    shape = np.broadcast(w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr).shape
+    if ( out is None ):
+        out = np.empty(shape, dtype='float64')
+
+    # alphaC = 1 - (w/w0)*zerocoeff
+    alphaC = np.empty(shape, dtype='float64')
+    np.divide(w, w0, out=alphaC)
+    alphaC *= zerocoeff
+    np.subtract(1, alphaC, out=alphaC)
+
+    # alphaCprime = alphaC * S0_tcorr + (alphaC ** 2) * S1_tcorr, eq. A-3 or eq. A-10
+    alphapc = np.empty(shape, dtype='float64')
+    np.multiply(alphaC, alphaC, out=alphapc)
+    alphapc *= S1_tcorr
+    np.multiply(alphaC, S0_tcorr, out=out)
+    alphapc += out
+
+    # eq. A-11, A = 1/(b1*(p-1)), B = 1/((1/(b2+b3*p)) + b4), only as large as p1
+    p = np.empty(p1.shape, dtype='float64')
+    np.divide(p1, p0, out=p)
+    inverted = ( p <= 1 ) if invert_at_p0 else ( p < 1.0 )
+    np.divide(p0, p1, out=p, where=inverted)  #invert p
+    A = np.empty(p1.shape, dtype='float64')
+    np.subtract(p, 1, out=A)
+    A *= b1
+    np.divide(1, A, out=A)
+    B = np.empty(p1.shape, dtype='float64')
+    np.multiply(p, b3, out=B)
+    B += b2
+    np.divide(1, B, out=B)
+    B += b4
+    np.divide(1, B, out=B)
+
+    # X = 1 + (1 / (A + (B * ((1 / (z - alphaC)) - (1 / z))))), into out
+    np.subtract(z, alphaC, out=out)
+    np.divide(1, out, out=out)
+    out -= (1 / z)
+    out *= B
+    out += A
+    np.divide(1, out, out=out)
+    out += 1
+
+    # g, then alphapc = alphaCprime * g, eq. A-10
+    if ( g_is_X_below_p0 ):
+        np.divide(1, out, out=out, where=np.broadcast_to(~inverted, shape))
     else:
-        g =  1/X
-
-    # Pascal - valid, w.r.t. eq. A-10 of LiCor 830/850 manual
-    #    'alphapc is the pressure corrected absorptance, alphaC'', and equal absorptance(absp) * correction (g)
-    alphapc = alphaCprime * g
-
-    #print(f'alphapc = {alphapc}')
-    
-    #    'F is the calibration polynomial
+        np.divide(1, out, out=out)
+    alphapc *= out
+
+    # F is the calibration polynomial, psi(W) presumed to be 1
+    # numr = (n - o * alphapc) - np.sqrt(q_1 * (alphapc ** 2) + D * alphapc + r_1), into out
+    root = np.multiply(alphapc, alphapc, out=alphaC)
+    root *= q_1
+    np.multiply(alphapc, D, out=out)
+    root += out
+    root += r_1
+    np.sqrt(root, out=root)
+    np.multiply(alphapc, o, out=out)
+    np.subtract(n, out, out=out)
+    out -= root
+    # denom = 2 * (alphapc - a1 - a3)
+    alphapc -= a1
+    alphapc -= a3
+    alphapc *= 2
+    out /= alphapc
+
+    out *= (T+273.15)
+
+    return out
 
-    # Pascal - invalid without stated assumption of psi(W) per eq. A-18, A-14 and A-16 in LiCor 830/850 manual
-    # if it is presumed that psi(W) is 1, then this should be valid, but that needs some kind of statement
-    numr = (n - o * alphapc) - np.sqrt(q_1 * (alphapc ** 2) + D * alphapc + r_1)
-    denom = 2 * (alphapc - a1 - a3)
-
-    # Pascal - invalid per eq. A-16 of LiCor 830/850 manual, where x should be alphapc/psi(W)
-    # if psi(W) is 1, then it is valid, but the psi(W) being assumed as 1 should be stated
-    F = numr / denom
-    #print(f'F_mean = {F.mean()}')
-    
-    # Pascal - invalid without stated assumption of psi(W) per eq. A-18, A-14 and A-16 in LiCor 830/850 manual
-    # if it is presumed that psi(W) is 1, then this should be valid, but that needs some kind of statement
-    # xco2 = F * ((T_mean + 273.15))  # / (T0 + 273.15)) # added the bottom TO
-    #print(f'T_mean = {T.mean()}')
-    #print(f'xco2_mean = {xco2.mean()}')
-
-    # No longer using averaged values
-    xco2 = F * (T+273.15)
-
-    return xco2
+def calculate_xco2_from_data_pt_by_pt(data, zerocoeff, S0_tcorr, S1_tcorr, scalar=False):
+    # xCO2 of each row of data, or of the single row data if scalar. Coefficients given
+    # as pd.Series are lined up with the rows of data by index, like pandas arithmetic,
+    # rows of data without a coefficient get NaN.
+    if ( not scalar):
+        zerocoeff, S0_tcorr, S1_tcorr = [x.reindex(data.index).to_numpy(dtype=float) \
+            if isinstance(x, pd.Series) else x for x in [zerocoeff, S0_tcorr, S1_tcorr]]
+        xco2 = calculate_xco2_kernel(data.Li_Raw.astype(int).to_numpy(),  # w - raw count
+            data.Li_ref.astype(int).to_numpy(),  # w0 - raw count reference
+            data.Pres.astype(float).to_numpy(),  # p1 - measured pressure
+            data.Temp.astype(float).to_numpy(),  # T - temperature
+            zerocoeff, S0_tcorr, S1_tcorr, g_is_X_below_p0=True, invert_at_p0=False)
+        return pd.Series(xco2, index=data.index)
+    else:
+        return calculate_xco2_kernel(float(data.Li_Raw), float(data.Li_ref), float(data.Pres),\
+            float(data.Temp), zerocoeff, S0_tcorr, S1_tcorr)
 
 def calculate_xco2_from_data_pt_by_pt_older(data, zerocoeff, S0_tcorr, S1_tcorr):
-    
-    # CO2 calibration function constants (from Israel's email)
-    a1 = 0.3989974
-    a2 = 18.249359
-    a3 = 0.097101984
-    a4 = 1.8458913
-    n = ((a2 * a3) + (a1 * a4))
-    o = (a2 + a4)
-    q = (a2 - a4)
-    q_1 = (q ** 2)
-    r = ((a2 * a3) + (a1 * a4))
-    r_1 = (r ** 2)
-    D = 2 * (a2 - a4) * ((a1 * a4) - (a2 * a3))
-
-    # constants to compute X
-    b1 = 1.10158  # 'a
-    b2 = -0.00612178  # 'b
-    b3 = -0.266278  # 'c
-    b4 = 3.69895  # 'd
-    z = a1 + a3
-
-    p0 = 99  # po is std pressure, po = 99.0 kPa
-
-    Li_Raw_float = data.Li_Raw.astype(int)  # w - raw count
-    Li_ref_float = data.Li_ref.astype(int)  # w0 - raw count reference
-    Pres_float = data.Pres.astype(float)  # p1 - measured pressure
-    Temp_float = data.Temp.astype(float)  # T - temperature
-
-    w = Li_Raw_float
-    w0 = Li_ref_float
-    p1 = Pres_float
-    T = Temp_float
-    
-    #use averaged values
-    # w_mean = w.mean()
-    # w0_mean =w0.mean()
-    # p1_mean = p1.mean()
-    # T_mean = T.mean()
-
-    #Pascal, new alphaC to reflect "APOFF" dataset
-    #alphaC = (1 - ((w_mean / w0_mean) * zerocoeff))
-
-    # No longer using averaged values
-    alphaC = (1 - (w/w0)*zerocoeff)
-    
-    # Pascal - valid, these are intermediate variables used to calculate alphaCprime, below
-
-    #Need to shift S0_tcorr index to match alphaC index for calculation
-    #idx_delta = S0_tcorr.index[0]-alphaC.index[0]
-    #S0_tcorr.index = [val-idx_delta for val in S0_tcorr.index]
-    #print(f'double check: S0_tcorr = {S1_tcorr}, S0_tcorr = {S1_tcorr}')
-    alphaC_1 = alphaC * S0_tcorr
-    alphaC_2 = (alphaC ** 2) * S1_tcorr
-    # print("alphaC_2\n",alphaC_2)
-
-    # Pascal - valid, relates to eq. A-3 or eq. A-10 of LiCor 830/850 manual
-    alphaCprime = alphaC_1 + alphaC_2
-    #print("alphaCprime\n",alphaCprime)
-
-    #df_bugs = pd.DataFrame([alphaC, BetaC, S0_tcorr, alphaCprime, alphaCprime-BetaC])
-    #df_bugs = df_bugs.transpose()
-
-    #p = p1_mean / p0 
-    p = p1 / p0  # No longer using averaged values
-    #pif = p > 1
-    
-    # if pif.any():
-    #     p = p1_mean / p0
-    # else:
-    #     p = p0 / p1_mean
-
-    # No longer using averaged values
-    mask_p_gt_1 = p < 1.0
-    temp = pd.Series(dtype='float64')
-    temp = p0 / p1.loc[mask_p_gt_1]
-    p.update(temp)
-    del temp
-
-
-    # Pascal - valid, relates to eq. A-11 of LiCor 830/850 manual, note b1:=a, b2:=b, b3:=c and b4:=d
-    #    ' compute some terms for the pressure correction function
-    A = (1 / (b1 * (p - 1)))
-    B = 1 / ((1 / (b2 + (b3 * p))) + b4)
-    X = 1 + (1 / (A + (B * ((1 / (z - alphaC)) - (1 / z)))))  # change whether alphaC or alphaCprime here
-    
-    # Pascal - valid, w.r.t g, relates to eq. A-13 or eq. A-11 of LiCor 830/850 manual
-    # g is the empirical correction function and is a function of absorptance and pressure
-
-    # if pif.any():
-    #     g = 1 / X
-    # else:
-    #     g = X
-
-    # No longer using averaged values
-    g = 1/X
-    temp = pd.Series(dtype='float64')
-    temp = X.loc[mask_p_gt_1]
-    g.update(temp)
-    del temp
-
-    # Pascal - valid, w.r.t. eq. A-10 of LiCor 830/850 manual
-    #    'alphapc is the pressure corrected absorptance, alphaC'', and equal absorptance(absp) * correction (g)
-    alphapc = alphaCprime * g
-
-    #print(f'span2_temp = {span2_in}')
-    
-    #    'F is the calibration polynomial
-
-    # Pascal - invalid without stated assumption of psi(W) per eq. A-18, A-14 and A-16 in LiCor 830/850 manual
-    # if it is presumed that psi(W) is 1, then this should be valid, but that needs some kind of statement
-    numr = (n - o * alphapc) - np.sqrt(q_1 * (alphapc ** 2) + D * alphapc + r_1)
-    denom = 2 * (alphapc - a1 - a3)
-
-    # Pascal - invalid per eq. A-16 of LiCor 830/850 manual, where x should be alphapc/psi(W)
-    # if psi(W) is 1, then it is valid, but the psi(W) being assumed as 1 should be stated
-    F = numr / denom
-    #print(f'F_mean = {F.mean()}')
-    
-    # Pascal - invalid without stated assumption of psi(W) per eq. A-18, A-14 and A-16 in LiCor 830/850 manual
-    # if it is presumed that psi(W) is 1, then this should be valid, but that needs some kind of statement
-    # xco2 = F * ((T_mean + 273.15))  # / (T0 + 273.15)) # added the bottom TO
-    #print(f'T_mean = {T.mean()}')
-    #print(f'xco2_mean = {xco2.mean()}')
-
-    # No longer using averaged values
-    xco2 = F * (T+273.15)
+    return calculate_xco2_from_data_pt_by_pt(data, zerocoeff, S0_tcorr, S1_tcorr)
+
+def calculate_xco2_from_arrays(w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr, out=None):
+    # Batched version of calculate_xco2_from_data_pt_by_pt(...,scalar=True).
+    # w, w0, p1 and T are arrays of raw counts, reference counts, pressure (kPa)
+    # and temperature (C). zerocoeff, S0_tcorr and S1_tcorr may be arrays of
+    # per-row coefficients or single values. The scalar path uses g = 1/X for
+    # both branches of p, keep it that way here.
+    return calculate_xco2_kernel(np.asarray(w, dtype='float64'), w0, p1, T,\
+        zerocoeff, S0_tcorr, S1_tcorr, out=out)
+
+def calculate_xco2_wet_dry_and_dry_Tcorr(w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr,\
+    RH_T, RH_sample, RH_span, xCO2_measured=None):
+    # One call for the temperature corrected (wet) xCO2 recalculated from the raw counts,
+    # the dry correction of the measured xCO2 and the dry correction of the recalculated xCO2.
+    # If xCO2_measured is not given, the dry measured xCO2 is returned as None.
+    xCO2_Tcorr = calculate_xco2_from_arrays(w, w0, p1, T, zerocoeff, S0_tcorr, S1_tcorr)
+    p1 = np.asarray(p1, dtype='float64')
+    RH_T = np.asarray(RH_T, dtype='float64')
+    RH_sample = np.asarray(RH_sample, dtype='float64')
+    xCO2_dry_Tcorr = dry_correction(xCO2_Tcorr,RH_T,p1,RH_sample,RH_span)
+    if ( xCO2_measured is None ):
+        xCO2_dry = None
+    else:
+        xCO2_measured = np.asarray(xCO2_measured, dtype='float64')
+        xCO2_dry = dry_correction(xCO2_measured,RH_T,p1,RH_sample,RH_span)
 
-    return xco2
+    return xCO2_Tcorr, xCO2_dry, xCO2_dry_Tcorr
 
 def dry_correction(xCO2_wet,RH_T,Pressure,RH_sample,RH_span):
     return xCO2_wet / ((Pressure-((RH_sample-RH_span)*0.61365*\
         np.exp((17.502*RH_T)/(240.97+RH_T)))/100.0)/Pressure)
 
+def match_gas_standards(co2, gaslist, tolerance=50.0):
+    # Nearest gas standard of each CO2 value (ppm), found with a binary search of
+    # the sorted gaslist. Returns the gas standard of each value, NaN where the
+    # nearest one is tolerance or more away, the distance to the nearest gas
+    # standard and the median of the gas standards found (NaN if none).
+    co2 = np.asarray(co2, dtype='float64')
+    standards = np.sort(np.asarray(gaslist, dtype='float64'))
+    if ( len(standards) == 0 ):
+        return np.full(co2.shape, np.nan), np.full(co2.shape, np.inf), np.nan
+    idx_right = np.clip(np.searchsorted(standards, co2), 1, len(standards) - 1) \
+        if len(standards) > 1 else np.zeros(co2.shape, dtype=int)
+    idx_left = np.maximum(idx_right - 1, 0)
+    dist_left = np.abs(co2 - standards[idx_left])
+    dist_right = np.abs(co2 - standards[idx_right])
+    # on a tie the lower gas standard wins, like the first match of a loop over the gaslist
+    idx_nearest = np.where(dist_left <= dist_right, idx_left, idx_right)
+    distance = np.minimum(dist_left, dist_right)
+
+    gas_standard = standards[idx_nearest]
+    gas_standard[~(distance < tolerance)] = np.nan
+    matched = gas_standard[~np.isnan(gas_standard)]
+    median = np.median(matched) if len(matched) > 0 else np.nan
+
+    return gas_standard, distance, median
+
+def match_gas_standard_ranges(gas_standard, list_of_ranges, unknown='unknown'):
+    # Tag of each gas standard from a list of {'min':...,'max':...,'tag':...},
+    # see config/gas_standard_tag_ranges.json, the first range that holds the
+    # gas standard wins and unknown is used where none does. Ranges which do not
+    # overlap are found with a binary search of their sorted minimums.
+    gas_standard = np.asarray(gas_standard, dtype='float64')
+    tags = np.full(gas_standard.shape, unknown, dtype=object)
+    if ( len(list_of_ranges) == 0 ):
+        return tags
+    mins = np.array([d['min'] for d in list_of_ranges], dtype='float64')
+    maxs = np.array([d['max'] for d in list_of_ranges], dtype='float64')
+    range_tags = np.array([d['tag'] for d in list_of_ranges], dtype=object)
+
+    order = np.argsort(mins, kind='stable')
+    if ( np.all(mins[order][1:] > maxs[order][:-1]) ):
+        idx = np.searchsorted(mins[order], gas_standard, side='right') - 1
+        idx_clipped = np.maximum(idx, 0)
+        in_range = (idx >= 0) & (gas_standard <= maxs[order][idx_clipped])
+        tags[in_range] = range_tags[order][idx_clipped[in_range]]
+    else:
+        # overlapping ranges, go through them last to first so the first one wins
+        for idx in range(len(list_of_ranges) - 1, -1, -1):
+            in_range = (gas_standard >= mins[idx]) & (gas_standard <= maxs[idx])
+            tags[in_range] = range_tags[idx]
+
+    return tags
+
 
 if __name__ == "__main__":
     LiRawTxt = ['5240531','5235621','5218432','5219999','5220389','5224905', \
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic ALL files and a matching validation report, for benchmarking and for
+trying out the post processing without instrument data.
+
+Each cycle is one ALL file, system report, COEFF, DATA at 2 Hz through the ten
+states, STATS, DRY and FLAGS, and one section of the validation report.
+The cycles step through the eight reference gases of referencegases.txt.
+The raw LI-830 counts are generated from the CO2 concentration with the same
+calibration equations used for the recalculation, see special_functions.py.
+
+Example, 8 cycles into ./data/ASVTEST12/,
+    python synthetic_data.py ./data/ASVTEST12/ --cycles 8
+"""
+import os
+import argparse
+import datetime as dt
+import numpy as np
+import config_cache
+from special_functions import calculate_xco2_from_arrays
+
+LIST_OF_STATES = ['ZPON','ZPOFF','ZPPCAL','SPON','SPOFF','SPPCAL','EPON','EPOFF','APON','APOFF']
+
+DATA_HEADER = 'State,TS,SN,CO2(ppm),Li_Temp(C),Li_Pres(kPa),Li_RawSample,' + \
+    'Li_RawReference,RH(%),RH_T(C),O2(%)'
+
+STATS_HEADER = 'State,SN,Timestamp,Li_Temp_ave(C),Li_Temp_sd,Li_Pres_ave(kPa),' + \
+    'Li_Pres_sd,CO2_ave(PPM),CO2_SD,O2_ave(%),O2_S,RH_ave(%),RH_sd,RH_T_ave(C),Rh_T_sd,' + \
+    'Li_RawSample_ave,Li_RawSample_sd,Li_RawDetector_ave,Li_RawReference_sd'
+
+VAL_HEADER = 'mode,datetime,Li_Temp_ave,Li_Temp_sd,Li_Pres_ave,Li_Pres_sd,CO2_ave,CO2_sd,' + \
+    'O2_ave,O2_sd,RH_ave,RH_sd,RH_T_ave,RH_T_sd,Flow_ave,Flow_sd'
+
+def get_reference_gases():
+    # same file as get_gaslist(), see config_cache.py
+    return list(config_cache.get_reference_gases())
+
+def get_synthetic_sys_rep(sn,timestamp):
+    ts_str = timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')
+    sys_rep = {'serial':sn,'time':ts_str,'gps':'0.0 0.0','ver':'v1.9.1',\
+        'startup':'5','span':'2','spandiff':'5.0','equil':'600','warmup':'60',\
+        'pumpon':'30','pumpoff':'30','sampleco2':'30','vent':'30','heater':'1',\
+        'sample':'2','LI_ser':'CGA-5081','LI_ver':'1.0.0','runtime':'123',\
+        'secondaryspan_calibrated_temperature':'22.035',\
+        'secondaryspan_calibrated_spanconcentration':'502.76',\
+        'last_secondaryspan_temperaturedependantslope':'2021-02-22T00:00:00Z',\
+        'secondaryspan_temperaturedependantslope':'-0.00307',\
+        'secondaryspan_temperaturedependantslopefit':'0.9',\
+        'secondaryspan_calibrated_rh':'1.27',\
+        'ASVCO2_secondaryspan_concentration':'1994.25',\
+        'last_ASVCO2_validation':'2022-03-01T00:00:00Z','pressure_bias':'0.0',\
+        'last_pressure_bias_measured':'2022-03-01T00:00:00Z',\
+        'ASVCO2_ATRH_serial':'XXXXXXXXX','ASVCO2_O2_serial':'XXXX',\
+        'ASVCO2_manufacturer':'PMEL',\
+        'secondaryspan_calibrated_spanserialnumber':'JA02448',\
+        'ASVCO2_secondaryspan_serialnumber':'CB11282',\
+        'ASVCO2_span_serialnumber':'CC738889',\
+        'last_secondaryspan_calibration':'2021-02-22T00:00:00Z'}
+    return sys_rep
+
+def get_raw_counts_from_xco2(xco2,w0,p1,T,zerocoeff,S0,S1):
+    # Inverse of calculate_xco2_from_arrays() for one pressure and temperature,
+    # interpolated on a grid of absorptance, alphaC = 1 - (w/w0)*zerocoeff
+    alphaC_grid = np.linspace(0,0.45,4501)
+    w_grid = (1 - alphaC_grid)/zerocoeff
+    xco2_grid = calculate_xco2_from_arrays(w_grid,np.ones_like(w_grid),\
+        np.full_like(w_grid,p1),np.full_like(w_grid,T),zerocoeff,S0,S1)
+    alphaC = np.interp(np.maximum(xco2,0.0),xco2_grid,alphaC_grid)
+    return np.round((1 - alphaC)*w0/zerocoeff).astype('int64')
+
+def make_synthetic_cycle(sn,start_time,gas,span_gas,cycle_num,rng,samples_per_state=20):
+    # Returns the lines of one ALL file and the lines of its validation report section
+    sys_rep = get_synthetic_sys_rep(sn,start_time)
+    T_cal = float(sys_rep['secondaryspan_calibrated_temperature'])
+    zerocoeff = 0.948 + 0.0001*cycle_num
+    S0 = 0.912
+    S1 = 0.0545
+    coeffs = [('CO2LastZero',start_time.strftime('%d %b %Y').upper()),\
+        ('CO2kzero',f'{zerocoeff:.6f}'),\
+        ('CO2LastSpan',start_time.strftime('%d %b %Y').upper()),\
+        ('CO2LastSpan2',start_time.strftime('%d %b %Y').upper()),\
+        ('CO2kspan',f'{S0:.6f}'),('CO2kspan2',f'{S1:.6f}')]
+
+    all_lines = [f'{k}={v}' for k, v in sys_rep.items()]
+    all_lines += ['LOG:','LOG: starting cycle']
+    all_lines += [f'COEFF: \t{k}: {v}' for k, v in coeffs]
+    all_lines.append('DATA:' + DATA_HEADER)
+
+    stats_lines = []
+    val_lines = []
+    t = start_time
+    for state in LIST_OF_STATES:
+        if ( state.startswith('Z') ):
+            conc = 0.0
+        elif ( state.startswith('S') ):
+            conc = span_gas
+        else:
+            conc = gas
+        pres = 101.3 + (4.0 if state.endswith('ON') else 0.0)  # pump on
+        n = samples_per_state
+        co2 = conc + rng.normal(0,0.3,n)
+        temp = T_cal + rng.normal(0,0.05,n)
+        p = pres + rng.normal(0,0.05,n)
+        w0 = np.round(5460000 + rng.normal(0,500,n)).astype('int64')
+        w = get_raw_counts_from_xco2(co2,w0,pres,T_cal,zerocoeff,S0,S1)
+        rh = 5 + rng.normal(0,0.1,n)
+        rh_t = 25 + rng.normal(0,0.05,n)
+        o2 = 20.9 + rng.normal(0,0.01,n)
+        for i in range(n):
+            ts = t + dt.timedelta(seconds=0.5*i)  # 2 Hz
+            ts_str = ts.strftime('%Y-%m-%dT%H:%M:%S') + f'.{ts.microsecond//100000}Z'
+            all_lines.append(f'DATA:{state}, {ts_str},{sn},{co2[i]:.2f},{temp[i]:.2f},' + \
+                f'{p[i]:.2f},{w[i]},{w0[i]},{rh[i]:.2f},{rh_t[i]:.2f},{o2[i]:.2f}')
+
+        t_stats = (t + dt.timedelta(seconds=0.5*n)).replace(microsecond=0) + \
+            dt.timedelta(seconds=1)
+        ts_stats = t_stats.strftime('%Y-%m-%dT%H:%M:%SZ')
+        means_and_sd = f'{temp.mean():.2f},{temp.std():.2f},{p.mean():.2f},{p.std():.2f},' + \
+            f'{co2.mean():.2f},{co2.std():.2f},{o2.mean():.2f},{o2.std():.2f},' + \
+            f'{rh.mean():.2f},{rh.std():.2f},{rh_t.mean():.2f},{rh_t.std():.2f}'
+        stats_lines.append(f'STATS:{state},{sn}, {ts_stats},{means_and_sd},' + \
+            f'{int(w.mean())},{int(w.std())},{int(w0.mean())},{int(w0.std())}')
+        val_lines.append(f'{state},{ts_stats},{means_and_sd},0.50,0.01')
+        t = t_stats + dt.timedelta(seconds=2)
+
+    all_lines.append('STATS:' + STATS_HEADER)
+    all_lines += stats_lines
+    all_lines.append('DRY: TS, SW_xCO2(dry), Atm_xCO2(dry)')
+    all_lines.append(f'DRY: {t.strftime("%Y-%m-%dT%H:%M:%SZ")}, {gas+0.1:.2f}, {gas-0.1:.2f}')
+    all_lines.append('FLAGS: 0000 0000 0000 0000 0000 0000 0000 0000')
+
+    val_section = ['ASVCO2v2']
+    val_section += [f'{k}={v}' for k, v in sys_rep.items()]
+    val_section += [f'{k}: {v}' for k, v in coeffs]
+    val_section.append(f'Validation with reference gas: {gas}')
+    val_section.append(f'Mode:SPOFF, Gas:{span_gas}')
+    for mode in ['EPOFF','APOFF']:
+        val_section.append(f'Mode:{mode}, Gas:{gas}')
+    val_section.append('Flushing validaiton gas for 60 seconds')
+    val_section.append(f'Mean:{gas:.2f}, STD:0.20')
+    val_section.append(VAL_HEADER)
+    val_section += val_lines
+
+    return all_lines, val_section
+
+def write_synthetic_dataset(path_to_data,sn='ASVTEST12',num_cycles=8,samples_per_state=20,\
+    seed=0,start_time=dt.datetime(2022,3,25,22,5,0),minutes_per_cycle=15):
+    # Writes path_to_data/ALL/YYYYMMDD_HHMMSS.txt, one per cycle, and
+    # path_to_data/<sn>_VAL_YYYYMMDD-HHMMSS.txt. Returns the validation filename.
+    rng = np.random.default_rng(seed)
+    gaslist = get_reference_gases()
+    # span gas is the reference gas closest to 500 ppm, same as the post processing
+    span_gas = min(gaslist,key=lambda gas: abs(gas-500))
+
+    path_to_ALL = os.path.join(path_to_data,'ALL')
+    if not os.path.exists(path_to_ALL):
+        os.makedirs(path_to_ALL)
+
+    val_sections = []
+    for cycle_num in range(num_cycles):
+        gas = gaslist[cycle_num % len(gaslist)]
+        cycle_start = start_time + dt.timedelta(minutes=minutes_per_cycle*cycle_num,seconds=30)
+        all_lines, val_section = make_synthetic_cycle(sn,cycle_start,gas,span_gas,\
+            cycle_num,rng,samples_per_state=samples_per_state)
+        all_filename = os.path.join(path_to_ALL,cycle_start.strftime('%Y%m%d_%H%M%S') + '.txt')
+        with open(all_filename,'w') as f:
+            f.write('\n'.join(all_lines) + '\n')
+        val_sections.append('\n'.join(val_section) + '\n')
+
+    validation_text_filename = os.path.join(path_to_data,\
+        f'{sn}_VAL_' + start_time.strftime('%Y%m%d-%H%M%S') + '.txt')
+    with open(validation_text_filename,'w') as f:
+        f.write('\n'.join(val_sections))
+
+    return validation_text_filename
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic ALL files and a validation report')
+    parser.add_argument('path_to_data',help='folder for the ALL folder and the validation report')
+    parser.add_argument('--sn',default='ASVTEST12',help='serial number')
+    parser.add_argument('--cycles',type=int,default=8,help='number of ALL files')
+    parser.add_argument('--samples-per-state',type=int,default=20,help='2 Hz samples in each state')
+    parser.add_argument('--seed',type=int,default=0)
+    args = parser.parse_args()
+
+    validation_text_filename = write_synthetic_dataset(args.path_to_data,sn=args.sn,\
+        num_cycles=args.cycles,samples_per_state=args.samples_per_state,seed=args.seed)
+    print(f'Wrote {args.cycles} ALL files and {validation_text_filename}')
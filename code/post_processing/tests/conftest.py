@@ -0,0 +1,27 @@
+# The modules in code/post_processing import each other by name, run from that folder
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_data import write_synthetic_dataset
+
+@pytest.fixture
+def synthetic_dataset(tmp_path):
+    # 8 cycles of synthetic ALL files of ASVTEST12 and their validation file in
+    # tmp_path/ASVTEST12, returns the folder (with a trailing separator, as extract
+    # expects) and the validation filename
+    path_to_data = str(tmp_path / 'ASVTEST12') + os.sep
+    validation_text_filename = write_synthetic_dataset(path_to_data,num_cycles=8,\
+        samples_per_state=4)
+    return path_to_data, validation_text_filename
+
+@pytest.fixture
+def write_ALL_file(tmp_path):
+    # Returns a function writing lines into an ALL file in tmp_path, returns its filename
+    def write(lines, name='20220325_220530.txt'):
+        filename = str(tmp_path / name)
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return filename
+    return write
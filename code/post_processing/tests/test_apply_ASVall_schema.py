@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from parse_all_into_csv9_dry_Tcorr import tokenize_ASVall_file, loadASVall_data, \
+    apply_ASVall_schema, ASVALL_DATA_SCHEMA
+
+DATA_LINES = [
+    'DATA:State,TS,SN,CO2(ppm),Li_Temp(C),Li_Pres(kPa),Li_RawSample,Li_RawReference,RH(%),RH_T(C),O2(%)',
+    'DATA:EPOFF, 2022-03-25T22:22:02.0Z,ASVTEST12,349.51,22.01,101.26,5301234,5459299,5.06,24.95,20.90',
+    'DATA:EPOFF, 2022-03-25T22:22:02.5Z,ASVTEST12,349.51,22.01,101.26,nan,5459299,5.06,24.95,20.89',
+    'DATA:EPOFF, 2022-03-25T22:22:03.0Z,ASVTEST12,-0.56',
+]
+
+def test_bad_and_truncated_lines_become_missing_values(write_ALL_file):
+    df = loadASVall_data(tokenize_ASVall_file(write_ALL_file(DATA_LINES)))
+    assert len(df) == 3
+    assert str(df['Li_RawSample'].dtype) == 'Int64'
+    assert df['Li_RawSample'].iloc[0] == 5301234
+    assert df['Li_RawSample'].isna().to_list() == [False, True, True]
+    assert df['CO2(ppm)'].dtype == np.float64
+    assert df['CO2(ppm)'].to_list()[2] == -0.56
+    assert df['O2(%)'].isna().to_list() == [False, False, True]
+    assert df['TS'].to_list()[2] == ' 2022-03-25T22:22:03.0Z'
+
+def test_counts_with_decimals_are_kept_as_float():
+    df = pd.DataFrame({'Li_RawSample':['5301234.5','5301235'],'CO2(ppm)':[' 349.51','x']})
+    df = apply_ASVall_schema(df, ASVALL_DATA_SCHEMA)
+    assert df['Li_RawSample'].to_list() == [5301234.5, 5301235.0]
+    assert df['CO2(ppm)'].iloc[0] == 349.51
+    assert np.isnan(df['CO2(ppm)'].iloc[1])
+
+def test_columns_not_in_the_schema_are_left_alone():
+    df = pd.DataFrame({'State':['EPOFF'],'extra':['20.90']})
+    df = apply_ASVall_schema(df, ASVALL_DATA_SCHEMA)
+    assert str(df['State'].dtype) == 'category'
+    assert df['extra'].to_list() == ['20.90']
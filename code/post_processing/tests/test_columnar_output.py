@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+from columnar_output import open_output_stream, append_df_to_output_stream, close_output_stream
+
+def get_list_of_df():
+    # files with different columns, e.g. firmware which added or dropped a column
+    return [pd.DataFrame({'State':['APOFF','APOFF'],'CO2':[400.5,401.25]}),
+        pd.DataFrame({'State':['EPOFF'],'CO2':[399.0],'Temp':[20.125]}),
+        pd.DataFrame({'Temp':[19.5,19.75],'State':['SPOFF','SPOFF'],'RH':['1.5','']})]
+
+def test_stream_keeps_the_columns_of_all_dataframes_like_concat(tmp_path):
+    list_of_df = get_list_of_df()
+    stream = open_output_stream(str(tmp_path / 'raw'),['csv'])
+    for df in list_of_df:
+        append_df_to_output_stream(stream,df)
+    assert close_output_stream(stream) == [str(tmp_path / 'raw.csv')]
+
+    pd.concat(list_of_df,axis=0,ignore_index=True).to_csv(tmp_path / 'concat.csv',index=False)
+    with open(tmp_path / 'raw.csv','r') as f, open(tmp_path / 'concat.csv','r') as g:
+        assert f.read() == g.read()
+
+@pytest.mark.parametrize('output_format',['parquet','feather'])
+def test_stream_adds_new_columns_to_columnar_files(tmp_path, output_format):
+    pytest.importorskip('pyarrow')
+    list_of_df = get_list_of_df()
+    stream = open_output_stream(str(tmp_path / 'raw'),[output_format])
+    for df in list_of_df:
+        append_df_to_output_stream(stream,df)
+    filename = close_output_stream(stream)[0]
+    list_of_files = [p.name for p in tmp_path.iterdir()]
+    assert list_of_files == ['raw.' + output_format]
+
+    if ( output_format == 'parquet' ):
+        df_written = pd.read_parquet(filename)
+    else:
+        df_written = pd.read_feather(filename)
+    assert df_written.columns.to_list() == ['State','CO2','Temp','RH']
+    assert df_written['State'].astype(str).to_list() == ['APOFF','APOFF','EPOFF','SPOFF','SPOFF']
+    assert df_written['CO2'].to_list()[:3] == [400.5,401.25,399.0]
+    assert df_written['CO2'].isna().to_list() == [False,False,False,True,True]
+    assert df_written['Temp'].isna().to_list() == [True,True,False,False,False]
+    assert df_written['Temp'].to_list()[2:] == [20.125,19.5,19.75]
+    assert df_written['RH'].isna().to_list() == [True,True,True,False,True]
+
+@pytest.mark.parametrize('output_format',['parquet','feather'])
+def test_stream_widens_a_column_whose_type_changes(tmp_path, output_format):
+    pytest.importorskip('pyarrow')
+    # firmware '1.8' is a number until '1.9.2', a count of '2' an integer until '1.8'
+    list_of_df = [pd.DataFrame({'firmware':['1.8','1.8'],'count':['2','3'],'CO2':['400.5','']}),
+        pd.DataFrame({'firmware':['1.9.2'],'count':['4'],'CO2':['401.0']}),
+        pd.DataFrame({'firmware':['1.9.2'],'count':['1.8'],'CO2':['399.0']})]
+    stream = open_output_stream(str(tmp_path / 'raw'),['csv',output_format])
+    for df in list_of_df:
+        append_df_to_output_stream(stream,df)
+    filenames = close_output_stream(stream)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['raw.csv','raw.' + output_format]
+
+    if ( output_format == 'parquet' ):
+        df_written = pd.read_parquet(filenames[1])
+    else:
+        df_written = pd.read_feather(filenames[1])
+    assert df_written['firmware'].to_list() == ['1.8','1.8','1.9.2','1.9.2']
+    assert df_written['count'].dtype == 'float64'
+    assert df_written['count'].to_list() == [2.0,3.0,4.0,1.8]
+    assert df_written['CO2'].isna().to_list() == [False,True,False,False]
@@ -0,0 +1,35 @@
+import parse_cache
+from parse_cache import load_from_cache, save_to_cache
+
+def write_source(tmp_path):
+    filename = str(tmp_path / '20220325_220530.txt')
+    with open(filename, 'w') as f:
+        f.write('DATA:ZPON, 2022-03-25T22:05:30.0Z,ASVTEST12,0.04\n')
+    return filename
+
+def test_entries_of_another_cache_version_are_not_used(tmp_path, monkeypatch):
+    filename = write_source(tmp_path)
+    cache_path = str(tmp_path / '.cache')
+    save_to_cache(cache_path, filename, 'tag', {'result':1})
+    assert load_from_cache(cache_path, filename, 'tag') == {'result':1}
+    monkeypatch.setattr(parse_cache, 'CACHE_VERSION', parse_cache.CACHE_VERSION + 1)
+    assert load_from_cache(cache_path, filename, 'tag') is None
+
+def test_sha1_is_only_computed_when_the_hash_is_checked(tmp_path, monkeypatch):
+    filename = write_source(tmp_path)
+    cache_path = str(tmp_path / '.cache')
+    save_to_cache(cache_path, filename, 'tag', 'no hash')
+    assert load_from_cache(cache_path, filename, 'tag') == 'no hash'
+    # saved without a hash, so it cannot be trusted when the hash is checked
+    assert load_from_cache(cache_path, filename, 'tag', check_hash=True) is None
+    save_to_cache(cache_path, filename, 'tag', 'with hash', check_hash=True)
+    assert load_from_cache(cache_path, filename, 'tag', check_hash=True) == 'with hash'
+    assert parse_cache.get_file_signature(filename, with_sha1=False)['sha1'] is None
+
+def test_entries_written_by_other_source_are_not_used(tmp_path, monkeypatch):
+    filename = write_source(tmp_path)
+    cache_path = str(tmp_path / '.cache')
+    save_to_cache(cache_path, filename, 'tag', {'result':1})
+    # as after an edit of special_functions.py, e.g. of calculate_xco2_kernel()
+    monkeypatch.setattr(parse_cache, 'SOURCE_HASH', parse_cache.get_source_hash(['special_functions']))
+    assert load_from_cache(cache_path, filename, 'tag') is None
@@ -0,0 +1,59 @@
+import os
+import json
+import shutil
+from parse_all_into_csv9_dry_Tcorr import extract_summary_and_raw_to_csv
+
+SN = 'ASVTEST12'
+
+def read_outputs(path_to_data):
+    csv_path = os.path.join(path_to_data,'reports','csv')
+    outputs = {}
+    for name in ['raw','stats','summary']:
+        with open(os.path.join(csv_path,name + '_' + SN + '_20220325.csv'),'r') as f:
+            outputs[name] = f.read()
+    return outputs
+
+def parsed_ALL_files(stdout, path_to_ALL):
+    # extract prints the name of each ALL file it parses
+    ALL_filenames = os.listdir(path_to_ALL)
+    return [os.path.basename(line) for line in stdout.splitlines() \
+        if os.path.basename(line) in ALL_filenames]
+
+def run_full(tmp_path, path_to_data, validation_text_filename):
+    # same ALL files, processed in one go in another folder
+    path_to_full = str(tmp_path / 'full') + os.sep
+    shutil.copytree(path_to_data,path_to_full,ignore=shutil.ignore_patterns('reports'))
+    extract_summary_and_raw_to_csv(SN,path_to_full,os.path.join(path_to_full,\
+        os.path.basename(validation_text_filename)),use_cache=False,incremental=False)
+    return read_outputs(path_to_full)
+
+def test_rerun_with_new_ALL_files_matches_a_full_run(tmp_path, synthetic_dataset, capsys):
+    path_to_data, validation_text_filename = synthetic_dataset
+    path_to_ALL = os.path.join(path_to_data,'ALL')
+    held_back = sorted(os.listdir(path_to_ALL))[-2:]
+    for name in held_back:
+        shutil.move(os.path.join(path_to_ALL,name),str(tmp_path / name))
+    extract_summary_and_raw_to_csv(SN,path_to_data,validation_text_filename,use_cache=False)
+    for name in held_back:
+        shutil.move(str(tmp_path / name),os.path.join(path_to_ALL,name))
+    capsys.readouterr()
+
+    extract_summary_and_raw_to_csv(SN,path_to_data,validation_text_filename,use_cache=False)
+    assert parsed_ALL_files(capsys.readouterr().out,path_to_ALL) == held_back
+    assert read_outputs(path_to_data) == run_full(tmp_path,path_to_data,validation_text_filename)
+
+def test_manifest_of_another_version_is_not_reused(tmp_path, synthetic_dataset, capsys):
+    path_to_data, validation_text_filename = synthetic_dataset
+    extract_summary_and_raw_to_csv(SN,path_to_data,validation_text_filename,use_cache=False)
+    manifest_filename = os.path.join(path_to_data,'reports','csv','run_manifest_' + SN + '.json')
+    with open(manifest_filename,'r') as f:
+        manifest = json.load(f)
+    manifest['version'] = manifest['version'] - 1
+    with open(manifest_filename,'w') as f:
+        json.dump(manifest,f)
+    capsys.readouterr()
+
+    extract_summary_and_raw_to_csv(SN,path_to_data,validation_text_filename,use_cache=False)
+    path_to_ALL = os.path.join(path_to_data,'ALL')
+    assert parsed_ALL_files(capsys.readouterr().out,path_to_ALL) == sorted(os.listdir(path_to_ALL))
+    assert read_outputs(path_to_data) == run_full(tmp_path,path_to_data,validation_text_filename)
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+from special_functions import calculate_xco2_kernel, calculate_xco2_from_data_pt_by_pt
+
+def get_data(index):
+    return pd.DataFrame({'Li_Raw':['3452000','3441000','3460000'],\
+        'Li_ref':['3870000','3869000','3871000'],'Pres':['101.3','99.5','98.2'],\
+        'Temp':['20.1','20.4','19.8']},index=index)
+
+def test_pt_by_pt_lines_up_series_coefficients_by_index():
+    data = get_data([10,11,12])
+    S0 = pd.Series([0.912,0.911,0.913],index=[12,11,10])
+    S1 = pd.Series([0.0545,0.0546,0.0544],index=[12,11,10])
+    xco2 = calculate_xco2_from_data_pt_by_pt(data,0.98,S0,S1)
+    assert xco2.index.to_list() == [10,11,12]
+    for idx in data.index:
+        expected = calculate_xco2_kernel(float(data.Li_Raw[idx]),float(data.Li_ref[idx]),\
+            float(data.Pres[idx]),float(data.Temp[idx]),0.98,S0[idx],S1[idx],\
+            g_is_X_below_p0=True,invert_at_p0=False)
+        assert np.isclose(xco2[idx],expected,rtol=1e-12)
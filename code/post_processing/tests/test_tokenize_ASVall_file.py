@@ -0,0 +1,50 @@
+import pandas as pd
+from parse_all_into_csv9_dry_Tcorr import tokenize_ASVall_file, loadASVall_coeff, \
+    loadASVall_data, loadASVall_flags
+
+ALL_FILE_LINES = [
+    'serial=ASVTEST12',
+    'time=2022-03-25T22:05:30Z',
+    'LI_ser=CGA-5081',
+    'LOG:',
+    'LOG: starting cycle',
+    'COEFF: \tCO2LastZero: 25 MAR 2022',
+    'COEFF: \tCO2kzero: 0.948000',
+    'COEFF: \tCO2LastSpan: 25 MAR 2022',
+    'COEFF: \tCO2LastSpan2: 25 MAR 2022',
+    'COEFF: \tCO2kspan: 0.912000',
+    'COEFF: \tCO2kspan2: 0.054500',
+    'DATA:State,TS,SN,CO2(ppm),Li_Temp(C),Li_Pres(kPa),Li_RawSample,Li_RawReference,RH(%),RH_T(C),O2(%)',
+    'DATA:ZPON, 2022-03-25T22:05:30.0Z,ASVTEST12,0.04,22.03,105.33,5759484,5460052,4.95,25.02,20.91',
+    ' DATA:ZPON, 2022-03-25T22:05:30.5Z,ASVTEST12,0.28,22.00,105.24,5758680,5459688,5.00,24.88,20.90',
+    '12:00:01 DATA:ZPON, 2022-03-25T22:05:31.0Z,ASVTEST12,-0.37,22.00,105.27,5759326,5459841,5.04,25.05,20.90',
+    'FLAGS: 0000 0000 0000 0000 0000 0000 0000 0001',
+]
+
+def test_lines_are_kept_with_their_line_number_in_the_file(write_ALL_file):
+    parsed_file = tokenize_ASVall_file(write_ALL_file(ALL_FILE_LINES))
+    assert parsed_file['sys_rep']['serial'] == 'ASVTEST12'
+    assert parsed_file['sys_rep']['LI_ser'] == 'CGA-5081'
+    assert parsed_file['COEFF'][0] == (6, 'COEFF: \tCO2LastZero: 25 MAR 2022')
+    assert [linenum for linenum, line in parsed_file['DATA']] == [12, 13, 14, 15]
+    assert parsed_file['FLAGS'] == [(16, ALL_FILE_LINES[15])]
+    assert len(parsed_file['DRY']) == 0
+
+def test_tags_are_matched_anywhere_in_the_line(write_ALL_file):
+    # leading whitespace or a time stamp before the tag, as the loaders always accepted
+    parsed_file = tokenize_ASVall_file(write_ALL_file(ALL_FILE_LINES))
+    assert parsed_file['DATA'][2][1] == ALL_FILE_LINES[13]
+    assert parsed_file['DATA'][3][1] == ALL_FILE_LINES[14]
+    df = loadASVall_data(parsed_file)
+    assert df['TS'].to_list() == [' 2022-03-25T22:05:30.0Z', ' 2022-03-25T22:05:30.5Z',\
+        ' 2022-03-25T22:05:31.0Z']
+
+def test_loaders_give_the_same_result_from_a_filename_or_the_parsed_file(write_ALL_file):
+    filename = write_ALL_file(ALL_FILE_LINES)
+    parsed_file = tokenize_ASVall_file(filename)
+    pd.testing.assert_frame_equal(loadASVall_coeff(filename), loadASVall_coeff(parsed_file))
+    pd.testing.assert_frame_equal(loadASVall_data(filename), loadASVall_data(parsed_file))
+    df_flags = loadASVall_flags(parsed_file)
+    assert df_flags['ASVCO2_LICOR_FLAGS'].to_list() == [1]
+    assert loadASVall_coeff(parsed_file)['label'].to_list() == \
+        ['CO2kzero', 'CO2kspan', 'CO2kspan2']
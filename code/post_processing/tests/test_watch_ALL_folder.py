@@ -0,0 +1,73 @@
+import os
+import pandas as pd
+from parse_all_into_csv9_dry_Tcorr import extract_summary_and_raw_to_csv
+from watch_ALL_folder import load_watch_state, poll_ALL_folder, append_df_to_csv
+
+SN = 'ASVTEST12'
+
+def test_watch_writes_its_own_csv_files_and_skips_a_bad_file(synthetic_dataset):
+    path_to_data, validation_text_filename = synthetic_dataset
+    extract_summary_and_raw_to_csv(SN,path_to_data,validation_text_filename,use_cache=False)
+    csv_path = os.path.join(path_to_data,'reports','csv')
+    with open(os.path.join(csv_path,'raw_' + SN + '_20220325.csv'),'r') as f:
+        raw_text = f.read()
+
+    # a file the instrument cut short, between two good ones
+    bad_filename = os.path.join(path_to_data,'ALL','20220325_221000.txt')
+    with open(bad_filename,'w') as f:
+        f.write('COEFF\nDRY\nFLAGS\n')
+    state = load_watch_state(os.path.join(csv_path,'watch_state_' + SN + '.json'),\
+        validation_text_filename)
+    faults = []
+    processed, span_gas = poll_ALL_folder(SN,path_to_data,validation_text_filename,state,{},\
+        stable_polls=1,on_fault=lambda filename, fault_text: faults.append(filename))
+
+    good_filenames = sorted(name for name in os.listdir(os.path.join(path_to_data,'ALL')) \
+        if name != os.path.basename(bad_filename))
+    assert [os.path.basename(filename) for filename in processed] == good_filenames
+    assert state['files'][os.path.abspath(bad_filename)] == 'failed'
+    assert bad_filename in faults
+    with open(os.path.join(path_to_data,'reports','watch_faults_' + SN + '.txt'),'r') as f:
+        assert 'could not be parsed' in f.read()
+
+    # the csv file of extract is left alone, the watch has the same rows in its own
+    with open(os.path.join(csv_path,'raw_' + SN + '_20220325.csv'),'r') as f:
+        assert f.read() == raw_text
+    with open(os.path.join(csv_path,'watch_raw_' + SN + '_20220325.csv'),'r') as f:
+        assert f.read() == raw_text
+
+def test_append_df_to_csv_adds_new_columns(tmp_path):
+    filename = str(tmp_path / 'watch_raw.csv')
+    list_of_df = [pd.DataFrame({'State':['APOFF'],'CO2':[400.5]}),\
+        pd.DataFrame({'State':['EPOFF'],'Temp':[20.125]}),\
+        pd.DataFrame({'CO2':[399.0],'State':['SPOFF']})]
+    columns = None
+    for df in list_of_df:
+        columns = append_df_to_csv(df,filename,columns)
+    assert columns == ['State','CO2','Temp']
+    with open(filename,'r') as f:
+        assert f.read() == pd.concat(list_of_df,axis=0,ignore_index=True).to_csv(index=False)
+
+def test_watch_waits_for_the_span_gas_of_the_validation_file(synthetic_dataset):
+    path_to_data, validation_text_filename = synthetic_dataset
+    csv_path = os.path.join(path_to_data,'reports','csv')
+    os.makedirs(csv_path)
+    with open(validation_text_filename,'r') as f:
+        validation_text = f.read()
+    # the instrument has not written the validation file yet
+    with open(validation_text_filename,'w') as f:
+        f.write('')
+    state = load_watch_state(os.path.join(csv_path,'watch_state_' + SN + '.json'),\
+        validation_text_filename)
+    last_seen = {}
+    processed, span_gas = poll_ALL_folder(SN,path_to_data,validation_text_filename,state,\
+        last_seen,stable_polls=1)
+    assert processed == [] and span_gas is None and state['files'] == {}
+    assert not os.path.exists(os.path.join(csv_path,'watch_raw_' + SN + '_20220325.csv'))
+
+    with open(validation_text_filename,'w') as f:
+        f.write(validation_text)
+    processed, span_gas = poll_ALL_folder(SN,path_to_data,validation_text_filename,state,\
+        last_seen,stable_polls=1)
+    assert len(processed) == 8 and span_gas is not None
+    assert set(state['files'].values()) == {'appended'}
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watch mode, processes the ALL files of a validation run while the ASVCO2 is
+still writing them, without waiting for the end of the run.
+
+The ALL folder is polled every poll_interval seconds (polling rather than
+inotify, so it works the same on Windows). A file is complete once its size and
+mtime have not changed for stable_polls polls in a row and it has COEFF, DRY
+and FLAGS lines. A file that stopped changing without them, while a newer file
+was already started, is skipped, just like the report does. Complete files are
+taken in filename order, each is parsed and temperature corrected with
+parse_and_correct_ASVall_file(), its rows are appended to the watch_raw and
+watch_stats csv files in reports/csv and extra_range_checks() is run on it. Fault
+text is printed and appended to reports/watch_faults_<sn>.txt as soon as a file
+fails, as is the error of a file which cannot be parsed, the watch then goes on
+with the next file.
+
+The watch has its own csv files, the raw and stats csv files of
+extract_summary_and_raw_to_csv() are only written by extract, so running extract
+during the watch neither loses nor doubles rows. A file with columns the csv
+file does not have yet is appended after rewriting the csv file with the new
+columns, blank for the rows before, so all columns are kept as with extract.
+
+Which files were already appended is kept in reports/csv/watch_state_<sn>.json,
+so the watch can be stopped and started again during a run.
+
+Example, stop after 30 minutes without a new file,
+    python watch_ALL_folder.py ASVTEST12 ./data/ASVTEST12/ ./data/ASVTEST12/ASVTEST12_VAL_20220325-080000.txt --max-idle 1800
+"""
+import os
+import re
+import glob
+import json
+import time
+import argparse
+import datetime as dt
+import pandas as pd
+
+from parse_all_into_csv9_dry_Tcorr import tokenize_ASVall_file, parse_and_correct_ASVall_file, \
+    all_filename_is_current
+from postprocessingLICOR import extra_range_checks, get_span_gas_from_val_file
+from pipeline_profiler import profile_stage, write_profile
+
+def load_watch_state(state_filename, validation_text_filename):
+    # Returns the state of an earlier watch of the same validation run, or a new one
+    if ( os.path.exists(state_filename) ):
+        with open(state_filename,'r') as f:
+            state = json.load(f)
+        if ( state['validation_text_filename'] == os.path.abspath(validation_text_filename) ):
+            return state
+    return {'validation_text_filename':os.path.abspath(validation_text_filename),\
+        'date':None,'files':{},'raw_columns':None,'stats_columns':None}
+
+def save_watch_state(state_filename, state):
+    with open(state_filename + '.tmp','w') as f:
+        json.dump(state,f,indent=4)
+    os.replace(state_filename + '.tmp',state_filename)
+
+def append_df_to_csv(df, filename, columns=None):
+    # Writes the header only when columns is None, i.e. for the first file of the run.
+    # Later files are lined up with the columns of the header, new columns are added to
+    # the end of the header by rewriting the file. Returns the columns of the file.
+    if ( columns is None ):
+        df.to_csv(filename,index=False)
+        return df.columns.to_list()
+    new_columns = [col for col in df.columns if col not in columns]
+    if ( len(new_columns) > 0 ):
+        columns = columns + new_columns
+        first_chunk = True
+        for df_written in pd.read_csv(filename,dtype=str,keep_default_na=False,chunksize=100000):
+            df_written.reindex(columns=columns).to_csv(filename + '.tmp',\
+                mode='w' if first_chunk else 'a',header=first_chunk,index=False)
+            first_chunk = False
+        os.replace(filename + '.tmp',filename)
+    df.reindex(columns=columns).to_csv(filename,mode='a',header=False,index=False)
+    return columns
+
+def report_fault(reports_path, sn, filename, fault_text, on_fault=None):
+    time_str = dt.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+    print(f'#### FAULT {time_str} ####\n{fault_text}')
+    with open(os.path.join(reports_path,'watch_faults_' + sn + '.txt'),'a') as f:
+        f.write(f'#### {time_str} ####\n{fault_text}\n')
+    if ( on_fault is not None ):
+        on_fault(filename,fault_text)
+
+def file_has_COEFF_DRY_FLAGS(parsed_file):
+    return ( len(parsed_file['COEFF']) > 0 and len(parsed_file['DRY']) > 0 and \
+        len(parsed_file['FLAGS']) > 0 )
+
+def poll_ALL_folder(sn, path_to_data, validation_text_filename, state, last_seen,\
+    stable_polls=2, span_gas=None, on_fault=None):
+    # One poll of the ALL folder. last_seen holds, per file not yet processed, its
+    # last (size, mtime) and for how many polls in a row it was unchanged.
+    # Returns the filenames processed by this poll and the span gas used.
+    reports_path = os.path.join(path_to_data,'reports')
+    csv_path = os.path.join(reports_path,'csv')
+    filenames = sorted(glob.glob(os.path.join(path_to_data,'ALL','20*.txt')))
+    filenames = [filename for filename in filenames \
+        if all_filename_is_current(validation_text_filename,filename)]
+    if ( len(filenames) == 0 ):
+        return [], span_gas
+    if ( state['date'] is None ):
+        # same date as the csv files of extract_summary_and_raw_to_csv()
+        state['date'] = re.findall(r'\d+_\d+\.txt',filenames[0])[0][0:8]
+    raw_filename = os.path.join(csv_path,'watch_raw_' + sn + '_' + state['date'] + '.csv')
+    stats_filename = os.path.join(csv_path,'watch_stats_' + sn + '_' + state['date'] + '.csv')
+    state_filename = os.path.join(csv_path,'watch_state_' + sn + '.json')
+
+    processed = []
+    for idx, filename in enumerate(filenames):
+        key = os.path.abspath(filename)
+        if ( key in state['files'] ):
+            continue
+        file_stat = os.stat(filename)
+        signature = [file_stat.st_size,file_stat.st_mtime_ns]
+        if ( key in last_seen and last_seen[key]['signature'] == signature ):
+            last_seen[key]['polls'] += 1
+        else:
+            last_seen[key] = {'signature':signature,'polls':1}
+        if ( last_seen[key]['polls'] < stable_polls or file_stat.st_size == 0 ):
+            break  # still being written, keep the files in order
+
+        # read once, for the check, the csv rows and the extra range checks
+        parsed_file = tokenize_ASVall_file(filename)
+        if not ( file_has_COEFF_DRY_FLAGS(parsed_file) ):
+            if ( idx == len(filenames) - 1 ):
+                break  # newest file, the instrument may still add to it
+            state['files'][key] = 'incomplete'
+            del last_seen[key]
+            save_watch_state(state_filename,state)
+            print(f'{filename} has no COEFF, DRY or FLAGS, skipped')
+            continue
+
+        # the validation file is written during the run too, until its first section is
+        # complete there is no span gas and the file waits for the next poll
+        if ( span_gas is None ):
+            try:
+                span_gas = get_span_gas_from_val_file(validation_text_filename)
+            except Exception as e:
+                print(f'No span gas in {validation_text_filename} yet, {type(e).__name__}: {e}')
+                break
+
+        with profile_stage('watch: process ALL file') as stage:
+            try:
+                result = parse_and_correct_ASVall_file(parsed_file)
+            except Exception as e:
+                # one bad file must not stop the watch, it is reported and skipped
+                report_fault(reports_path,sn,filename,\
+                    f'{filename} could not be parsed, {type(e).__name__}: {e}',on_fault=on_fault)
+                state['files'][key] = 'failed'
+                del last_seen[key]
+                save_watch_state(state_filename,state)
+                continue
+            df_file, df_dry, df_dry_sync, df_stats, df_ts_flags, df_coeff_sync = result
+            state['raw_columns'] = append_df_to_csv(df_file,raw_filename,state['raw_columns'])
+            state['stats_columns'] = append_df_to_csv(df_stats,stats_filename,state['stats_columns'])
+            # saved right away, so a restart never appends the file a second time
+            state['files'][key] = 'appended'
+            del last_seen[key]
+            save_watch_state(state_filename,state)
+            stage['rows'] = len(df_file)
+
+        with profile_stage('watch: extra range checks'):
+            try:
+                fault_text = extra_range_checks(parsed_file,validation_text_filename,\
+                    span_gas=span_gas)
+            except Exception as e:
+                fault_text = f'The following problems were found in {filename}<br/>' + \
+                    f'the extra range checks failed, {type(e).__name__}: {e}'
+        if ( fault_text.startswith('The following problems') ):
+            report_fault(reports_path,sn,filename,fault_text.replace('<br/>','\n'),\
+                on_fault=on_fault)
+        else:
+            print(fault_text.replace('<br/>',''))
+
+        processed.append(filename)
+
+    return processed, span_gas
+
+def watch_ALL_folder(sn, path_to_data, validation_text_filename, poll_interval=5.0,\
+    stable_polls=2, max_idle=None, span_gas=None, on_fault=None):
+    # Polls until no file was processed for max_idle seconds, forever if max_idle
+    # is None, or until Ctrl+C. on_fault(filename, fault_text) is called for every
+    # file that fails the checks. span_gas is read from the validation file if None.
+    # Returns the filenames processed.
+    reports_path = os.path.join(path_to_data,'reports')
+    csv_path = os.path.join(reports_path,'csv')
+    if not os.path.exists(csv_path):
+        os.makedirs(csv_path)
+    state_filename = os.path.join(csv_path,'watch_state_' + sn + '.json')
+    state = load_watch_state(state_filename,validation_text_filename)
+    print(f"Watching {os.path.join(path_to_data,'ALL')}, {len(state['files'])} files done earlier")
+
+    last_seen = {}
+    all_processed = []
+    last_activity = time.perf_counter()
+    try:
+        while ( True ):
+            processed, span_gas = poll_ALL_folder(sn,path_to_data,validation_text_filename,\
+                state,last_seen,stable_polls=stable_polls,span_gas=span_gas,on_fault=on_fault)
+            all_processed += processed
+            if ( len(processed) > 0 ):
+                last_activity = time.perf_counter()
+            if ( max_idle is not None and time.perf_counter() - last_activity > max_idle ):
+                print(f'No new ALL files for {max_idle} s, stopping')
+                break
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print('Stopped')
+    finally:
+        # profile of the stages above, when turned on with ASVCO2_PROFILE, see pipeline_profiler.py
+        write_profile(os.path.join(reports_path,'profile'),'watch_ALL_folder')
+
+    return all_processed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process the ALL files of a validation run ' + \
+        'as the ASVCO2 writes them')
+    parser.add_argument('sn',help='serial number, e.g. ASVTEST12')
+    parser.add_argument('path_to_data',help='folder with the ALL folder')
+    parser.add_argument('validation_text_filename',help='validation file of the run')
+    parser.add_argument('--interval',type=float,default=5.0,help='seconds between polls')
+    parser.add_argument('--stable-polls',type=int,default=2,\
+        help='polls a file must stay the same size before it is processed')
+    parser.add_argument('--max-idle',type=float,default=None,\
+        help='stop after this many seconds without a new file, default is to run until Ctrl+C')
+    parser.add_argument('--span-gas',type=float,default=None,\
+        help='span gas in ppm, read from the validation file by default')
+    args = parser.parse_args()
+
+    watch_ALL_folder(args.sn,args.path_to_data,args.validation_text_filename,\
+        poll_interval=args.interval,stable_polls=args.stable_polls,max_idle=args.max_idle,\
+        span_gas=args.span_gas)